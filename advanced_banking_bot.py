@@ -5,63 +5,157 @@ Includes conversation management, logging, and advanced banking functions
 """
 
 import os
-import json
+import uuid
 from datetime import datetime
-from typing import List, Dict, Optional
-from mistralai import Mistral
-from dotenv import load_dotenv
+from typing import List, Dict, Iterator, Optional
+from bot_core import (
+    BANKING_SYSTEM_PROMPT, TRUNCATED_MARKER, MissingAPIKeyError, ModelPolicy, client_stats,
+    complete_chat, default_policy, get_api_key, ground_messages, stream_chat
+)
+from context_window import ContextWindow
+from intent_router import IntentRouter
+from response_cache import ResponseCache, is_context_free
+from conversation_journal import ConversationJournal
+from metrics import TurnMetrics, TurnTimer, format_seconds, start_metrics_server
+from pii_redaction import RedactingJournal, get_pipeline
+from prefetch import Prefetcher
+from session_snapshot import SessionSnapshot, write_snapshot
 
-# Load environment variables from .env file
-load_dotenv()
+# Mistral client override (tests, benchmarks); the shared lazy client is used when None
+client = None
 
-# Initialize Mistral client with API key
-API_KEY = os.getenv("MISTRAL_API_KEY")
-if not API_KEY:
-    print("❌ Error: MISTRAL_API_KEY not found. Please set it in your .env file.")
-    exit(1)
-client = Mistral(api_key=API_KEY)
+# Cache of answers to context-free first questions, shared by all bots
+response_cache = ResponseCache()
 
-# System prompt for the banking bot
-BANKING_SYSTEM_PROMPT = """You are a professional banking assistant AI bot. You help customers with:
-- Account information and balance inquiries
-- Transaction history and statements
-- Banking products (savings accounts, checking accounts, loans, mortgages)
-- Investment advice and portfolio management
-- Credit card information and rewards
-- Money transfer and payment assistance
-- Fraud protection and security advice
-- Budgeting and financial planning
-- Loan applications and mortgage guidance
-- Interest rates and APY information
+# Templated answers to small talk, shared by all bots
+intent_router = IntentRouter()
 
-You are knowledgeable, professional, and helpful. You always:
-- Provide accurate financial information
-- Encourage responsible banking practices
-- Suggest consulting with financial advisors for complex decisions
-- Prioritize customer data security
-- Are empathetic to customer concerns
-- Provide clear explanations of banking concepts
+# Per-turn latency and token usage of every bot in this process
+metrics = TurnMetrics()
 
-DISCLAIMER: This is an educational AI assistant. For actual banking transactions, 
-please contact your bank directly or use official banking channels."""
+
+class Message:
+    """Compact conversation record with a prebuilt, timestamp-free API view"""
+    
+    __slots__ = ("role", "content", "timestamp", "api")
+    
+    def __init__(self, role: str, content: str, timestamp: Optional[str] = None):
+        self.role = role
+        self.content = content
+        self.timestamp = timestamp or datetime.now().isoformat()
+        # Built once so requests can share it instead of copying the message
+        self.api = {"role": role, "content": content}
+    
+    def to_dict(self) -> Dict:
+        """Full record, as written to the conversation journal"""
+        return {"role": self.role, "content": self.content, "timestamp": self.timestamp}
 
 
 class BankingBot:
     """Advanced Banking Bot with conversation management and logging"""
     
-    def __init__(self, log_file: str = "conversation_log.json"):
-        self.conversation_history: List[Dict] = []
-        self.log_file = log_file
+    def __init__(
+        self,
+        log_file: str = "conversation_log.jsonl",
+        context_window: Optional[ContextWindow] = None,
+        cache: Optional[ResponseCache] = None,
+        journal: Optional[ConversationJournal] = None,
+        router: Optional[IntentRouter] = None,
+        policy: Optional[ModelPolicy] = None,
+        prefetcher: Optional[Prefetcher] = None,
+        redact: bool = True
+    ):
+        self.conversation_history: List[Message] = []
+        # Timestamp-free view of the history, maintained as messages are added
+        self.api_history: List[Dict] = []
+        self.context_window = context_window or ContextWindow()
+        self.response_cache = cache or response_cache
+        self.cache_hits = 0
+        self.intent_router = router or intent_router
+        self.model_policy = policy or default_policy
+        # Optional speculative answers to likely follow-ups, kept per session
+        self.prefetcher = prefetcher
+        self.prefetched = prefetcher.session() if prefetcher else None
+        self.journal = journal or ConversationJournal(log_file)
+        # Card numbers, IBANs and other PII are removed on a background worker before
+        # anything reaches the journal or a snapshot; the in-memory history keeps them
+        self.redact = redact
+        if redact and not isinstance(self.journal, RedactingJournal):
+            self.journal = RedactingJournal(self.journal)
+        self.log_file = self.journal.path
+        self.session_id = uuid.uuid4().hex
+        # Earliest messages of a restored session, left in the memory-mapped snapshot
+        self.archive: Optional[SessionSnapshot] = None
+        self.archived = 0
+        self.archived_api = 0
+        self.archived_roles: Dict[str, int] = {}
+        self.metrics = TurnMetrics()
         self.start_time = datetime.now()
         self.message_count = 0
+        # Whether the last streamed answer was cut off by an error
+        self.stream_failed = False
+    
+    def start_turn(self) -> TurnTimer:
+        """Start timing a turn for this session and the process-wide metrics"""
+        return TurnTimer(self.metrics, metrics)
+    
+    def _get_routed(self, user_message: str, timer: TurnTimer) -> Optional[str]:
+        """Answer small talk from a template, keeping it out of the model's context"""
+        routed = self.intent_router.route(user_message)
+        if routed is None:
+            return None
+        timer.routed()
+        self.add_to_history("user", user_message, api=False)
+        self.add_to_history("assistant", routed[1], api=False)
+        self.message_count += 1
+        return routed[1]
+    
+    def _get_cached(self, user_message: str, timer: TurnTimer) -> Optional[str]:
+        """Look up a cached answer, only for context-free first questions"""
+        if not is_context_free(self.api_history):
+            return None
+        cached = self.response_cache.get(user_message)
+        if cached is not None:
+            timer.cache_hit()
+            self.add_to_history("assistant", cached)
+            self.message_count += 1
+            self.cache_hits += 1
+        return cached
+    
+    def _get_prefetched(self, user_message: str, timer: TurnTimer) -> Optional[str]:
+        """Serve an answer prefetched for a predicted follow-up question"""
+        if self.prefetched is None:
+            return None
+        answer = self.prefetched.take(user_message)
+        if answer is not None:
+            timer.prefetch_hit()
+            self.add_to_history("assistant", answer)
+            self.message_count += 1
+        return answer
     
-    def add_to_history(self, role: str, content: str) -> None:
-        """Add a message to conversation history"""
-        self.conversation_history.append({
-            "role": role,
-            "content": content,
-            "timestamp": datetime.now().isoformat()
-        })
+    def _prefetch(self, messages: List[Dict], answer: str) -> None:
+        """Start prefetching answers to the likely follow-ups of this turn"""
+        if self.prefetcher is not None:
+            self.prefetcher.schedule(self.prefetched, messages, answer, client, self.model_policy)
+    
+    def add_to_history(self, role: str, content: str, api: bool = True) -> None:
+        """
+        Add a message to conversation history and append it to the journal
+        
+        Args:
+            role: "user" or "assistant"
+            content: Message text
+            api: Also send the message to the model on later turns
+        """
+        message = Message(role, content)
+        self.conversation_history.append(message)
+        if api:
+            self.api_history.append(message.api)
+        
+        try:
+            self.journal.append({"session_id": self.session_id, **message.to_dict()})
+        except OSError as e:
+            print(f"\n⚠️ Could not write to {self.log_file}: {str(e)}")
     
     def get_response(self, user_message: str) -> Optional[str]:
         """
@@ -73,69 +167,254 @@ class BankingBot:
         Returns:
             Bot's response or None if error
         """
+        timer = self.start_turn()
+        routed = self._get_routed(user_message, timer)
+        if routed is not None:
+            return routed
         self.add_to_history("user", user_message)
         
+        prefetched = self._get_prefetched(user_message, timer)
+        if prefetched is not None:
+            return prefetched
+        
+        cached = self._get_cached(user_message, timer)
+        if cached is not None:
+            return cached
+        cacheable = is_context_free(self.api_history)
+        
         try:
-            # Build message list for API (without timestamps)
-            api_messages = [
-                {"role": msg["role"], "content": msg["content"]} 
-                for msg in self.conversation_history
-            ]
-            
-            # Call Mistral API
-            response = client.chat.complete(
-                model="mistral-large-latest",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": BANKING_SYSTEM_PROMPT
-                    }
-                ] + api_messages,
-                temperature=0.7,
-                max_tokens=1024
+            # Bounded message list for API, updated in place without copying history,
+            # plus the documentation passages relevant to the question
+            messages = ground_messages(
+                self.context_window.request_messages(BANKING_SYSTEM_PROMPT, self.api_history)
             )
+            timer.request_built()
             
-            # Extract response
-            bot_message = response.choices[0].message.content
+            # Call Mistral API
+            bot_message = complete_chat(messages, timer, client, self.model_policy)
+            if cacheable:
+                self.response_cache.put(user_message, bot_message)
             self.add_to_history("assistant", bot_message)
             self.message_count += 1
+            self._prefetch(messages, bot_message)
             
             return bot_message
         
         except Exception as e:
+            timer.error()
             error_msg = f"Error: {str(e)}"
             print(f"\n❌ {error_msg}")
             return None
     
-    def save_conversation(self) -> None:
-        """Save conversation history to file"""
+    def stream_response(self, user_message: str) -> Iterator[str]:
+        """
+        Stream response from Mistral AI as tokens arrive
+        
+        Args:
+            user_message: User's input message
+            
+        Yields:
+            Chunks of the bot's response; the full response is added to
+            history once the stream completes (stream_failed tells whether it did)
+        """
+        self.stream_failed = False
+        timer = self.start_turn()
+        routed = self._get_routed(user_message, timer)
+        if routed is not None:
+            yield routed
+            return
+        self.add_to_history("user", user_message)
+        
+        prefetched = self._get_prefetched(user_message, timer)
+        if prefetched is not None:
+            yield prefetched
+            return
+        
+        cached = self._get_cached(user_message, timer)
+        if cached is not None:
+            yield cached
+            return
+        cacheable = is_context_free(self.api_history)
+        
+        chunks: List[str] = []
+        complete = False
         try:
-            data = {
-                "start_time": self.start_time.isoformat(),
-                "end_time": datetime.now().isoformat(),
-                "message_count": self.message_count,
-                "conversation": self.conversation_history
-            }
+            # Bounded message list for API, updated in place without copying history,
+            # plus the documentation passages relevant to the question
+            messages = ground_messages(
+                self.context_window.request_messages(BANKING_SYSTEM_PROMPT, self.api_history)
+            )
+            timer.request_built()
             
-            with open(self.log_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            # Call Mistral streaming API
+            for delta in stream_chat(messages, timer, client, self.model_policy):
+                chunks.append(delta)
+                yield delta
+            complete = True
             
+            if cacheable and chunks:
+                self.response_cache.put(user_message, "".join(chunks))
+            if chunks:
+                self._prefetch(messages, "".join(chunks))
+        
+        except Exception as e:
+            timer.error()
+            error_msg = f"Error: {str(e)}"
+            print(f"\n❌ {error_msg}")
+        
+        self._record_streamed(chunks, complete)
+    
+    def _record_streamed(self, chunks: List[str], complete: bool) -> None:
+        """Add a streamed answer to history; one cut off by an error is marked as such
+        and kept out of the model's context"""
+        self.stream_failed = not complete
+        if not chunks:
+            return
+        if complete:
+            self.add_to_history("assistant", "".join(chunks))
+            self.message_count += 1
+        else:
+            self.add_to_history("assistant", "".join(chunks) + TRUNCATED_MARKER, api=False)
+    
+    def save_conversation(self) -> None:
+        """Make sure every journaled message is durably on disk"""
+        try:
+            self.journal.sync()
             print(f"\n✅ Conversation saved to {self.log_file}")
         except Exception as e:
             print(f"\n❌ Could not save conversation: {str(e)}")
     
+    def iter_history(self) -> Iterator[Message]:
+        """Every message of the session, oldest first, including those left in a snapshot"""
+        if self.archive is not None:
+            for role, content, timestamp, _ in self.archive.messages(0, self.archived):
+                yield Message(role, content, timestamp)
+        yield from self.conversation_history
+    
+    def snapshot(self, path: str = "session.snapshot") -> int:
+        """
+        Save the session to a compact binary snapshot (see session_snapshot.py)
+        
+        Message text and the context summary are redacted unless the bot was created
+        with redact=False, so a resumed session sees placeholders instead of PII.
+        
+        Args:
+            path: Snapshot file, replaced atomically
+            
+        Returns:
+            Size of the snapshot in bytes
+        """
+        redact = get_pipeline().redactor.redact_text if self.redact else str
+        
+        def records():
+            if self.archive is not None:
+                yield from self.archive.messages(0, self.archived)
+            in_context = iter(self.api_history)
+            pending = next(in_context, None)
+            for message in self.conversation_history:
+                in_api = message.api is pending
+                if in_api:
+                    pending = next(in_context, None)
+                yield message.role, message.content, message.timestamp, in_api
+        
+        return write_snapshot(
+            path,
+            ((role, redact(content), timestamp, in_api) for role, content, timestamp, in_api in records()),
+            session_id=self.session_id,
+            summary=redact(self.context_window.summary),
+            summarized=self.archived_api + self.context_window.summarized_upto,
+            turns=self.message_count,
+            cache_hits=self.cache_hits
+        )
+    
+    def restore(self, path: str = "session.snapshot") -> int:
+        """
+        Resume a session saved with snapshot()
+        
+        Only the messages still in the context window are decoded; the turns already
+        folded into the rolling summary stay in the memory-mapped snapshot and are read
+        on demand by iter_history().
+        
+        Args:
+            path: Snapshot file
+            
+        Returns:
+            Number of messages in the restored session
+            
+        Raises:
+            ValueError: The file is not a snapshot or has an unsupported version
+        """
+        snapshot = SessionSnapshot(path)
+        self.clear_history()
+        self.session_id = snapshot.session_id or self.session_id
+        self.message_count = snapshot.turns
+        self.cache_hits = snapshot.cache_hits
+        
+        # Find the first message after the summarized ones, from the index alone
+        start = 0
+        in_context = 0
+        archived_roles: Dict[str, int] = {}
+        for role, in_api in snapshot.records():
+            if in_context == snapshot.summarized:
+                break
+            archived_roles[role] = archived_roles.get(role, 0) + 1
+            in_context += in_api
+            start += 1
+        
+        for role, content, timestamp, in_api in snapshot.messages(start):
+            message = Message(role, content, timestamp)
+            self.conversation_history.append(message)
+            if in_api:
+                self.api_history.append(message.api)
+        self.context_window.summary = snapshot.summary
+        
+        if start:
+            self.archive, self.archived, self.archived_api = snapshot, start, in_context
+            self.archived_roles = archived_roles
+        else:
+            snapshot.close()
+        return len(snapshot)
+    
+    def _close_archive(self) -> None:
+        """Forget the messages left in a restored snapshot"""
+        if self.archive is not None:
+            self.archive.close()
+        self.archive = None
+        self.archived = self.archived_api = 0
+        self.archived_roles = {}
+    
+    def close(self) -> None:
+        """Flush and close the conversation journal"""
+        self._close_archive()
+        self.journal.close()
+    
     def clear_history(self) -> None:
         """Clear conversation history"""
         self.conversation_history.clear()
+        self.api_history.clear()
+        self.session_id = uuid.uuid4().hex
+        self.context_window.reset()
+        self._close_archive()
+        if self.prefetched is not None:
+            self.prefetched.clear()
+        self.metrics = TurnMetrics()
         self.message_count = 0
+        self.cache_hits = 0
     
     def get_stats(self) -> Dict:
         """Get conversation statistics"""
         return {
             "message_count": self.message_count,
-            "user_messages": len([m for m in self.conversation_history if m["role"] == "user"]),
-            "bot_responses": len([m for m in self.conversation_history if m["role"] == "assistant"]),
-            "duration_seconds": (datetime.now() - self.start_time).total_seconds()
+            "user_messages": self.archived_roles.get("user", 0)
+            + sum(1 for m in self.conversation_history if m.role == "user"),
+            "bot_responses": self.archived_roles.get("assistant", 0)
+            + sum(1 for m in self.conversation_history if m.role == "assistant"),
+            "cache_hits": self.cache_hits,
+            "cache_hit_rate": self.response_cache.get_stats()["hit_rate"],
+            "routed_locally": self.metrics.counters["routed_total"],
+            "prefetch_hits": self.metrics.counters["prefetch_hits_total"],
+            "duration_seconds": (datetime.now() - self.start_time).total_seconds(),
+            "turns": self.metrics.summary()
         }
     
     def display_welcome(self) -> None:
@@ -154,7 +433,9 @@ class BankingBot:
         print("  • 'quit' or 'exit' - End the conversation")
         print("  • 'clear' - Start a new conversation")
         print("  • 'stats' - Show conversation statistics")
-        print("  • 'save' - Save conversation to file")
+        print("  • 'save' - Flush the conversation log to disk")
+        print("  • 'snapshot' / 'resume' - Save the session / pick up a saved one")
+        print("  • 'metrics' - Print metrics in Prometheus text format")
         print("="*60 + "\n")
     
     def display_stats(self) -> None:
@@ -166,14 +447,65 @@ class BankingBot:
         print(f"Total Messages: {stats['message_count']}")
         print(f"Your Questions: {stats['user_messages']}")
         print(f"Bot Responses: {stats['bot_responses']}")
+        print(f"Cached Answers: {stats['cache_hits']} (hit rate {stats['cache_hit_rate']:.0%})")
+        print(f"Answered Locally: {stats['routed_locally']}")
+        shared_calls = client_stats(client).get("coalesced")
+        if shared_calls is not None:
+            print(f"Shared Model Calls: {shared_calls} (identical requests already in flight)")
+        if self.redact:
+            redaction = get_pipeline().get_stats()
+            print(f"Redacted From Logs: {sum(redaction['matches'].values())} items "
+                  f"({redaction['records_per_second']:,.0f} records/s)")
+        if self.prefetcher is not None:
+            prefetch = self.prefetcher.get_stats()
+            print(f"Prefetched Answers Used: {stats['prefetch_hits']} "
+                  f"({prefetch['issued']} prefetched, {prefetch['over_budget']} over budget)")
         print(f"Duration: {int(stats['duration_seconds'])} seconds")
+        
+        turns = stats["turns"]
+        print("-"*40)
+        print("⏱️ PER-TURN LATENCY (p50 / p95)")
+        for label, name in [
+            ("Request build", "request_build_seconds"),
+            ("Model latency", "model_latency_seconds"),
+            ("First token", "time_to_first_token_seconds"),
+        ]:
+            print(f"{label}: {format_seconds(turns[name]['p50'])} / {format_seconds(turns[name]['p95'])}")
+        prompt_tokens = turns["prompt_tokens"]["mean"]
+        completion_tokens = turns["completion_tokens"]["mean"]
+        if prompt_tokens is not None:
+            print(f"Avg tokens: {prompt_tokens:.0f} prompt / {completion_tokens or 0:.0f} completion")
+        if turns["payload_bytes_saved"]["count"]:
+            print(f"Compaction saved: {turns['payload_bytes_saved']['mean']:.0f} bytes / "
+                  f"{turns['prompt_tokens_saved']['mean']:.0f} tokens per request")
+        for tier, latency in turns["tiers"].items():
+            print(f"{tier.title()} model: {latency['count']} calls, "
+                  f"{format_seconds(latency['p50'])} / {format_seconds(latency['p95'])}")
+        if turns["tier_fallbacks_total"]:
+            print(f"Fallbacks to larger model: {turns['tier_fallbacks_total']}")
+        print(f"Errors: {turns['errors_total']}")
         print("-"*40 + "\n")
 
 
 def main():
     """Main function"""
-    bot = BankingBot()
+    try:
+        get_api_key()
+    except MissingAPIKeyError as e:
+        print(f"❌ Error: {str(e)}")
+        exit(1)
+    
+    # PREFETCH_SHARE=0.2 prefetches likely follow-ups with up to 20% of the API quota
+    prefetch_share = float(os.getenv("PREFETCH_SHARE", "0"))
+    bot = BankingBot(prefetcher=Prefetcher(share=prefetch_share) if prefetch_share > 0 else None)
     bot.display_welcome()
+    snapshot_file = os.getenv("SNAPSHOT_FILE", "session.snapshot")
+    
+    # Optionally expose process-wide metrics for Prometheus scraping
+    metrics_port = os.getenv("METRICS_PORT")
+    if metrics_port:
+        start_metrics_server(metrics, int(metrics_port))
+        print(f"📈 Metrics available at http://localhost:{metrics_port}/metrics\n")
     
     while True:
         try:
@@ -186,9 +518,7 @@ def main():
             if user_input.lower() in ['quit', 'exit']:
                 print("\n👋 Thank you for using Banking AI Assistant!")
                 if bot.message_count > 0:
-                    response = input("Would you like to save this conversation? (yes/no): ").strip().lower()
-                    if response in ['yes', 'y']:
-                        bot.save_conversation()
+                    bot.save_conversation()
                 break
             
             elif user_input.lower() == 'clear':
@@ -204,14 +534,29 @@ def main():
                 bot.save_conversation()
                 continue
             
+            elif user_input.lower() == 'snapshot':
+                size = bot.snapshot(snapshot_file)
+                print(f"💾 Session saved to {snapshot_file} ({size} bytes)\n")
+                continue
+            
+            elif user_input.lower() == 'resume':
+                try:
+                    count = bot.restore(snapshot_file)
+                    print(f"📂 Resumed a session of {count} messages from {snapshot_file}\n")
+                except (OSError, ValueError) as e:
+                    print(f"❌ Could not resume: {str(e)}\n")
+                continue
+            
+            elif user_input.lower() == 'metrics':
+                print("\n" + metrics.to_prometheus())
+                continue
+            
             # Get response from bot
             print("\n🤖 Banking Bot: ", end="", flush=True)
-            response = bot.get_response(user_input)
+            for chunk in bot.stream_response(user_input):
+                print(chunk, end="", flush=True)
             
-            if response:
-                print(response)
-            
-            print()  # Spacing
+            print("\n")  # Spacing
         
         except KeyboardInterrupt:
             print("\n\n👋 Conversation interrupted. Goodbye!")
@@ -219,6 +564,8 @@ def main():
         except Exception as e:
             print(f"\n❌ Error: {str(e)}")
             print("Please try again.\n")
+    
+    bot.close()
 
 
 if __name__ == "__main__":
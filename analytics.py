@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Conversation Analytics for the Banking Bot
+Scans saved conversations (legacy conversation_log.json files and JSON Lines journals,
+rotated and gzipped segments included) in parallel worker processes and writes topic,
+length, latency and question aggregates to a compact columnar .npz summary
+
+Run with: python analytics.py scan logs/ -o summary.npz --workers 8
+          python analytics.py show summary.npz --top 20
+"""
+
+import argparse
+import glob
+import gzip
+import json
+import os
+import re
+import sys
+from bisect import bisect_left
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from metrics import LATENCY_BUCKETS
+from pii_redaction import PIIRedactor
+from response_cache import normalize_text
+
+# Topics of user questions; the first matching topic wins
+TOPIC_PATTERNS = {
+    "fraud_security": r"\b(?:fraud\w*|scam\w*|phish\w*|stolen|hack\w*|secur\w*|suspicious|identity theft)\b",
+    "cards": r"\b(?:cards?|credit limit|rewards?|cashback|atm|pin)\b",
+    "loans_mortgages": r"\b(?:loans?|mortgages?|refinanc\w*|apr|borrow\w*|credit score|debt)\b",
+    "investments": r"\b(?:invest\w*|portfolio|stocks?|bonds?|etfs?|retire\w*|401k|ira)\b",
+    "transfers_payments": r"\b(?:transfers?|wire|send money|payments?|pay\w*|zelle|swift|iban)\b",
+    "interest_rates": r"\b(?:interest|apy|rates?|compound\w*|cds?)\b",
+    "budgeting": r"\b(?:budget\w*|sav(?:e|ing) money|emergency fund|expenses?|spending)\b",
+    "accounts": r"\b(?:accounts?|checking|savings|balance|statements?|overdraft|fees?)\b",
+}
+
+# Upper bounds (characters) of the message length histogram
+LENGTH_BUCKETS = (25, 50, 100, 200, 400, 800, 1600, 3200)
+
+# Questions kept in the summary, most frequent first
+SUMMARY_TOP_QUESTIONS = 1000
+
+# Longest question text stored in the summary
+SUMMARY_QUESTION_CHARS = 200
+
+_TOPICS = re.compile(
+    "|".join(f"(?P<{topic}>{pattern})" for topic, pattern in TOPIC_PATTERNS.items()),
+    re.IGNORECASE
+)
+
+
+def classify_topic(question: str) -> str:
+    """Topic of a user question ("other" if no topic matches)"""
+    match = _TOPICS.search(question)
+    return match.lastgroup if match else "other"
+
+
+def find_log_files(paths: Sequence[str]) -> List[str]:
+    """
+    Expand files, directories and glob patterns into conversation log files
+
+    Args:
+        paths: Files, directories (searched recursively) or glob patterns
+
+    Returns:
+        Sorted existing files (directories contribute their .json, .jsonl and .jsonl.gz files)
+    """
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in ("*.json", "*.jsonl", "*.jsonl.gz"):
+                files.update(glob.glob(os.path.join(path, "**", pattern), recursive=True))
+        else:
+            files.update(glob.glob(path))
+    return sorted(files)
+
+
+def iter_messages(path: str) -> Iterator[Dict]:
+    """
+    Stream the messages of one saved log
+
+    Args:
+        path: Legacy conversation_log.json file ({"conversation": [...]}), or a
+            journal file / segment (.jsonl, .jsonl.gz)
+
+    Yields:
+        Message records with session_id, role, content and timestamp
+    """
+    if path.endswith(".json"):
+        # Legacy format: one indented JSON document per conversation
+        with open(path, encoding="utf-8") as f:
+            try:
+                data = json.load(f)
+            except ValueError:
+                return
+        for message in data.get("conversation", []) if isinstance(data, dict) else []:
+            yield {"session_id": path, **message}
+        return
+
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # A torn final line from a crash; skip it
+                continue
+
+
+def _parse_time(timestamp) -> Optional[float]:
+    """POSIX seconds of an ISO timestamp (None if missing or malformed)"""
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class Aggregate:
+    """Mergeable counts over many conversations"""
+
+    def __init__(self):
+        self.files = 0
+        self.messages = 0
+        self.topics: Counter = Counter()
+        self.questions: Counter = Counter()
+        # Normalized first question of each session, across files (rotated segments)
+        self.session_first: Dict[str, str] = {}
+        # First spelling seen of each normalized question
+        self.examples: Dict[str, str] = {}
+        self.question_lengths = [0] * (len(LENGTH_BUCKETS) + 1)
+        self.answer_lengths = [0] * (len(LENGTH_BUCKETS) + 1)
+        self.latencies = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_total = 0.0
+
+    @property
+    def sessions(self) -> int:
+        """Number of distinct sessions"""
+        return len(self.session_first)
+
+    @property
+    def first_questions(self) -> Counter:
+        """Counts of sessions' first questions, which are context-free: cache candidates"""
+        return Counter(self.session_first.values())
+
+    def add_file(self, path: str) -> None:
+        """Stream one log file into the aggregate"""
+        messages = self.messages
+        # Time of each session's unanswered question; answer latency is measured from it
+        asked_at: Dict[str, Optional[float]] = {}
+
+        for record in iter_messages(path):
+            role, content = record.get("role"), record.get("content")
+            if not isinstance(content, str):
+                continue
+            session_id = record.get("session_id")
+            self.messages += 1
+
+            if role == "user":
+                key = normalize_text(content)
+                self.topics[classify_topic(content)] += 1
+                self.questions[key] += 1
+                self.examples.setdefault(key, content.strip()[:SUMMARY_QUESTION_CHARS])
+                self.question_lengths[bisect_left(LENGTH_BUCKETS, len(content))] += 1
+                self.session_first.setdefault(session_id, key)
+                asked_at[session_id] = _parse_time(record.get("timestamp"))
+
+            elif role == "assistant":
+                self.answer_lengths[bisect_left(LENGTH_BUCKETS, len(content))] += 1
+                started = asked_at.pop(session_id, None)
+                answered = _parse_time(record.get("timestamp"))
+                if started is not None and answered is not None and answered >= started:
+                    self.latencies[bisect_left(LATENCY_BUCKETS, answered - started)] += 1
+                    self.latency_total += answered - started
+
+        if self.messages > messages:
+            self.files += 1
+
+    def merge(self, other: "Aggregate") -> None:
+        """Add the counts of another aggregate, over later files, to this one"""
+        self.files += other.files
+        self.messages += other.messages
+        self.topics.update(other.topics)
+        self.questions.update(other.questions)
+        for session_id, key in other.session_first.items():
+            self.session_first.setdefault(session_id, key)
+        for key, example in other.examples.items():
+            self.examples.setdefault(key, example)
+        for mine, theirs in (
+            (self.question_lengths, other.question_lengths),
+            (self.answer_lengths, other.answer_lengths),
+            (self.latencies, other.latencies),
+        ):
+            for i, count in enumerate(theirs):
+                mine[i] += count
+        self.latency_total += other.latency_total
+
+
+def scan_file(path: str) -> Aggregate:
+    """Aggregate a single file (runs in a worker process)"""
+    aggregate = Aggregate()
+    aggregate.add_file(path)
+    return aggregate
+
+
+def analyze(paths: Sequence[str], workers: Optional[int] = None) -> Aggregate:
+    """
+    Aggregate many log files, one worker process per file at a time
+
+    Files are streamed, so memory use depends on the number of distinct questions
+    rather than the size of the logs.
+
+    Args:
+        paths: Files, directories or glob patterns (see find_log_files)
+        workers: Worker processes (CPU count if omitted; 1 scans in this process)
+
+    Returns:
+        The merged aggregate
+    """
+    files = find_log_files(paths)
+    total = Aggregate()
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(files) < 2:
+        for path in files:
+            total.add_file(path)
+        return total
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(files))) as executor:
+        # Results arrive in file order, so a session's first question comes from its oldest segment
+        for aggregate in executor.map(scan_file, files):
+            total.merge(aggregate)
+    return total
+
+
+def _top(counter: Counter, examples: Dict[str, str], limit: int, min_count: int = 1):
+    """Columns (text, count) of the most frequent entries, with PII redacted from the text
+    (logs written before redaction was added may still contain it)"""
+    top = [(key, count) for key, count in counter.most_common(limit) if count >= min_count]
+    redactor = PIIRedactor()
+    texts = np.array([redactor.redact_text(examples.get(key, key)) for key, _ in top], dtype=str)
+    counts = np.array([count for _, count in top], dtype=np.int64)
+    return texts, counts
+
+
+def write_summary(aggregate: Aggregate, path: str, top: int = SUMMARY_TOP_QUESTIONS) -> None:
+    """
+    Write an aggregate as a compressed columnar .npz file
+
+    Every column is a NumPy array, so a summary reloads in milliseconds
+    regardless of how many logs went into it.
+
+    Args:
+        aggregate: Aggregate to store
+        path: Output file (.npz)
+        top: Most frequent questions and cache candidates to keep
+    """
+    topics = aggregate.topics.most_common()
+    question_texts, question_counts = _top(aggregate.questions, aggregate.examples, top)
+    # Repeated first questions are what the response cache can answer
+    candidate_texts, candidate_counts = _top(aggregate.first_questions, aggregate.examples, top, min_count=2)
+
+    with open(path, "wb") as f:
+        np.savez_compressed(
+            f,
+            totals=np.array([aggregate.files, aggregate.sessions, aggregate.messages], dtype=np.int64),
+            topic_names=np.array([name for name, _ in topics], dtype=str),
+            topic_counts=np.array([count for _, count in topics], dtype=np.int64),
+            length_buckets=np.array(LENGTH_BUCKETS, dtype=np.int64),
+            question_lengths=np.array(aggregate.question_lengths, dtype=np.int64),
+            answer_lengths=np.array(aggregate.answer_lengths, dtype=np.int64),
+            latency_buckets=np.array(LATENCY_BUCKETS, dtype=np.float64),
+            latency_counts=np.array(aggregate.latencies, dtype=np.int64),
+            latency_total=np.array(aggregate.latency_total, dtype=np.float64),
+            question_texts=question_texts,
+            question_counts=question_counts,
+            candidate_texts=candidate_texts,
+            candidate_counts=candidate_counts,
+        )
+
+
+def load_summary(path: str) -> Dict[str, np.ndarray]:
+    """Load every column of a summary written by write_summary()"""
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def bucket_percentile(bounds: np.ndarray, counts: np.ndarray, pct: float) -> Optional[float]:
+    """Upper bound of the histogram bucket holding a percentile (inf for the overflow bucket)"""
+    total = counts.sum()
+    if not total:
+        return None
+    index = int(np.searchsorted(np.cumsum(counts), pct / 100 * total))
+    return float(bounds[index]) if index < len(bounds) else float("inf")
+
+
+def print_report(summary: Dict[str, np.ndarray], top: int = 10) -> None:
+    """Print a summary as a readable report"""
+    files, sessions, messages = (int(n) for n in summary["totals"])
+    print("\n" + "=" * 60)
+    print("📊 CONVERSATION ANALYTICS")
+    print("=" * 60)
+    print(f"Files: {files}  Sessions: {sessions}  Messages: {messages}")
+
+    total_topics = summary["topic_counts"].sum()
+    if total_topics:
+        print("\n🏷️ Topics")
+        for name, count in zip(summary["topic_names"], summary["topic_counts"]):
+            print(f"  {name:<20} {count:>8}  {count / total_topics:>6.1%}")
+
+    print("\n📏 Message length (chars, p50 / p95)")
+    for label, column in (("Questions", "question_lengths"), ("Answers", "answer_lengths")):
+        p50 = bucket_percentile(summary["length_buckets"], summary[column], 50)
+        p95 = bucket_percentile(summary["length_buckets"], summary[column], 95)
+        print(f"  {label}: ≤{p50} / ≤{p95}" if p50 is not None else f"  {label}: -")
+
+    latency_count = summary["latency_counts"].sum()
+    if latency_count:
+        p50 = bucket_percentile(summary["latency_buckets"], summary["latency_counts"], 50)
+        p95 = bucket_percentile(summary["latency_buckets"], summary["latency_counts"], 95)
+        mean = float(summary["latency_total"]) / latency_count
+        print(f"\n⏱️ Answer latency: mean {mean:.2f}s, p50 ≤{p50}s, p95 ≤{p95}s ({latency_count} answers)")
+
+    print(f"\n❓ Most frequent questions (top {top})")
+    for text, count in zip(summary["question_texts"][:top], summary["question_counts"][:top]):
+        print(f"  {count:>6}  {text}")
+
+    print(f"\n💾 Cache candidates: repeated first questions (top {top})")
+    for text, count in zip(summary["candidate_texts"][:top], summary["candidate_counts"][:top]):
+        print(f"  {count:>6}  {text}")
+    print("=" * 60 + "\n")
+
+
+def main(argv=None) -> int:
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Analyze saved Banking Bot conversations")
+    commands = parser.add_subparsers(dest="command", required=True)
+    scan = commands.add_parser("scan", help="Aggregate logs into a summary file")
+    scan.add_argument("paths", nargs="*", default=["conversation_log.json", "conversation_log*.jsonl*"],
+                      help="Log files, directories or glob patterns")
+    scan.add_argument("-o", "--output", default="conversation_summary.npz")
+    scan.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    scan.add_argument("--top", type=int, default=10, help="Questions to print")
+    show = commands.add_parser("show", help="Print a summary file")
+    show.add_argument("summary")
+    show.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.command == "scan":
+        aggregate = analyze(args.paths, args.workers)
+        if not aggregate.files:
+            print("❌ No conversation logs found")
+            return 1
+        write_summary(aggregate, args.output)
+        print(f"✅ Summary of {aggregate.files} files written to {args.output}")
+        print_report(load_summary(args.output), args.top)
+        return 0
+
+    print_report(load_summary(args.summary), args.top)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Async Banking Bot with a Concurrent Session Engine
+Drives many independent conversations on one event loop through a shared client
+"""
+
+import asyncio
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from advanced_banking_bot import BankingBot
+from bot_core import (
+    BANKING_SYSTEM_PROMPT, complete_chat_async, get_api_key, ground_messages, stream_chat_async
+)
+from context_window import ContextWindow
+from conversation_journal import ConversationJournal
+from pii_redaction import RedactingJournal
+
+if TYPE_CHECKING:
+    import httpx
+
+
+def create_http_pool(max_connections: int = 100, timeout: float = 60.0) -> "httpx.AsyncClient":
+    """
+    Create the shared, connection-pooled HTTP client used for async requests
+
+    Args:
+        max_connections: Maximum open connections to the API
+        timeout: Per-request timeout in seconds
+
+    Returns:
+        httpx.AsyncClient that keeps connections alive between requests
+    """
+    import httpx
+
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections
+        ),
+        timeout=timeout
+    )
+
+
+def create_async_client(http_pool: "httpx.AsyncClient"):
+    """
+    Create a resilient Mistral client whose async requests use a shared connection pool
+
+    Args:
+        http_pool: Pool from create_http_pool()
+
+    Returns:
+        ResilientClient wrapping the Mistral SDK
+    """
+    from mistralai import Mistral
+    from resilient_client import ResilientClient
+
+    api_key = get_api_key()
+    return ResilientClient(Mistral(api_key=api_key, async_client=http_pool), api_key=api_key)
+
+
+class AsyncBankingBot(BankingBot):
+    """Banking Bot session whose requests run on an asyncio event loop"""
+
+    def __init__(
+        self,
+        client,
+        concurrency: Optional[asyncio.Semaphore] = None,
+        log_file: str = "conversation_log.jsonl",
+        context_window: Optional[ContextWindow] = None,
+        journal: Optional[ConversationJournal] = None,
+        redact: bool = True
+    ):
+        """
+        Args:
+            client: Shared Mistral client used for async requests
+            concurrency: Semaphore bounding in-flight API calls across sessions
+            log_file: Journal file used when no shared journal is given
+            context_window: ContextWindow that bounds the request size
+            journal: Shared ConversationJournal for all sessions
+            redact: Redact messages before they reach the journal (False when the
+                journal redacts them itself)
+        """
+        super().__init__(log_file=log_file, context_window=context_window, journal=journal, redact=redact)
+        self.client = client
+        self._concurrency = concurrency or asyncio.Semaphore(1)
+        # asyncio.Lock wakes waiters in FIFO order, which keeps turns ordered
+        self._turn_lock = asyncio.Lock()
+
+    def _build_messages(self) -> List[Dict]:
+        """Build the full message list for the API"""
+        return ground_messages(
+            self.context_window.request_messages(BANKING_SYSTEM_PROMPT, self.api_history)
+        )
+
+    async def get_response(self, user_message: str) -> Optional[str]:
+        """
+        Get response from Mistral AI without blocking the event loop
+
+        Turns of the same session run strictly in the order they were submitted.
+
+        Args:
+            user_message: User's input message
+
+        Returns:
+            Bot's response or None if error
+        """
+        async with self._turn_lock:
+            timer = self.start_turn()
+            routed = self._get_routed(user_message, timer)
+            if routed is not None:
+                return routed
+            self.add_to_history("user", user_message)
+
+            try:
+                messages = self._build_messages()
+                timer.request_built()
+
+                async with self._concurrency:
+                    bot_message = await complete_chat_async(
+                        messages, timer, self.client, self.model_policy
+                    )
+
+                self.add_to_history("assistant", bot_message)
+                self.message_count += 1
+
+                return bot_message
+
+            except Exception as e:
+                timer.error()
+                print(f"\n❌ Error: {str(e)}")
+                return None
+
+    async def stream_response(self, user_message: str) -> AsyncIterator[str]:
+        """
+        Stream response from Mistral AI as tokens arrive
+
+        Args:
+            user_message: User's input message
+
+        Yields:
+            Chunks of the bot's response; the full response is added to
+            history once the stream completes (stream_failed tells whether it did)
+        """
+        async with self._turn_lock:
+            self.stream_failed = False
+            timer = self.start_turn()
+            routed = self._get_routed(user_message, timer)
+            if routed is not None:
+                yield routed
+                return
+            self.add_to_history("user", user_message)
+
+            chunks: List[str] = []
+            complete = False
+            try:
+                messages = self._build_messages()
+                timer.request_built()
+
+                async with self._concurrency:
+                    stream = stream_chat_async(messages, timer, self.client, self.model_policy)
+                    async for delta in stream:
+                        chunks.append(delta)
+                        yield delta
+                complete = True
+
+            except Exception as e:
+                timer.error()
+                print(f"\n❌ Error: {str(e)}")
+
+            self._record_streamed(chunks, complete)
+
+
+class SessionEngine:
+    """Runs many AsyncBankingBot sessions with a global concurrency cap and backpressure"""
+
+    def __init__(
+        self,
+        client=None,
+        max_concurrency: int = 64,
+        max_pending: int = 1024,
+        journal: Optional[ConversationJournal] = None
+    ):
+        """
+        Args:
+            client: Shared Mistral client (a pooled one is created if omitted)
+            max_concurrency: Maximum API calls in flight across all sessions
+            max_pending: Maximum submitted turns (queued or running); further
+                submissions wait until a slot frees up
+            journal: Journal shared by all sessions (conversation_log.jsonl if omitted)
+        """
+        self._http_pool = None
+        if client is None:
+            self._http_pool = create_http_pool(max_connections=max_concurrency)
+            client = create_async_client(self._http_pool)
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        # Wrapped once here, so every session shares the redaction stage as well
+        self.journal = RedactingJournal(journal or ConversationJournal())
+        self.sessions: Dict[str, AsyncBankingBot] = {}
+        self._concurrency = asyncio.Semaphore(max_concurrency)
+        self._admission = asyncio.Semaphore(max_pending)
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+
+    def get_session(self, session_id: str) -> AsyncBankingBot:
+        """Get the bot for a session, creating it on first use"""
+        bot = self.sessions.get(session_id)
+        if bot is None:
+            bot = AsyncBankingBot(self.client, concurrency=self._concurrency, journal=self.journal)
+            self.sessions[session_id] = bot
+        return bot
+
+    def close_session(self, session_id: str) -> None:
+        """Drop a session and its history"""
+        self.sessions.pop(session_id, None)
+
+    async def chat(self, session_id: str, user_message: str) -> Optional[str]:
+        """
+        Submit one turn for a session and wait for the answer
+
+        Args:
+            session_id: Identifier of the conversation
+            user_message: User's input message
+
+        Returns:
+            Bot's response or None if error
+        """
+        # Backpressure: wait here while too many turns are outstanding
+        async with self._admission:
+            self.pending += 1
+            try:
+                response = await self.get_session(session_id).get_response(user_message)
+            finally:
+                self.pending -= 1
+
+        if response is None:
+            self.failed += 1
+        else:
+            self.completed += 1
+        return response
+
+    async def chat_many(self, turns: Iterable[Tuple[str, str]]) -> List[Optional[str]]:
+        """
+        Run many (session_id, message) turns concurrently
+
+        Turns for the same session are answered in the order given. At most
+        max_concurrency * 4 turns are submitted at a time, so a large input does not
+        create a task per turn up front.
+
+        Returns:
+            Responses in the same order as the input turns
+        """
+        responses: List[Optional[str]] = []
+        in_flight: Dict[asyncio.Task, int] = {}
+        window = max(1, self.max_concurrency) * 4
+
+        for index, (session_id, message) in enumerate(turns):
+            responses.append(None)
+            if len(in_flight) >= window:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    responses[in_flight.pop(task)] = task.result()
+            in_flight[asyncio.ensure_future(self.chat(session_id, message))] = index
+
+        if in_flight:
+            done, _ = await asyncio.wait(in_flight)
+            for task in done:
+                responses[in_flight[task]] = task.result()
+        return responses
+
+    def get_stats(self) -> Dict:
+        """Get engine statistics"""
+        return {
+            "sessions": len(self.sessions),
+            "pending": self.pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "max_concurrency": self.max_concurrency,
+            "max_pending": self.max_pending
+        }
+
+    async def aclose(self) -> None:
+        """Close the journal and pooled connections held by the shared client"""
+        # Waits for messages still queued for redaction
+        await asyncio.to_thread(self.journal.close)
+        if self._http_pool is not None:
+            await self._http_pool.aclose()
+
+
+async def main():
+    """Answer a few sample questions on several concurrent sessions"""
+    engine = SessionEngine(max_concurrency=8)
+    questions = [
+        "What is the difference between a savings account and a checking account?",
+        "How can I protect myself from fraud?",
+        "What factors should I consider when applying for a mortgage?"
+    ]
+    turns = [(f"session-{i}", question) for i, question in enumerate(questions)]
+
+    try:
+        responses = await engine.chat_many(turns)
+        for (session_id, question), response in zip(turns, responses):
+            print(f"[{session_id}] You: {question}")
+            print(f"[{session_id}] 🤖 Banking Bot: {response}\n")
+        print(f"📊 {engine.get_stats()}")
+    finally:
+        await engine.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
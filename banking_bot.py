@@ -4,83 +4,122 @@ Banking AI Bot using Mistral AI Large Model
 This bot provides banking-related assistance and advice
 """
 
-import os
-from mistralai import Mistral
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
-# Initialize Mistral client with API key
-API_KEY = os.getenv("MISTRAL_API_KEY")
-if not API_KEY:
-    print("❌ Error: MISTRAL_API_KEY not found. Please set it in your .env file.")
-    exit(1)
-client = Mistral(api_key=API_KEY)
-
-# System prompt for the banking bot
-BANKING_SYSTEM_PROMPT = """You are a professional banking assistant AI bot. You help customers with:
-- Account information and balance inquiries
-- Transaction history and statements
-- Banking products (savings accounts, checking accounts, loans, mortgages)
-- Investment advice and portfolio management
-- Credit card information and rewards
-- Money transfer and payment assistance
-- Fraud protection and security advice
-- Budgeting and financial planning
-- Loan applications and mortgage guidance
-- Interest rates and APY information
-
-You are knowledgeable, professional, and helpful. You always:
-- Provide accurate financial information
-- Encourage responsible banking practices
-- Suggest consulting with financial advisors for complex decisions
-- Prioritize customer data security
-- Are empathetic to customer concerns
-- Provide clear explanations of banking concepts
-
-DISCLAIMER: This is an educational AI assistant. For actual banking transactions, 
-please contact your bank directly or use official banking channels."""
-
-
-def create_chat_conversation():
-    """Initialize conversation history"""
-    return []
-
-
-def chat_with_bot(user_message, conversation_history):
+from bot_core import (
+    BANKING_SYSTEM_PROMPT, MissingAPIKeyError, complete_chat, get_api_key, ground_messages,
+    stream_chat
+)
+from context_window import ContextWindow
+from intent_router import IntentRouter
+from metrics import TurnMetrics
+from response_cache import ResponseCache, is_context_free
+
+# Mistral client override (tests, benchmarks); the shared lazy client is used when None
+client = None
+
+# Cache of answers to context-free first questions
+response_cache = ResponseCache()
+
+# Templated answers to small talk
+intent_router = IntentRouter()
+
+# Per-turn latency and token usage for this process
+metrics = TurnMetrics()
+
+
+class Conversation(list):
+    """Conversation history (a list of message dicts) carrying its own context window"""
+    
+    def __init__(self, messages=(), context_window=None):
+        """
+        Args:
+            messages: Initial messages
+            context_window: ContextWindow for this conversation (a new one if omitted)
+        """
+        super().__init__(messages)
+        self.context_window = context_window or ContextWindow()
+
+
+def create_chat_conversation(context_window=None):
+    """
+    Initialize conversation history
+    
+    Args:
+        context_window: ContextWindow for the new conversation (a new one if omitted)
+    
+    Returns:
+        An empty Conversation with its own context window and rolling summary
+    """
+    return Conversation(context_window=context_window)
+
+
+def conversation_window(conversation_history, context_window=None):
+    """
+    Context window to bound a request with
+    
+    Args:
+        conversation_history: List of previous messages in conversation
+        context_window: Explicit ContextWindow, used as is
+    
+    Returns:
+        The explicit window, the conversation's own window, or a new window for a
+        plain list (so no summary is ever shared between conversations)
+    """
+    if context_window is not None:
+        return context_window
+    return getattr(conversation_history, "context_window", None) or ContextWindow()
+
+
+def chat_with_bot(user_message, conversation_history, context_window=None):
     """
     Send a message to the banking bot and get a response
     
     Args:
         user_message: The user's input message
         conversation_history: List of previous messages in conversation
+        context_window: ContextWindow that bounds the request size
+            (defaults to the conversation's own window)
     
     Returns:
         The bot's response and updated conversation history
     """
+    timer = metrics.start_turn()
+    
+    # Answer small talk from templates, keeping it out of the model's context
+    routed = intent_router.route(user_message)
+    if routed is not None:
+        timer.routed()
+        return routed[1], conversation_history
+    
     # Add user message to history
     conversation_history.append({
         "role": "user",
         "content": user_message
     })
+    context_window = conversation_window(conversation_history, context_window)
+    
+    # Serve context-free first questions from the response cache
+    cacheable = is_context_free(conversation_history)
+    if cacheable:
+        cached = response_cache.get(user_message)
+        if cached is not None:
+            timer.cache_hit()
+            conversation_history.append({
+                "role": "assistant",
+                "content": cached
+            })
+            return cached, conversation_history
     
     try:
-        # Call Mistral API with conversation history
-        response = client.chat.complete(
-            model="mistral-large-latest",
-            messages=[
-                {
-                    "role": "system",
-                    "content": BANKING_SYSTEM_PROMPT
-                }
-            ] + conversation_history,
-            temperature=0.7,
-            max_tokens=1024
+        # History dicts are shared with the request rather than copied
+        messages = ground_messages(
+            context_window.request_messages(BANKING_SYSTEM_PROMPT, conversation_history)
         )
+        timer.request_built()
         
-        # Extract bot response
-        bot_message = response.choices[0].message.content
+        # Call Mistral API with conversation history
+        bot_message = complete_chat(messages, timer, client)
+        if cacheable:
+            response_cache.put(user_message, bot_message)
         
         # Add bot response to history
         conversation_history.append({
@@ -91,11 +130,87 @@ def chat_with_bot(user_message, conversation_history):
         return bot_message, conversation_history
     
     except Exception as e:
+        timer.error()
         error_message = f"Error communicating with Mistral AI: {str(e)}"
         print(f"\n❌ {error_message}")
         return None, conversation_history
 
 
+def stream_chat_with_bot(user_message, conversation_history, context_window=None):
+    """
+    Send a message to the banking bot and yield the response as it arrives
+    
+    Args:
+        user_message: The user's input message
+        conversation_history: List of previous messages in conversation
+        context_window: ContextWindow that bounds the request size
+            (defaults to the conversation's own window)
+    
+    Yields:
+        Text chunks of the bot's response. The full response is appended
+        to conversation_history once the stream is complete (not if it failed).
+    """
+    timer = metrics.start_turn()
+    
+    # Answer small talk from templates, keeping it out of the model's context
+    routed = intent_router.route(user_message)
+    if routed is not None:
+        timer.routed()
+        yield routed[1]
+        return
+    
+    # Add user message to history
+    conversation_history.append({
+        "role": "user",
+        "content": user_message
+    })
+    context_window = conversation_window(conversation_history, context_window)
+    
+    # Serve context-free first questions from the response cache
+    cacheable = is_context_free(conversation_history)
+    if cacheable:
+        cached = response_cache.get(user_message)
+        if cached is not None:
+            timer.cache_hit()
+            conversation_history.append({
+                "role": "assistant",
+                "content": cached
+            })
+            yield cached
+            return
+    
+    chunks = []
+    failed = False
+    try:
+        # History dicts are shared with the request rather than copied
+        messages = ground_messages(
+            context_window.request_messages(BANKING_SYSTEM_PROMPT, conversation_history)
+        )
+        timer.request_built()
+        
+        # Call Mistral streaming API with conversation history
+        for delta in stream_chat(messages, timer, client):
+            chunks.append(delta)
+            yield delta
+    
+    except Exception as e:
+        timer.error()
+        error_message = f"Error communicating with Mistral AI: {str(e)}"
+        print(f"\n❌ {error_message}")
+        failed = True
+    
+    # Add the complete bot response to history; an answer cut off by an error was
+    # only shown, so later turns do not send a truncated answer to the model
+    if chunks and not failed:
+        bot_message = "".join(chunks)
+        conversation_history.append({
+            "role": "assistant",
+            "content": bot_message
+        })
+        if cacheable:
+            response_cache.put(user_message, bot_message)
+
+
 def display_welcome_message():
     """Display welcome message to the user"""
     print("\n" + "="*60)
@@ -115,6 +230,12 @@ def display_welcome_message():
 
 def main():
     """Main function to run the banking bot"""
+    try:
+        get_api_key()
+    except MissingAPIKeyError as e:
+        print(f"❌ Error: {str(e)}")
+        exit(1)
+    
     display_welcome_message()
     conversation_history = create_chat_conversation()
     
@@ -140,12 +261,10 @@ def main():
             
             # Get response from bot
             print("\n🤖 Banking Bot: ", end="", flush=True)
-            response, conversation_history = chat_with_bot(user_input, conversation_history)
-            
-            if response:
-                print(response)
+            for chunk in stream_chat_with_bot(user_input, conversation_history):
+                print(chunk, end="", flush=True)
             
-            print()  # Add spacing between exchanges
+            print("\n")  # Add spacing between exchanges
         
         except KeyboardInterrupt:
             print("\n\n👋 Conversation interrupted. Goodbye!")
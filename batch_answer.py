@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Batch Question Answering for the Banking Bot
+Answers a JSONL or CSV file of questions through a bounded worker pool, writing results in
+input order with resumable checkpoints and de-duplicated requests
+
+Run with: python batch_answer.py questions.jsonl answers.jsonl --workers 8
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from bot_core import BANKING_SYSTEM_PROMPT, MissingAPIKeyError, complete_chat, get_api_key
+from metrics import TurnMetrics
+from response_cache import normalize_text
+
+# Output records written between fsyncs of the output file
+FSYNC_EVERY = 64
+
+
+def read_questions(
+    path: str,
+    question_field: str = "question",
+    id_field: str = "id"
+) -> Iterator[Dict]:
+    """
+    Stream questions from a JSONL or CSV file
+
+    JSONL lines may be objects or plain strings; CSV files need a header row. A missing
+    id defaults to the question's 1-based position in the file.
+
+    Args:
+        path: Input file (.csv for CSV, anything else is read as JSONL)
+        question_field: Field or column holding the question
+        id_field: Field or column holding the question id
+
+    Yields:
+        {"id": ..., "question": ...} in file order
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+
+        for position, row in enumerate(rows, 1):
+            if isinstance(row, str):
+                row = {question_field: row}
+            yield {
+                "id": row.get(id_field) or position,
+                "question": (row.get(question_field) or "").strip()
+            }
+
+
+def load_checkpoint(path: str) -> Tuple[int, Dict[str, str]]:
+    """
+    Read the results already written by an interrupted run
+
+    The output file is its own checkpoint: results are written in input order, so the
+    number of complete lines is the number of questions done. A torn last line is cut off.
+
+    Args:
+        path: Output file of the previous run
+
+    Returns:
+        (questions done, answers by normalized question)
+    """
+    if not os.path.exists(path):
+        return 0, {}
+
+    done = 0
+    answers: Dict[str, str] = {}
+    valid_bytes = 0
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b"\n"):
+                break
+            done += 1
+            valid_bytes += len(line)
+            if record.get("answer") is not None:
+                answers[normalize_text(record["question"])] = record["answer"]
+
+    if valid_bytes < os.path.getsize(path):
+        with open(path, "r+b") as f:
+            f.truncate(valid_bytes)
+    return done, answers
+
+
+def answer_question(question: str, client=None, metrics: Optional[TurnMetrics] = None) -> str:
+    """
+    Answer one standalone question (no conversation history)
+
+    Args:
+        question: The question to answer
+        client: Mistral client override (the shared client if omitted)
+        metrics: Metrics to record the turn into
+
+    Returns:
+        The bot's answer
+    """
+    timer = (metrics or TurnMetrics()).start_turn()
+    messages = [
+        {"role": "system", "content": BANKING_SYSTEM_PROMPT},
+        {"role": "user", "content": question}
+    ]
+    timer.request_built()
+    try:
+        # Batch answers are plain text; calculator schemas would only add prompt tokens
+        return complete_chat(messages, timer, client, tools=False)
+    except Exception:
+        timer.error()
+        raise
+
+
+def run_batch(
+    input_path: str,
+    output_path: str,
+    workers: int = 8,
+    resume: bool = True,
+    client=None,
+    answer: Optional[Callable[[str], str]] = None,
+    question_field: str = "question",
+    id_field: str = "id"
+) -> Dict:
+    """
+    Answer every question in a file and write the results in input order
+
+    At most workers * 4 questions are held in memory; duplicates (after normalizing case,
+    punctuation and whitespace) share one request, including answers from a resumed run.
+
+    Args:
+        input_path: JSONL or CSV file of questions
+        output_path: JSONL file of {"id", "question", "answer", "error"} records
+        workers: Number of concurrent requests
+        resume: Continue after the results already in output_path (otherwise start over)
+        client: Mistral client override (the shared client if omitted)
+        answer: Callable(question) -> answer replacing the model call
+        question_field: Input field or column holding the question
+        id_field: Input field or column holding the question id
+
+    Returns:
+        Run statistics
+    """
+    metrics = TurnMetrics()
+    answer = answer or (lambda question: answer_question(question, client, metrics))
+
+    if resume:
+        done, answers = load_checkpoint(output_path)
+    else:
+        done, answers = 0, {}
+        open(output_path, "w").close()
+
+    stats = {"skipped": done, "answered": 0, "deduplicated": 0, "failed": 0, "requests": 0}
+    in_flight: Dict[str, Future] = {}
+    pending: deque = deque()
+    window = max(1, workers) * 4
+    started = time.perf_counter()
+
+    def submit(record: Dict) -> Tuple[Dict, str, Future]:
+        key = normalize_text(record["question"])
+        if not key:
+            future: Future = Future()
+            future.set_exception(ValueError("Empty question"))
+        elif key in answers:
+            future = Future()
+            future.set_result(answers[key])
+            stats["deduplicated"] += 1
+        elif key in in_flight:
+            future = in_flight[key]
+            stats["deduplicated"] += 1
+        else:
+            future = executor.submit(answer, record["question"])
+            in_flight[key] = future
+            stats["requests"] += 1
+        return record, key, future
+
+    def write_next(out) -> None:
+        record, key, future = pending.popleft()
+        try:
+            record["answer"], record["error"] = future.result(), None
+            answers.setdefault(key, record["answer"])
+            stats["answered"] += 1
+        except Exception as e:
+            record["answer"], record["error"] = None, str(e)
+            stats["failed"] += 1
+        if in_flight.get(key) is future:
+            del in_flight[key]
+
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        written = stats["answered"] + stats["failed"]
+        if written % FSYNC_EVERY == 0:
+            out.flush()
+            os.fsync(out.fileno())
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        with open(output_path, "a", encoding="utf-8") as out:
+            try:
+                for position, record in enumerate(read_questions(input_path, question_field, id_field)):
+                    if position < done:
+                        continue
+                    pending.append(submit(record))
+                    # Keep memory bounded; the oldest result is written first
+                    while len(pending) >= window:
+                        write_next(out)
+                while pending:
+                    write_next(out)
+            finally:
+                out.flush()
+                os.fsync(out.fileno())
+    finally:
+        for _, _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = elapsed
+    stats["questions_per_second"] = (stats["answered"] + stats["failed"]) / elapsed if elapsed else 0.0
+    stats["model_latency_seconds"] = metrics.summary()["model_latency_seconds"]
+    return stats
+
+
+def main(argv=None) -> int:
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Answer a file of banking questions")
+    parser.add_argument("input", help="JSONL or CSV file of questions")
+    parser.add_argument("output", help="JSONL file for the answers (also the resume checkpoint)")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent requests")
+    parser.add_argument("--no-resume", action="store_true", help="Start over instead of resuming")
+    parser.add_argument("--question-field", default="question", help="Field or column with the question")
+    parser.add_argument("--id-field", default="id", help="Field or column with the question id")
+    args = parser.parse_args(argv)
+
+    try:
+        get_api_key()
+    except MissingAPIKeyError as e:
+        print(f"❌ Error: {str(e)}")
+        return 1
+
+    try:
+        stats = run_batch(
+            args.input, args.output, workers=args.workers, resume=not args.no_resume,
+            question_field=args.question_field, id_field=args.id_field
+        )
+    except KeyboardInterrupt:
+        print(f"\n⏸️ Interrupted. Run the same command again to resume from {args.output}")
+        return 130
+
+    print(f"✅ Answers written to {args.output}")
+    print(f"📊 Answered: {stats['answered']}  Failed: {stats['failed']}  "
+          f"Resumed past: {stats['skipped']}")
+    print(f"📊 API requests: {stats['requests']}  Deduplicated: {stats['deduplicated']}  "
+          f"Throughput: {stats['questions_per_second']:.1f} questions/s")
+    return 0 if stats["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Offline Benchmark Suite for the Banking Bot
+Drives the bots against a deterministic local stand-in for the Mistral API and reports
+latency percentiles, throughput, allocations and payload bytes per turn
+
+Run with: python benchmark.py --sessions 50 --turns 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterator, List, Optional
+
+# The web app checks for an API key when loaded; keep everything offline
+os.environ.setdefault("MISTRAL_API_KEY", "offline-benchmark")
+os.environ.setdefault("SESSION_STORE_URL", "sqlite:///:memory:")
+
+QUESTIONS = [
+    "What is the difference between a savings account and a checking account?",
+    "How can I protect myself from fraud?",
+    "What factors should I consider when applying for a mortgage?",
+    "How is APY different from APR?",
+    "What fees should I expect on a credit card?",
+    "How much should I keep in an emergency fund?",
+    "Can you explain how compound interest works?",
+    "What do I need to open a business account?",
+]
+
+ANSWER_WORDS = (
+    "Banks offer several products with different fees interest rates and access rules "
+    "so compare the terms carefully and consult a financial advisor for complex decisions"
+).split()
+
+
+class MockAPIError(Exception):
+    """Injected server error, shaped like the Mistral SDK's errors"""
+
+    def __init__(self, status_code: int = 503):
+        super().__init__(f"Injected HTTP {status_code}")
+        self.status_code = status_code
+
+
+class MockMistral:
+    """Deterministic local stand-in for the Mistral client"""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        tokens_per_second: float = 0.0,
+        answer_tokens: int = 120,
+        error_rate: float = 0.0,
+        seed: int = 0
+    ):
+        """
+        Args:
+            latency: Seconds before the first token (network + queueing)
+            tokens_per_second: Generation speed (0 = instant)
+            answer_tokens: Words in each generated answer
+            error_rate: Fraction of calls that fail with HTTP 503
+            seed: Seed for error injection and answer text
+        """
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self.calls = 0
+        self.payload_bytes: List[int] = []
+        self.chat = SimpleNamespace(
+            complete=self.complete,
+            stream=self.stream,
+            complete_async=self.complete_async,
+            stream_async=self.stream_async
+        )
+
+    def _begin(self, messages: List[Dict], wait: bool = True) -> List[str]:
+        """Record the request, inject faults and prepare the answer words"""
+        self.calls += 1
+        self.payload_bytes.append(len(json.dumps(messages).encode("utf-8")))
+        if self._random.random() < self.error_rate:
+            raise MockAPIError(503)
+        if self.latency and wait:
+            time.sleep(self.latency)
+        return [self._random.choice(ANSWER_WORDS) for _ in range(self.answer_tokens)]
+
+    def _usage(self, messages: List[Dict], words: List[str]) -> SimpleNamespace:
+        """Approximate token usage like the API reports it"""
+        prompt_tokens = sum(len(m["content"]) // 4 for m in messages)
+        return SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=len(words),
+            total_tokens=prompt_tokens + len(words)
+        )
+
+    def complete(self, messages: List[Dict], **kwargs) -> SimpleNamespace:
+        """Mock of client.chat.complete"""
+        words = self._begin(messages)
+        if self.tokens_per_second:
+            time.sleep(len(words) / self.tokens_per_second)
+        message = SimpleNamespace(content=" ".join(words), role="assistant")
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=message, finish_reason="stop")],
+            usage=self._usage(messages, words)
+        )
+
+    def stream(self, messages: List[Dict], **kwargs):
+        """Mock of client.chat.stream"""
+        words = self._begin(messages)
+        for i, word in enumerate(words):
+            if self.tokens_per_second:
+                time.sleep(1 / self.tokens_per_second)
+            delta = SimpleNamespace(content=word if i == 0 else " " + word)
+            choice = SimpleNamespace(delta=delta, finish_reason=None)
+            yield SimpleNamespace(data=SimpleNamespace(choices=[choice], usage=None))
+
+
+    async def complete_async(self, messages: List[Dict], **kwargs) -> SimpleNamespace:
+        """Mock of client.chat.complete_async (waits without blocking the event loop)"""
+        words = self._begin(messages, wait=False)
+        delay = self.latency + (len(words) / self.tokens_per_second if self.tokens_per_second else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        message = SimpleNamespace(content=" ".join(words), role="assistant")
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=message, finish_reason="stop")],
+            usage=self._usage(messages, words)
+        )
+
+    async def stream_async(self, messages: List[Dict], **kwargs):
+        """Mock of client.chat.stream_async"""
+        words = self._begin(messages, wait=False)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._stream_events_async(words)
+
+    async def _stream_events_async(self, words: List[str]):
+        """Async stream events for stream_async()"""
+        for i, word in enumerate(words):
+            if self.tokens_per_second:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            delta = SimpleNamespace(content=word if i == 0 else " " + word)
+            choice = SimpleNamespace(delta=delta, finish_reason=None)
+            yield SimpleNamespace(data=SimpleNamespace(choices=[choice], usage=None))
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def install_mock(module, mock: MockMistral) -> None:
+    """Point a bot module's client at the mock, keeping the resilience layer"""
+    from resilient_client import ResilientClient
+
+    module.client = ResilientClient(
+        mock, api_key=f"benchmark-{uuid.uuid4().hex}", base_delay=0.001,
+        max_delay=0.01, requests_per_second=1e9
+    )
+
+
+def make_cli_driver(mock: MockMistral) -> Callable:
+    """Driver for banking_bot.chat_with_bot"""
+    import banking_bot
+
+    install_mock(banking_bot, mock)
+    banking_bot.response_cache.clear()
+
+    def run_session(questions: List[str]) -> Iterator[Callable[[], None]]:
+        history = banking_bot.create_chat_conversation()
+        for question in questions:
+            yield lambda q=question: banking_bot.chat_with_bot(q, history)
+
+    return run_session
+
+
+def make_advanced_driver(mock: MockMistral, log_dir: str) -> Callable:
+    """Driver for advanced_banking_bot.BankingBot.get_response"""
+    import advanced_banking_bot
+    from conversation_journal import ConversationJournal
+
+    install_mock(advanced_banking_bot, mock)
+    advanced_banking_bot.response_cache.clear()
+    journal = ConversationJournal(os.path.join(log_dir, "benchmark.jsonl"))
+
+    def run_session(questions: List[str]) -> Iterator[Callable[[], None]]:
+        bot = advanced_banking_bot.BankingBot(journal=journal)
+        for question in questions:
+            yield lambda q=question: bot.get_response(q)
+
+    return run_session
+
+
+def make_web_driver(mock: MockMistral) -> Callable:
+    """Driver for web_app.get_bot_response (Streamlit in bare mode)"""
+    import streamlit as st
+    import web_app
+    from context_window import ContextWindow
+
+    install_mock(web_app, mock)
+    web_app.get_response_cache().clear()
+
+    def run_session(questions: List[str]) -> Iterator[Callable[[], None]]:
+        st.session_state.session_id = uuid.uuid4().hex
+        st.session_state.messages = []
+        st.session_state.api_history = []
+        st.session_state.role_counts = {}
+        st.session_state.context_window = ContextWindow()
+
+        def turn(question):
+            web_app.record_message("user", question)
+            web_app.record_message("assistant", web_app.get_bot_response(question))
+
+        for question in questions:
+            yield lambda q=question: turn(q)
+
+    return run_session
+
+
+def run_benchmark(
+    driver: Callable,
+    mock: MockMistral,
+    sessions: int,
+    turns: int,
+    trace_allocations: bool = False
+) -> Dict:
+    """
+    Run sessions x turns through a driver and collect per-turn measurements
+
+    Returns:
+        Report with latency percentiles (ms), throughput, payload bytes and
+        allocations per turn, plus late-vs-early turn latency growth
+    """
+    latencies: List[float] = []
+    by_turn: List[List[float]] = [[] for _ in range(turns)]
+    allocated: List[int] = []
+    payload_start = len(mock.payload_bytes)
+
+    if trace_allocations:
+        tracemalloc.start()
+
+    started = time.perf_counter()
+    for session in range(sessions):
+        # Session-specific wording keeps the first-turn response cache out of the measurement
+        questions = [
+            f"{QUESTIONS[(session + turn) % len(QUESTIONS)]} (customer {session}, turn {turn})"
+            for turn in range(turns)
+        ]
+        for turn, step in enumerate(driver(questions)):
+            if trace_allocations:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+            turn_start = time.perf_counter()
+            step()
+            elapsed = time.perf_counter() - turn_start
+            if trace_allocations:
+                allocated.append(tracemalloc.get_traced_memory()[1] - before)
+            latencies.append(elapsed)
+            by_turn[turn].append(elapsed)
+    wall = time.perf_counter() - started
+
+    if trace_allocations:
+        tracemalloc.stop()
+
+    payloads = mock.payload_bytes[payload_start:]
+    quarter = max(1, turns // 4)
+    early = [t for bucket in by_turn[:quarter] for t in bucket]
+    late = [t for bucket in by_turn[-quarter:] for t in bucket]
+
+    return {
+        "turns": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "throughput_tps": len(latencies) / wall if wall else 0.0,
+        "payload_bytes_per_turn": sum(payloads) / len(payloads) if payloads else 0.0,
+        "payload_bytes_last_turn": max(payloads) if payloads else 0,
+        "peak_alloc_bytes_per_turn": sum(allocated) / len(allocated) if allocated else None,
+        "late_vs_early_latency": (percentile(late, 50) / percentile(early, 50)
+                                  if early and percentile(early, 50) else None),
+    }
+
+
+def print_report(name: str, report: Dict) -> None:
+    """Print one target's results"""
+    print("\n" + "-"*60)
+    print(f"📊 {name}")
+    print("-"*60)
+    print(f"Turns:              {report['turns']}")
+    print(f"Latency p50/p95/p99: {report['p50_ms']:.2f} / {report['p95_ms']:.2f} / {report['p99_ms']:.2f} ms")
+    print(f"Throughput:         {report['throughput_tps']:.1f} turns/s")
+    print(f"Payload per turn:   {report['payload_bytes_per_turn']:.0f} B (max {report['payload_bytes_last_turn']} B)")
+    if report["peak_alloc_bytes_per_turn"] is not None:
+        print(f"Peak alloc per turn: {report['peak_alloc_bytes_per_turn'] / 1024:.1f} KiB")
+    if report["late_vs_early_latency"] is not None:
+        print(f"Late/early turn latency: {report['late_vs_early_latency']:.2f}x")
+
+
+def check_regressions(reports: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Compare p95 latency and payload size with a saved baseline"""
+    problems = []
+    for name, report in reports.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for key in ("p95_ms", "payload_bytes_per_turn"):
+            if base[key] and report[key] > base[key] * (1 + tolerance):
+                problems.append(f"{name}: {key} {report[key]:.2f} vs baseline {base[key]:.2f}")
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Offline benchmark for the banking bots")
+    parser.add_argument("--targets", default="cli,advanced,web",
+                        help="Comma-separated targets: cli, advanced, web")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0, help="Mock time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Mock generation speed")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of injected 503s")
+    parser.add_argument("--trace-allocations", action="store_true", help="Measure allocations (slower)")
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--baseline", help="Fail if p95 or payload regress against this report")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    reports: Dict[str, Dict] = {}
+    with tempfile.TemporaryDirectory() as log_dir:
+        for target in args.targets.split(","):
+            mock = MockMistral(
+                latency=args.latency, tokens_per_second=args.tokens_per_second,
+                error_rate=args.error_rate
+            )
+            try:
+                if target == "cli":
+                    driver = make_cli_driver(mock)
+                elif target == "advanced":
+                    driver = make_advanced_driver(mock, log_dir)
+                elif target == "web":
+                    driver = make_web_driver(mock)
+                else:
+                    print(f"❌ Unknown target: {target}")
+                    return 2
+            except ImportError as e:
+                print(f"\n⚠️ Skipping {target}: {str(e)}")
+                continue
+
+            reports[target] = run_benchmark(
+                driver, mock, args.sessions, args.turns, args.trace_allocations
+            )
+            print_report(target, reports[target])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+        print(f"\n✅ Report saved to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = check_regressions(reports, json.load(f), args.tolerance)
+        if problems:
+            print("\n❌ Regressions detected:")
+            for problem in problems:
+                print(f"  • {problem}")
+            return 1
+        print("\n✅ No regressions against baseline")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
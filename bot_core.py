@@ -0,0 +1,692 @@
+#!/usr/bin/env python3
+"""
+Shared Core of the Banking Bot
+System prompt, the lazily built process-wide Mistral client, retrieval from the knowledge
+index, the local financial calculator tools and the request code used by the CLI,
+advanced, async and web front ends
+
+Importing this module has no side effects: the .env file, the Mistral SDK, the client and
+the knowledge index are only loaded when the first request needs them.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from context_window import digest_text, estimate_tokens
+from metrics import TurnTimer
+
+# System prompt for the banking bot
+BANKING_SYSTEM_PROMPT = """You are a professional banking assistant AI bot. You help customers with:
+- Account information and balance inquiries
+- Transaction history and statements
+- Banking products (savings accounts, checking accounts, loans, mortgages)
+- Investment advice and portfolio management
+- Credit card information and rewards
+- Money transfer and payment assistance
+- Fraud protection and security advice
+- Budgeting and financial planning
+- Loan applications and mortgage guidance
+- Interest rates and APY information
+
+You are knowledgeable, professional, and helpful. You always:
+- Provide accurate financial information
+- Encourage responsible banking practices
+- Suggest consulting with financial advisors for complex decisions
+- Prioritize customer data security
+- Are empathetic to customer concerns
+- Provide clear explanations of banking concepts
+
+DISCLAIMER: This is an educational AI assistant. For actual banking transactions, 
+please contact your bank directly or use official banking channels."""
+
+# Request parameters shared by every front end
+TEMPERATURE = 0.7
+
+# Topics that always go to the large model
+COMPLEX_TOPICS = (
+    r"\b(?:loans?|mortgages?|refinanc\w*|amorti[sz]\w*|invest\w*|portfolio|retire\w*|"
+    r"pension|401k|ira|tax\w*|estate|inherit\w*|debt consolidation|financial plan\w*|"
+    r"budget plan\w*|compare|comparison|pros and cons|strategy|strategies)\b"
+)
+
+# Passages retrieved from the knowledge index for each question
+KNOWLEDGE_TOP_K = 3
+
+# Start of the message carrying retrieved passages
+KNOWLEDGE_HEADER = "Relevant bank documentation (use it when it answers the question):"
+
+# Earlier assistant answers at least this long are sent as digests
+DIGEST_MIN_CHARS = 600
+
+# Most recent messages that are always sent verbatim
+VERBATIM_RECENT_MESSAGES = 4
+
+# Appended to the part of an answer streamed before its stream failed; such answers
+# are kept for display and the journal but never sent to the model again
+TRUNCATED_MARKER = "\n\n[answer interrupted]"
+
+# Rounds of local calculator calls allowed before the model must answer
+MAX_TOOL_ROUNDS = 3
+
+# Questions that may need a calculator; other turns are sent without tools
+TOOL_TOPICS = (
+    r"\b(?:loans?|mortgages?|payments?|apr|apy|interest|rates?|afford\w*|amorti[sz]\w*|"
+    r"compound\w*|savings?|save|borrow\w*|monthly|calculat\w*|how much)\b"
+)
+_TOOL_TOPICS = re.compile(TOOL_TOPICS, re.IGNORECASE)
+
+
+class ModelTier:
+    """A Mistral model and its request limits"""
+
+    __slots__ = ("name", "model", "max_tokens")
+
+    def __init__(self, name: str, model: str, max_tokens: int):
+        """
+        Args:
+            name: Tier name used in metrics ("small", "large")
+            model: Mistral model name
+            max_tokens: Maximum tokens in answers from this tier
+        """
+        self.name = name
+        self.model = model
+        self.max_tokens = max_tokens
+
+
+class ModelPolicy:
+    """Picks the small model for short, simple turns and the large model otherwise"""
+
+    def __init__(
+        self,
+        small: Optional[ModelTier] = None,
+        large: Optional[ModelTier] = None,
+        max_simple_chars: int = 200,
+        complex_topics: str = COMPLEX_TOPICS,
+        fallback: bool = True,
+        grounded_small: bool = True
+    ):
+        """
+        Args:
+            small: Fast tier for simple turns (None sends everything to the large tier)
+            large: Tier for complex turns and fallbacks
+            max_simple_chars: Longest user message still considered simple
+            complex_topics: Regex of topics that need the large tier
+            fallback: Retry on the large tier when a small-tier call fails
+            grounded_small: Let short complex-topic questions use the small tier when
+                documentation passages were retrieved for them
+        """
+        self.small = small
+        self.large = large or ModelTier("large", "mistral-large-latest", 1024)
+        self.max_simple_chars = max_simple_chars
+        self._complex = re.compile(complex_topics, re.IGNORECASE)
+        self.fallback = fallback
+        self.grounded_small = grounded_small
+
+    def select(self, messages: List[Dict]) -> ModelTier:
+        """
+        Choose the tier for a request
+
+        Args:
+            messages: Request messages; the last one is the user's question
+
+        Returns:
+            The tier to call first
+        """
+        if self.small is None:
+            return self.large
+        question = messages[-1]["content"]
+        if len(question) > self.max_simple_chars:
+            return self.large
+        if self._complex.search(question) and not (self.grounded_small and is_grounded(messages)):
+            return self.large
+        return self.small
+
+    def escalate(self, tier: ModelTier) -> Optional[ModelTier]:
+        """The tier to retry on after a failed call, or None"""
+        if self.fallback and tier is not self.large:
+            return self.large
+        return None
+
+
+# Default tiering: mistral-small for simple turns, mistral-large for the rest
+default_policy = ModelPolicy(
+    small=ModelTier("small", "mistral-small-latest", 512),
+    large=ModelTier("large", "mistral-large-latest", 1024)
+)
+
+
+class MissingAPIKeyError(RuntimeError):
+    """Raised when MISTRAL_API_KEY is not configured"""
+
+
+_env_loaded = False
+_client = None
+_client_lock = threading.Lock()
+_knowledge_index = None
+_knowledge_loaded = False
+_knowledge_lock = threading.Lock()
+
+
+def get_api_key() -> str:
+    """
+    Read the Mistral API key, loading the .env file on first use
+
+    Returns:
+        The API key
+
+    Raises:
+        MissingAPIKeyError: If MISTRAL_API_KEY is not set
+    """
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+    api_key = os.getenv("MISTRAL_API_KEY")
+    if not api_key:
+        raise MissingAPIKeyError("MISTRAL_API_KEY not found. Please set it in your .env file.")
+    return api_key
+
+
+def get_client():
+    """
+    Get the process-wide Mistral client, building it on first use
+
+    The client is wrapped with retries, deadlines, a circuit breaker and per-key rate
+    limiting, and shared by every bot so breaker and limiter state are process-wide.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from mistralai import Mistral
+                from resilient_client import ResilientClient
+
+                api_key = get_api_key()
+                _client = ResilientClient(Mistral(api_key=api_key), api_key=api_key)
+    return _client
+
+
+def client_stats(client=None) -> Dict:
+    """
+    Retry and coalescing counters of a client that already exists
+
+    Never builds the shared client (which needs the API key) just to report on it.
+
+    Args:
+        client: Client override; the shared client is used when None
+
+    Returns:
+        The client's get_stats(), or {} before the first request
+    """
+    client = client or _client
+    if client is None or not hasattr(client, "get_stats"):
+        return {}
+    return client.get_stats()
+
+
+def get_knowledge_index():
+    """
+    Get the process-wide knowledge index, opening it on first use
+
+    The index lives in KNOWLEDGE_INDEX_DIR (default: knowledge_index) and is built with
+    `python knowledge_index.py build`. Its arrays are memory-mapped, so opening it is cheap.
+
+    Returns:
+        The KnowledgeIndex, or None if no index was built (retrieval is then skipped)
+    """
+    global _knowledge_index, _knowledge_loaded
+    if not _knowledge_loaded:
+        with _knowledge_lock:
+            if not _knowledge_loaded:
+                index_dir = os.getenv("KNOWLEDGE_INDEX_DIR", "knowledge_index")
+                if os.path.exists(os.path.join(index_dir, "manifest.json")):
+                    from knowledge_index import KnowledgeIndex
+                    _knowledge_index = KnowledgeIndex(index_dir)
+                _knowledge_loaded = True
+    return _knowledge_index
+
+
+def is_grounded(messages: List[Dict]) -> bool:
+    """Whether retrieved passages were added to a request by ground_messages()"""
+    return len(messages) > 1 and messages[-2]["content"].startswith(KNOWLEDGE_HEADER)
+
+
+def ground_messages(messages: List[Dict], index=None, k: int = KNOWLEDGE_TOP_K) -> List[Dict]:
+    """
+    Add the documentation passages most relevant to the user's question to a request
+
+    The passages go in a system message just before the question, so the system prompt
+    and history at the start of the request stay the same from turn to turn.
+
+    Args:
+        messages: Request messages; the last one is the user's question
+        index: KnowledgeIndex override (the shared index if omitted)
+        k: Number of passages to add
+
+    Returns:
+        A new request list with the passages, or messages itself if nothing was found
+    """
+    if index is None:
+        index = get_knowledge_index()
+    if index is None or not messages or messages[-1]["role"] != "user":
+        return messages
+    passages = index.search(messages[-1]["content"], k)
+    if not passages:
+        return messages
+    context = "\n\n".join(f"[{p['heading'] or p['source']}]\n{p['text']}" for p in passages)
+    return [
+        *messages[:-1],
+        {"role": "system", "content": f"{KNOWLEDGE_HEADER}\n\n{context}"},
+        messages[-1]
+    ]
+
+
+@lru_cache(maxsize=1024)
+def _digest_message(content: str) -> Tuple[Dict, int, int]:
+    """Digest message for a long answer, with the bytes and estimated tokens it saves"""
+    digest = digest_text(content)
+    return (
+        {"role": "assistant", "content": digest},
+        len(content.encode("utf-8")) - len(digest.encode("utf-8")),
+        estimate_tokens(content) - estimate_tokens(digest)
+    )
+
+
+def compact_messages(messages: List[Dict], timer: Optional[TurnTimer] = None) -> List[Dict]:
+    """
+    Shrink a request before it is sent
+
+    Long assistant answers older than the last VERBATIM_RECENT_MESSAGES messages are
+    replaced by cached digests. The system prompt and every other message are left
+    untouched, and an answer's digest never changes, so consecutive requests of a
+    conversation share a byte-identical prefix for provider-side prefix caching.
+
+    Args:
+        messages: Request messages (not modified)
+        timer: Turn timer to record the bytes and tokens saved into
+
+    Returns:
+        A compacted copy, or messages itself if nothing was shortened
+    """
+    compacted = None
+    bytes_saved = tokens_saved = 0
+    for i in range(1, len(messages) - VERBATIM_RECENT_MESSAGES):
+        message = messages[i]
+        if message["role"] != "assistant" or len(message["content"]) < DIGEST_MIN_CHARS:
+            continue
+        digest, saved_bytes, saved_tokens = _digest_message(message["content"])
+        if compacted is None:
+            compacted = list(messages)
+        compacted[i] = digest
+        bytes_saved += saved_bytes
+        tokens_saved += saved_tokens
+
+    if timer:
+        timer.compacted(bytes_saved, tokens_saved)
+    return messages if compacted is None else compacted
+
+
+def wants_tools(messages: List[Dict]) -> bool:
+    """
+    Whether to offer the calculators on a turn whose caller left it to the request
+
+    Their schemas add prompt tokens to every request, so on either tier they are only
+    sent with questions about loans, rates, savings and other calculations.
+    """
+    return bool(messages) and bool(_TOOL_TOPICS.search(messages[-1]["content"]))
+
+
+def _add_usage(total, usage):
+    """Token usage of a turn summed over its tool rounds (None if no round reported any)"""
+    if usage is None:
+        return total
+    if total is None:
+        total = SimpleNamespace(prompt_tokens=None, completion_tokens=None)
+    for field in ("prompt_tokens", "completion_tokens"):
+        value = getattr(usage, field, None)
+        if value is not None:
+            setattr(total, field, (getattr(total, field) or 0) + value)
+    return total
+
+
+def _tool_kwargs(tools: bool, final: bool = False) -> Dict:
+    """Request arguments offering the financial calculators (financial_tools.py) to the model"""
+    if not tools:
+        return {}
+    from financial_tools import TOOLS
+    # On the last round the tools stay declared but the model has to answer
+    return {"tools": TOOLS, "tool_choice": "none" if final else "auto"}
+
+
+def _tool_calls(message) -> List[Dict]:
+    """Tool calls of an API response message, as {"id", "name", "arguments"} dicts"""
+    calls = []
+    for call in getattr(message, "tool_calls", None) or []:
+        function = call.function
+        arguments = function.arguments
+        calls.append({
+            "id": call.id,
+            "name": function.name,
+            "arguments": arguments if isinstance(arguments, str) else json.dumps(arguments)
+        })
+    return calls
+
+
+def _merge_tool_deltas(pending: Dict[int, Dict], deltas) -> None:
+    """Assemble tool calls streamed in pieces (arguments may arrive in several chunks)"""
+    for delta in deltas or []:
+        index = getattr(delta, "index", None)
+        if index is None:
+            index = len(pending)
+        call = pending.setdefault(index, {"id": None, "name": "", "arguments": ""})
+        call["id"] = delta.id or call["id"]
+        call["name"] = delta.function.name or call["name"]
+        arguments = delta.function.arguments
+        call["arguments"] += arguments if isinstance(arguments, str) else json.dumps(arguments)
+
+
+def run_tool_calls(messages: List[Dict], content: Optional[str], calls: List[Dict]) -> Tuple[List[Dict], List[str]]:
+    """
+    Run the calculators the model asked for, locally
+
+    Args:
+        messages: The request that produced the calls
+        content: Text the model sent along with the calls
+        calls: {"id", "name", "arguments"} dicts
+
+    Returns:
+        The request extended with the calls and their results, and the Markdown tables
+        to show the user after the answer
+    """
+    from financial_tools import run_tool
+
+    extended = [*messages, {
+        "role": "assistant",
+        "content": content or "",
+        "tool_calls": [
+            {"id": call["id"], "type": "function",
+             "function": {"name": call["name"], "arguments": call["arguments"]}}
+            for call in calls
+        ]
+    }]
+    tables = []
+    for call in calls:
+        result, table = run_tool(call["name"], call["arguments"])
+        if table:
+            tables.append(table)
+        extended.append({
+            "role": "tool",
+            "name": call["name"],
+            "content": json.dumps(result),
+            "tool_call_id": call["id"]
+        })
+    return extended, tables
+
+
+def _tables_suffix(tables: List[str]) -> str:
+    """Locally rendered calculator tables, appended to the answer"""
+    return "".join(f"\n\n{table}" for table in tables)
+
+
+class _ChatTurn:
+    """
+    One answer across its model calls: tier choice and fallback, calculator rounds and
+    summed token usage, shared by complete_chat(), stream_chat() and their async variants
+    """
+
+    def __init__(
+        self,
+        messages: List[Dict],
+        timer: Optional[TurnTimer],
+        client,
+        policy: Optional[ModelPolicy],
+        tools: Optional[bool]
+    ):
+        self.timer = timer
+        self.client = client or get_client()
+        self.policy = policy or default_policy
+        self.messages = compact_messages(messages, timer)
+        self.tier = self.policy.select(self.messages)
+        self.tools = wants_tools(self.messages) if tools is None else tools
+        self.round = 0
+        self.tables: List[str] = []
+        self.usage = None
+
+    def request(self) -> Dict:
+        """Keyword arguments of the next API call"""
+        return {
+            "model": self.tier.model,
+            "messages": self.messages,
+            "temperature": TEMPERATURE,
+            "max_tokens": self.tier.max_tokens,
+            **_tool_kwargs(self.tools, final=self.round == MAX_TOOL_ROUNDS)
+        }
+
+    def failed(self, started: float, can_escalate: bool = True) -> bool:
+        """Record a failed call; True to retry it on the fallback tier, False to give up"""
+        if self.timer:
+            self.timer.model_call(self.tier.name, time.perf_counter() - started)
+        fallback = self.policy.escalate(self.tier) if can_escalate else None
+        if fallback is None:
+            return False
+        if self.timer:
+            self.timer.fallback()
+        self.tier = fallback
+        return True
+
+    def answered(self, started: float, usage, content: Optional[str], calls: List[Dict]) -> bool:
+        """
+        Record a successful call and run the calculators it asked for
+
+        Args:
+            started: perf_counter() value when the call started
+            usage: Token usage the call reported (None if it did not)
+            content: Text the model sent
+            calls: Tool calls the model sent ({"id", "name", "arguments"} dicts)
+
+        Returns:
+            True if the model must be asked again with the calculators' results
+        """
+        if self.timer:
+            self.timer.model_call(self.tier.name, time.perf_counter() - started)
+        self.usage = _add_usage(self.usage, usage)
+        if not calls or self.round == MAX_TOOL_ROUNDS:
+            return False
+        self.messages, tables = run_tool_calls(self.messages, content, calls)
+        self.tables.extend(tables)
+        self.round += 1
+        return True
+
+    def first_token(self) -> None:
+        """Record that text reached the user"""
+        if self.timer:
+            self.timer.first_token()
+
+    def finished(self) -> None:
+        """Record the turn's summed token usage"""
+        if self.timer:
+            self.timer.finished(self.usage)
+
+
+class _StreamedRound:
+    """Text, tool calls and usage collected from one streamed call"""
+
+    def __init__(self, tools: bool):
+        self.tools = tools
+        self.content: List[str] = []
+        self.pending: Dict[int, Dict] = {}
+        self.usage = None
+
+    def add(self, event) -> Optional[str]:
+        """Take in one stream event; return its text, if any"""
+        self.usage = getattr(event.data, "usage", None) or self.usage
+        delta = event.data.choices[0].delta
+        if self.tools:
+            _merge_tool_deltas(self.pending, getattr(delta, "tool_calls", None))
+        text = delta.content
+        if isinstance(text, str) and text:
+            self.content.append(text)
+            return text
+        return None
+
+    def calls(self) -> List[Dict]:
+        """Tool calls assembled from the stream"""
+        return list(self.pending.values())
+
+
+def complete_chat(
+    messages: List[Dict],
+    timer: Optional[TurnTimer] = None,
+    client=None,
+    policy: Optional[ModelPolicy] = None,
+    tools: Optional[bool] = None
+) -> str:
+    """
+    Send a request and wait for the complete answer
+
+    When the model calls a financial calculator, it runs locally and the model is asked
+    again with the result; the calculators' tables are appended to the answer.
+
+    Args:
+        messages: Request messages, system prompt included
+        timer: Turn timer to record latency, tier and token usage into
+        client: Mistral client override (the shared client if omitted)
+        policy: Model selection policy (default_policy if omitted)
+        tools: Offer the financial calculators to the model (None: only when
+            wants_tools() says the turn may need them)
+
+    Returns:
+        The bot's response text
+    """
+    turn = _ChatTurn(messages, timer, client, policy, tools)
+    while True:
+        started = time.perf_counter()
+        try:
+            response = turn.client.chat.complete(**turn.request())
+        except Exception:
+            if turn.failed(started):
+                continue
+            raise
+        message = response.choices[0].message
+        calls = _tool_calls(message) if turn.tools else []
+        if not turn.answered(started, getattr(response, "usage", None), message.content, calls):
+            break
+
+    turn.finished()
+    return (message.content or "") + _tables_suffix(turn.tables)
+
+
+def stream_chat(
+    messages: List[Dict],
+    timer: Optional[TurnTimer] = None,
+    client=None,
+    policy: Optional[ModelPolicy] = None,
+    tools: Optional[bool] = None
+) -> Iterator[str]:
+    """
+    Send a request and yield the answer as it arrives
+
+    A failed small-tier call falls back to the large tier only if nothing was streamed yet.
+    Financial calculator calls run locally between streamed rounds, and their tables
+    are yielded after the answer.
+
+    Args:
+        messages: Request messages, system prompt included
+        timer: Turn timer to record latency, tier and token usage into
+        client: Mistral client override (the shared client if omitted)
+        policy: Model selection policy (default_policy if omitted)
+        tools: Offer the financial calculators to the model (None: only when
+            wants_tools() says the turn may need them)
+
+    Yields:
+        Non-empty text chunks of the bot's response
+    """
+    turn = _ChatTurn(messages, timer, client, policy, tools)
+    while True:
+        started = time.perf_counter()
+        streamed = _StreamedRound(turn.tools)
+        try:
+            for event in turn.client.chat.stream(**turn.request()):
+                delta = streamed.add(event)
+                if delta:
+                    turn.first_token()
+                    yield delta
+        except Exception:
+            # Part of the answer was already delivered; do not replay it on another tier
+            if turn.failed(started, can_escalate=not streamed.content):
+                continue
+            raise
+        if not turn.answered(started, streamed.usage, "".join(streamed.content), streamed.calls()):
+            break
+
+    if turn.tables:
+        turn.first_token()
+        yield _tables_suffix(turn.tables)
+    turn.finished()
+
+
+async def complete_chat_async(
+    messages: List[Dict],
+    timer: Optional[TurnTimer] = None,
+    client=None,
+    policy: Optional[ModelPolicy] = None,
+    tools: Optional[bool] = None
+) -> str:
+    """Async variant of complete_chat()"""
+    turn = _ChatTurn(messages, timer, client, policy, tools)
+    while True:
+        started = time.perf_counter()
+        try:
+            response = await turn.client.chat.complete_async(**turn.request())
+        except Exception:
+            if turn.failed(started):
+                continue
+            raise
+        message = response.choices[0].message
+        calls = _tool_calls(message) if turn.tools else []
+        if not turn.answered(started, getattr(response, "usage", None), message.content, calls):
+            break
+
+    turn.finished()
+    return (message.content or "") + _tables_suffix(turn.tables)
+
+
+async def stream_chat_async(
+    messages: List[Dict],
+    timer: Optional[TurnTimer] = None,
+    client=None,
+    policy: Optional[ModelPolicy] = None,
+    tools: Optional[bool] = None
+) -> AsyncIterator[str]:
+    """Async variant of stream_chat()"""
+    turn = _ChatTurn(messages, timer, client, policy, tools)
+    while True:
+        started = time.perf_counter()
+        streamed = _StreamedRound(turn.tools)
+        try:
+            stream = await turn.client.chat.stream_async(**turn.request())
+            async for event in stream:
+                delta = streamed.add(event)
+                if delta:
+                    turn.first_token()
+                    yield delta
+        except Exception:
+            # Part of the answer was already delivered; do not replay it on another tier
+            if turn.failed(started, can_escalate=not streamed.content):
+                continue
+            raise
+        if not turn.answered(started, streamed.usage, "".join(streamed.content), streamed.calls()):
+            break
+
+    if turn.tables:
+        turn.first_token()
+        yield _tables_suffix(turn.tables)
+    turn.finished()
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+HTTP/JSON Chat API for the Banking Bot
+A dependency-free ASGI app serving BankingBot turns over HTTP. Requests are stateless:
+each one loads its session's recent history from the shared session store, so any
+number of worker processes (on any number of hosts) can serve the same session.
+
+Run with: python chat_api.py --workers 4
+     or:  uvicorn chat_api:app --host 0.0.0.0 --port 8000 --workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import sys
+import uuid
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+
+import advanced_banking_bot
+from advanced_banking_bot import Message
+from async_banking_bot import AsyncBankingBot, create_async_client, create_http_pool
+from bot_core import TRUNCATED_MARKER, MissingAPIKeyError, get_api_key
+from pii_redaction import PIIRedactor
+from session_store import SessionStore, create_session_store
+
+# Stored messages loaded into each turn (the context window bounds what is sent). Older
+# messages are dropped without a summary, and the window's summary of the loaded ones is
+# rebuilt on every turn rather than stored
+HISTORY_LIMIT = 40
+
+# Longest accepted user message, in characters
+MAX_MESSAGE_CHARS = 4000
+
+# Largest accepted request body, in bytes
+MAX_BODY_BYTES = 64 * 1024
+
+_SESSION_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+_SESSION_PATH = re.compile(r"/v1/sessions/([^/]+)(/messages)?")
+
+
+class HTTPError(Exception):
+    """Error returned to the caller as a JSON body"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class StoreJournal:
+    """Journal adapter that writes a bot's messages to the shared session store"""
+
+    path = "session store"
+
+    def __init__(self, store: SessionStore, redactor: Optional[PIIRedactor] = None):
+        self.store = store
+        self.redactor = redactor
+
+    def append(self, record: Dict) -> None:
+        # Redacted inline and written at once, so the next turn, on any worker, reads it
+        content = record["content"]
+        if self.redactor is not None:
+            content = self.redactor.redact_text(content)
+        self.store.append(record["session_id"], record["role"], content, record["timestamp"])
+
+    def sync(self) -> None:
+        """Every append is already committed by the store"""
+
+    def close(self) -> None:
+        """The store is shared and closed by the service"""
+
+
+class ChatService:
+    """Per-process state of the API: session store, pooled client and concurrency cap"""
+
+    def __init__(
+        self,
+        store: Optional[SessionStore] = None,
+        client=None,
+        max_concurrency: int = 64,
+        history_limit: int = HISTORY_LIMIT
+    ):
+        """
+        Args:
+            store: Shared session store (SESSION_STORE_URL if omitted)
+            client: Async-capable Mistral client (a pooled one is created if omitted)
+            max_concurrency: Maximum API calls in flight in this worker
+            history_limit: Stored messages loaded into each turn
+        """
+        self._store = store
+        self._client = client
+        self._http_pool = None
+        self.max_concurrency = max_concurrency
+        self.history_limit = history_limit
+        self._concurrency: Optional[asyncio.Semaphore] = None
+        # Stored messages are redacted on the request path (microseconds per message)
+        self.redactor = PIIRedactor()
+
+    @property
+    def store(self) -> SessionStore:
+        """Session store, opened on first use"""
+        if self._store is None:
+            self._store = create_session_store()
+        return self._store
+
+    @property
+    def client(self):
+        """Mistral client, built on first use inside the worker's event loop"""
+        if self._client is None:
+            self._http_pool = create_http_pool(max_connections=self.max_concurrency)
+            self._client = create_async_client(self._http_pool)
+        return self._client
+
+    async def open_session(self, session_id: str) -> AsyncBankingBot:
+        """
+        Rebuild a session's bot from the store
+
+        Args:
+            session_id: Identifier of the conversation
+
+        Returns:
+            AsyncBankingBot holding the session's last history_limit messages (older
+            ones are not summarized); its messages are redacted and written back to
+            the store as they are added
+        """
+        if self._concurrency is None:
+            self._concurrency = asyncio.Semaphore(self.max_concurrency)
+        page = await asyncio.to_thread(self.store.load_page, session_id, self.history_limit)
+
+        bot = AsyncBankingBot(
+            self.client, concurrency=self._concurrency,
+            journal=StoreJournal(self.store, self.redactor), redact=False
+        )
+        bot.session_id = session_id
+        for row in page:
+            message = Message(row["role"], row["content"], row["timestamp"])
+            bot.conversation_history.append(message)
+            # Answers cut off by a failed stream are stored for the record only
+            if not row["content"].endswith(TRUNCATED_MARKER):
+                bot.api_history.append(message.api)
+        return bot
+
+    def client_stats(self) -> Dict:
+        """Retry and coalescing counters of the client ({} before the first request)"""
+        if self._client is None or not hasattr(self._client, "get_stats"):
+            return {}
+        return self._client.get_stats()
+
+    async def aclose(self) -> None:
+        """Release pooled connections and the store"""
+        if self._http_pool is not None:
+            await self._http_pool.aclose()
+        if self._store is not None:
+            self._store.close()
+
+
+async def read_json(receive, max_bytes: int = MAX_BODY_BYTES) -> Dict:
+    """Read and parse a JSON object request body"""
+    body = b""
+    while True:
+        event = await receive()
+        body += event.get("body", b"")
+        if len(body) > max_bytes:
+            raise HTTPError(413, "Request body too large")
+        if not event.get("more_body"):
+            break
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        raise HTTPError(400, "Request body must be JSON")
+    if not isinstance(payload, dict):
+        raise HTTPError(400, "Request body must be a JSON object")
+    return payload
+
+
+async def send_response(send, status: int, body: bytes, content_type: str = "application/json") -> None:
+    """Send a complete response"""
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_json(send, status: int, payload: Dict) -> None:
+    """Send a JSON response"""
+    await send_response(send, status, json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+
+def sse_event(payload: Dict) -> bytes:
+    """Encode one server-sent event"""
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+def check_session_id(session_id: str) -> str:
+    """Reject session ids that are not short URL-safe tokens"""
+    if not isinstance(session_id, str) or not _SESSION_ID.fullmatch(session_id):
+        raise HTTPError(400, "session_id must be 1-64 letters, digits, '-' or '_'")
+    return session_id
+
+
+class ChatAPI:
+    """
+    ASGI app
+
+    POST   /v1/chat                     {"message", "session_id"?, "stream"?}
+    GET    /v1/sessions/{id}/messages   ?limit=20&before=<id>
+    DELETE /v1/sessions/{id}
+    GET    /healthz
+    GET    /metrics                     Prometheus metrics of this worker
+    """
+
+    def __init__(self, service: Optional[ChatService] = None):
+        self.service = service or ChatService()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        try:
+            await self._route(scope, receive, send)
+        except HTTPError as e:
+            await send_json(send, e.status, {"error": str(e)})
+        except Exception as e:
+            print(f"\n❌ Error: {str(e)}")
+            await send_json(send, 500, {"error": "Internal server error"})
+
+    async def _lifespan(self, receive, send) -> None:
+        """Close pooled connections and the store on shutdown"""
+        while True:
+            event = await receive()
+            if event["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif event["type"] == "lifespan.shutdown":
+                await self.service.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _route(self, scope, receive, send) -> None:
+        method, path = scope["method"], scope["path"]
+
+        if path == "/v1/chat":
+            if method != "POST":
+                raise HTTPError(405, "Use POST")
+            await self.chat(await read_json(receive), send)
+            return
+
+        match = _SESSION_PATH.fullmatch(path)
+        if match:
+            session_id = check_session_id(match.group(1))
+            if match.group(2) and method == "GET":
+                query = parse_qs(scope.get("query_string", b"").decode())
+                await self.messages(session_id, query, send)
+            elif not match.group(2) and method == "DELETE":
+                await asyncio.to_thread(self.service.store.delete_session, session_id)
+                await send_response(send, 204, b"")
+            else:
+                raise HTTPError(405, "Method not allowed")
+            return
+
+        if path == "/healthz":
+            await send_json(send, 200, {"status": "ok"})
+        elif path == "/metrics":
+            lines = [advanced_banking_bot.metrics.to_prometheus()]
+            for name, value in self.service.client_stats().items():
+                if isinstance(value, int):
+                    lines.append(f"# TYPE banking_bot_client_{name}_total counter\n"
+                                 f"banking_bot_client_{name}_total {value}\n")
+            body = "".join(lines).encode("utf-8")
+            await send_response(send, 200, body, "text/plain; version=0.0.4")
+        else:
+            raise HTTPError(404, "Not found")
+
+    async def chat(self, payload: Dict, send) -> None:
+        """Answer one turn, as JSON or as a server-sent event stream"""
+        message = payload.get("message")
+        if not isinstance(message, str) or not message.strip():
+            raise HTTPError(400, "message must be a non-empty string")
+        if len(message) > MAX_MESSAGE_CHARS:
+            raise HTTPError(400, f"message is longer than {MAX_MESSAGE_CHARS} characters")
+        session_id = check_session_id(payload.get("session_id") or uuid.uuid4().hex)
+
+        bot = await self.service.open_session(session_id)
+        if not payload.get("stream"):
+            answer = await bot.get_response(message.strip())
+            if answer is None:
+                raise HTTPError(502, "The model request failed")
+            await send_json(send, 200, {"session_id": session_id, "answer": answer})
+            return
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache")]
+        })
+        async for delta in bot.stream_response(message.strip()):
+            await send({"type": "http.response.body", "body": sse_event({"delta": delta}), "more_body": True})
+        final = {"done": True, "session_id": session_id}
+        # Also set when the stream failed after some deltas were already sent
+        if bot.stream_failed:
+            final["error"] = "The model request failed"
+        await send({"type": "http.response.body", "body": sse_event(final)})
+
+    async def messages(self, session_id: str, query: Dict, send) -> None:
+        """Return a page of a session's stored messages, oldest first"""
+        try:
+            limit = min(int(query.get("limit", ["20"])[0]), 200)
+            before = int(query["before"][0]) if "before" in query else None
+        except ValueError:
+            raise HTTPError(400, "limit and before must be integers")
+        page = await asyncio.to_thread(self.service.store.load_page, session_id, limit, before)
+        await send_json(send, 200, {"session_id": session_id, "messages": page})
+
+
+# Module-level app for `uvicorn chat_api:app`; nothing is opened until the first request
+app = ChatAPI()
+
+
+def main(argv=None) -> int:
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Serve the Banking Bot over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes")
+    args = parser.parse_args(argv)
+
+    try:
+        get_api_key()
+    except MissingAPIKeyError as e:
+        print(f"❌ Error: {str(e)}")
+        return 1
+
+    import uvicorn
+
+    print(f"🏦 Banking Bot API on http://{args.host}:{args.port} ({args.workers} workers)")
+    uvicorn.run("chat_api:app", host=args.host, port=args.port, workers=args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Bounded Context Window for the Banking Bot
+Keeps each request within a token budget by replacing older turns with a rolling summary
+"""
+
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+# Rough characters-per-token ratio for English text with Mistral tokenizers
+CHARS_PER_TOKEN = 4
+
+# Fixed per-message overhead (role markers and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Longest snippet kept per message by the extractive summarizer
+SUMMARY_SNIPPET_CHARS = 160
+
+# Longest digest of an earlier answer
+DIGEST_CHARS = 300
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in a piece of text
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Approximate token count, including per-message overhead
+    """
+    return len(text) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+
+def extractive_summarizer(previous_summary: str, evicted: List[Dict], max_tokens: int) -> str:
+    """
+    Fold evicted messages into the running summary without a model call
+
+    Each evicted message contributes its first sentence; the oldest lines are
+    dropped once the summary exceeds its token budget.
+
+    Args:
+        previous_summary: Summary of everything evicted so far
+        evicted: Messages that just slid out of the window
+        max_tokens: Token budget for the summary
+
+    Returns:
+        The updated summary text
+    """
+    lines = previous_summary.splitlines() if previous_summary else []
+
+    for msg in evicted:
+        content = " ".join(msg["content"].split())
+        snippet = content.split(". ")[0][:SUMMARY_SNIPPET_CHARS]
+        speaker = "User asked" if msg["role"] == "user" else "Assistant said"
+        lines.append(f"- {speaker}: {snippet}")
+
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+
+    return "\n".join(lines)
+
+
+@lru_cache(maxsize=1024)
+def digest_text(text: str, max_chars: int = DIGEST_CHARS) -> str:
+    """
+    Shorten a long earlier answer to its opening sentences
+
+    Deterministic and cached, so an answer gets the same digest, byte for byte, on every
+    request it appears in.
+
+    Args:
+        text: Message text
+        max_chars: Longest digest before the "shortened" marker
+
+    Returns:
+        The digest (the whitespace-normalized text itself if it is short enough)
+    """
+    content = " ".join(text.split())
+    if len(content) <= max_chars:
+        return content
+    cut = content.rfind(". ", 0, max_chars)
+    head = content[:cut + 1] if cut > max_chars // 3 else content[:max_chars].rsplit(" ", 1)[0] + "…"
+    return f"{head} [earlier answer shortened]"
+
+
+class ContextWindow:
+    """Token-budgeted view over a conversation with a cached rolling summary"""
+
+    def __init__(
+        self,
+        token_budget: int = 3000,
+        summary_tokens: int = 300,
+        min_recent_messages: int = 2,
+        summarizer: Optional[Callable[[str, List[Dict], int], str]] = None
+    ):
+        """
+        Args:
+            token_budget: Maximum tokens of history (summary included) per request
+            summary_tokens: Token budget reserved for the rolling summary
+            min_recent_messages: Most recent messages that are always sent verbatim
+            summarizer: Callable(previous_summary, evicted, max_tokens) -> summary
+        """
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.min_recent_messages = min_recent_messages
+        self.summarizer = summarizer or extractive_summarizer
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the cached summary and token counts (e.g. after 'clear')"""
+        self.summary = ""
+        self.summarized_upto = 0
+        self._token_counts: List[int] = []
+        self._request: Optional[List[Dict]] = None
+        self._request_start = 0
+        self._request_end = 0
+        self._request_summary = ""
+        self._history_id: Optional[int] = None
+        self._last_counted: Optional[Dict] = None
+
+    def _count_new_messages(self, history: List[Dict]) -> None:
+        """Estimate tokens only for messages not seen before"""
+        counted = len(self._token_counts)
+        if self._history_id is not None and (
+            id(history) != self._history_id
+            or len(history) < counted
+            or (counted and history[counted - 1] != self._last_counted)
+        ):
+            # A different history, or this one was cleared or rewritten underneath us
+            self.reset()
+        self._history_id = id(history)
+
+        for msg in history[len(self._token_counts):]:
+            self._token_counts.append(estimate_tokens(msg["content"]))
+        if history:
+            self._last_counted = history[-1]
+
+    def _window_start(self, history: List[Dict]) -> int:
+        """Find the index of the oldest message that fits in the budget"""
+        budget = self.token_budget - (estimate_tokens(self.summary) if self.summary else 0)
+        start = len(history)
+        used = 0
+
+        while start > self.summarized_upto:
+            cost = self._token_counts[start - 1]
+            recent = len(history) - start
+            if used + cost > budget and recent >= self.min_recent_messages:
+                break
+            used += cost
+            start -= 1
+
+        # Never open the window on an assistant reply
+        while start < len(history) - 1 and history[start]["role"] != "user":
+            start += 1
+
+        return start
+
+    def build(self, history: List[Dict]) -> List[Dict]:
+        """
+        Build the API messages for a request
+
+        Args:
+            history: Full conversation history (dicts with role/content)
+
+        Returns:
+            Messages to send after the system prompt: an optional summary
+            message followed by the most recent turns
+        """
+        start = self._slide(history)
+
+        messages = []
+        if self.summary:
+            messages.append(self._summary_message())
+        messages.extend(
+            {"role": msg["role"], "content": msg["content"]}
+            for msg in history[start:]
+        )
+        return messages
+
+    def request_messages(self, system_prompt: str, api_history: List[Dict]) -> List[Dict]:
+        """
+        Get the complete request message list, maintained incrementally
+
+        Unlike build(), the history dicts are shared rather than copied and the
+        returned list is cached between calls: new messages are appended and
+        evicted ones dropped from the front, so a request costs O(1) new
+        allocations. Treat the returned list as read-only. The cache belongs to
+        one history list; given another list, or one whose counted messages
+        changed, the window starts over from it.
+
+        Args:
+            system_prompt: System prompt sent as the first message
+            api_history: Timestamp-free history dicts (role/content only)
+
+        Returns:
+            [system prompt, optional summary, most recent turns]
+        """
+        start = self._slide(api_history)
+        request = self._request
+
+        if request is None:
+            request = [{"role": "system", "content": system_prompt}]
+            self._request = request
+            self._request_start = self._request_end = start
+            self._request_summary = ""
+        elif request[0]["content"] != system_prompt:
+            request[0] = {"role": "system", "content": system_prompt}
+
+        offset = 2 if self._request_summary else 1
+
+        # Drop messages that slid out of the window
+        if start > self._request_start:
+            evicted = min(start, self._request_end) - self._request_start
+            del request[offset:offset + evicted]
+            self._request_start = start
+            self._request_end = max(self._request_end, start)
+
+        # Refresh the summary message only when the summary changed
+        if self.summary != self._request_summary:
+            if self._request_summary:
+                request[1] = self._summary_message()
+            else:
+                request.insert(1, self._summary_message())
+            self._request_summary = self.summary
+
+        for i in range(self._request_end, len(api_history)):
+            request.append(api_history[i])
+        self._request_end = len(api_history)
+
+        return request
+
+    def _slide(self, history: List[Dict]) -> int:
+        """Count new messages, move the window and fold evicted turns into the summary"""
+        self._count_new_messages(history)
+        start = self._window_start(history)
+
+        # Only summarize when the window actually slides
+        if start > self.summarized_upto:
+            evicted = history[self.summarized_upto:start]
+            self.summary = self.summarizer(self.summary, evicted, self.summary_tokens)
+            self.summarized_upto = start
+
+        return start
+
+    def _summary_message(self) -> Dict:
+        """System message carrying the rolling summary"""
+        return {
+            "role": "system",
+            "content": f"Summary of the earlier conversation:\n{self.summary}"
+        }
+
+    def get_stats(self) -> Dict:
+        """Get context window statistics"""
+        return {
+            "token_budget": self.token_budget,
+            "summarized_messages": self.summarized_upto,
+            "summary_tokens": estimate_tokens(self.summary) if self.summary else 0,
+            "history_tokens": sum(self._token_counts)
+        }
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Append-only Conversation Journal
+Writes each message as one JSON line with batched fsync, size-based rotation and optional gzip
+"""
+
+import glob
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+
+class ConversationJournal:
+    """Thread-safe JSON Lines journal of conversation messages"""
+
+    def __init__(
+        self,
+        path: str = "conversation_log.jsonl",
+        fsync_every: int = 32,
+        fsync_interval: float = 5.0,
+        max_bytes: int = 16 * 1024 * 1024,
+        compress: bool = False
+    ):
+        """
+        Args:
+            path: Active journal file; rotated segments are written next to it
+            fsync_every: Number of records between forced fsyncs
+            fsync_interval: Maximum seconds between forced fsyncs
+            max_bytes: Size at which the active file is rotated (0 disables rotation)
+            compress: Gzip rotated segments
+        """
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.compress = compress
+
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self.records_written = 0
+
+    def _open(self) -> None:
+        """Open the active file for appending (lock held)"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+
+    def _sync(self) -> None:
+        """Flush and fsync the active file (lock held)"""
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _rotate(self) -> None:
+        """Move the active file aside as the next numbered segment (lock held)"""
+        self._sync()
+        self._file.close()
+        self._file = None
+
+        segment = f"{segment_prefix(self.path)}{len(list_segments(self.path)) + 1:05d}.jsonl"
+        os.replace(self.path, segment)
+
+        if self.compress:
+            with open(segment, "rb") as src, gzip.open(segment + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(segment)
+
+    def append(self, record: Dict) -> None:
+        """
+        Append one record to the journal
+
+        Args:
+            record: JSON-serializable dict, typically one conversation message
+        """
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+
+        with self._lock:
+            if self._file is None:
+                self._open()
+
+            self._file.write(line)
+            self._file.flush()
+            self._size += len(line.encode("utf-8"))
+            self._unsynced += 1
+            self.records_written += 1
+
+            if (self._unsynced >= self.fsync_every
+                    or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync()
+
+            if self.max_bytes and self._size >= self.max_bytes:
+                self._rotate()
+
+    def sync(self) -> None:
+        """Force all written records to disk"""
+        with self._lock:
+            self._sync()
+
+    def close(self) -> None:
+        """Sync and close the active file"""
+        with self._lock:
+            self._sync()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def segment_prefix(path: str) -> str:
+    """Get the file name prefix shared by rotated segments of a journal"""
+    root, _ = os.path.splitext(path)
+    return f"{root}."
+
+
+def list_segments(path: str) -> List[str]:
+    """
+    List rotated segments of a journal, oldest first
+
+    Args:
+        path: Active journal file
+
+    Returns:
+        Paths of rotated (possibly gzipped) segments
+    """
+    prefix = segment_prefix(path)
+    segments = glob.glob(glob.escape(prefix) + "[0-9]*.jsonl") + \
+        glob.glob(glob.escape(prefix) + "[0-9]*.jsonl.gz")
+    return sorted(segments, key=lambda p: int(p[len(prefix):].split(".")[0]))
+
+
+def read_journal(path: str = "conversation_log.jsonl", session_id: Optional[str] = None) -> Iterator[Dict]:
+    """
+    Stream records from a journal and its rotated segments without loading them into memory
+
+    Args:
+        path: Active journal file
+        session_id: Only yield records from this session
+
+    Yields:
+        Records in the order they were written
+    """
+    files = list_segments(path)
+    if os.path.exists(path):
+        files.append(path)
+
+    for file_path in files:
+        opener = gzip.open if file_path.endswith(".gz") else open
+        with opener(file_path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash; skip it
+                    continue
+                if session_id is None or record.get("session_id") == session_id:
+                    yield record
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Financial Calculators for the Banking Bot
+Vectorized loan, amortization, APR/APY, savings growth and affordability calculations,
+exposed to the model as function-calling tools so figures are computed exactly and
+tables are rendered locally instead of being generated token by token
+
+Run with: python financial_tools.py loan_payment '{"principal": 300000, "annual_rate": 6.5, "years": 30}'
+"""
+
+import json
+import sys
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Largest term, rate and grid accepted from the model
+MAX_YEARS = 50
+MAX_RATE_PERCENT = 100.0
+MAX_GRID_VALUES = 20
+
+# Told to the model with every table, so it summarizes instead of copying it
+TABLE_NOTE = "The full table is shown to the user below your answer; summarize it, do not repeat it."
+
+
+def loan_payment(principal, annual_rate, years):
+    """
+    Monthly payment of fully amortizing loans (arrays broadcast)
+
+    Args:
+        principal: Amount borrowed
+        annual_rate: Nominal annual rate in percent
+        years: Term in years
+
+    Returns:
+        Monthly payment
+    """
+    principal = np.asarray(principal, dtype=float)
+    rate = np.asarray(annual_rate, dtype=float) / 1200
+    months = np.asarray(years, dtype=float) * 12
+    with np.errstate(divide="ignore", invalid="ignore"):
+        payment = principal * rate / -np.expm1(-months * np.log1p(rate))
+    return np.where(rate == 0, principal / months, payment)
+
+
+def amortization_schedule(principal: float, annual_rate: float, years: float) -> Dict[str, np.ndarray]:
+    """
+    Month-by-month amortization, computed in closed form without a Python loop
+
+    Args:
+        principal: Amount borrowed
+        annual_rate: Nominal annual rate in percent
+        years: Term in years
+
+    Returns:
+        Arrays "month", "payment", "interest", "principal" and "balance" (after the payment)
+    """
+    rate = annual_rate / 1200
+    months = int(round(years * 12))
+    payment = float(loan_payment(principal, annual_rate, months / 12))
+    month = np.arange(1, months + 1)
+    if rate == 0:
+        balance = principal - payment * month
+    else:
+        growth = np.power(1 + rate, month)
+        balance = principal * growth - payment * (growth - 1) / rate
+    balance = np.maximum(balance, 0.0)
+    balance[-1] = 0.0
+    previous = np.concatenate(([principal], balance[:-1]))
+    interest = previous * rate
+    return {
+        "month": month,
+        "payment": np.full(months, payment),
+        "interest": interest,
+        "principal": previous - balance,
+        "balance": balance
+    }
+
+
+def apr_to_apy(apr, periods_per_year=12):
+    """Annual percentage yield (percent) of a nominal rate compounded periods_per_year times"""
+    periods = np.asarray(periods_per_year, dtype=float)
+    return np.expm1(periods * np.log1p(np.asarray(apr, dtype=float) / 100 / periods)) * 100
+
+
+def apy_to_apr(apy, periods_per_year=12):
+    """Nominal rate (percent) compounded periods_per_year times that yields an APY"""
+    periods = np.asarray(periods_per_year, dtype=float)
+    return np.expm1(np.log1p(np.asarray(apy, dtype=float) / 100) / periods) * periods * 100
+
+
+def compound_growth(
+    initial: float,
+    annual_rate: float,
+    years: int,
+    monthly_contribution: float = 0.0
+) -> Dict[str, np.ndarray]:
+    """
+    Year-end balances of savings compounded monthly with monthly deposits
+
+    Args:
+        initial: Starting balance
+        annual_rate: Nominal annual rate in percent
+        years: Projection length in years
+        monthly_contribution: Deposit at the end of every month
+
+    Returns:
+        Arrays "year", "contributed" (initial plus deposits), "interest" and "balance"
+    """
+    rate = annual_rate / 1200
+    year = np.arange(1, years + 1)
+    months = year * 12
+    growth = np.power(1 + rate, months)
+    deposits = monthly_contribution * ((growth - 1) / rate if rate else months)
+    balance = initial * growth + deposits
+    contributed = initial + monthly_contribution * months
+    return {"year": year, "contributed": contributed, "interest": balance - contributed, "balance": balance}
+
+
+def affordability_grid(monthly_payment: float, rates: Sequence[float], terms: Sequence[float]) -> np.ndarray:
+    """
+    Largest loan a monthly payment supports, for every rate and term at once
+
+    Args:
+        monthly_payment: Payment the borrower can afford
+        rates: Nominal annual rates in percent (grid rows)
+        terms: Terms in years (grid columns)
+
+    Returns:
+        Array of shape (len(rates), len(terms)) with the affordable principal
+    """
+    rate = np.asarray(rates, dtype=float)[:, None] / 1200
+    months = np.asarray(terms, dtype=float)[None, :] * 12
+    with np.errstate(divide="ignore", invalid="ignore"):
+        principal = monthly_payment * -np.expm1(-months * np.log1p(rate)) / rate
+    return np.where(rate == 0, monthly_payment * months, principal)
+
+
+def money(value: float) -> str:
+    """Format an amount as $1,234.56"""
+    return f"${value:,.2f}"
+
+
+def markdown_table(headers: Sequence[str], rows: Sequence[Sequence[str]]) -> str:
+    """Render a Markdown table"""
+    lines = ["| " + " | ".join(headers) + " |", "|" + "---|" * len(headers)]
+    lines.extend("| " + " | ".join(row) + " |" for row in rows)
+    return "\n".join(lines)
+
+
+def _number(arguments: Dict, name: str, low: float, high: float, default: Optional[float] = None) -> float:
+    """Validated numeric argument"""
+    value = arguments.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{name} must be a number")
+    if not low <= value <= high:
+        raise ValueError(f"{name} must be between {low:g} and {high:g}")
+    return float(value)
+
+
+def _numbers(arguments: Dict, name: str, low: float, high: float) -> List[float]:
+    """Validated list of numbers"""
+    values = arguments.get(name)
+    if not isinstance(values, list) or not 0 < len(values) <= MAX_GRID_VALUES:
+        raise ValueError(f"{name} must be a list of 1-{MAX_GRID_VALUES} numbers")
+    return [_number({name: value}, name, low, high) for value in values]
+
+
+def _loan_tool(arguments: Dict) -> Tuple[Dict, str]:
+    principal = _number(arguments, "principal", 1, 1e9)
+    annual_rate = _number(arguments, "annual_rate", 0, MAX_RATE_PERCENT)
+    years = _number(arguments, "years", 1 / 12, MAX_YEARS)
+    schedule = amortization_schedule(principal, annual_rate, years)
+
+    # One row per year keeps the table readable for 30-year mortgages
+    year_end = np.arange(11, len(schedule["month"]), 12)
+    if not len(year_end) or year_end[-1] != len(schedule["month"]) - 1:
+        year_end = np.append(year_end, len(schedule["month"]) - 1)
+    interest_paid = np.cumsum(schedule["interest"])[year_end]
+    principal_paid = np.cumsum(schedule["principal"])[year_end]
+    rows = [
+        [str(i + 1), money(p), money(q), money(b)]
+        for i, (p, q, b) in enumerate(zip(principal_paid, interest_paid, schedule["balance"][year_end]))
+    ]
+
+    payment = float(schedule["payment"][0])
+    total_interest = float(schedule["interest"].sum())
+    result = {
+        "monthly_payment": round(payment, 2),
+        "total_paid": round(payment * len(schedule["month"]), 2),
+        "total_interest": round(total_interest, 2),
+        "months": len(schedule["month"])
+    }
+    table = markdown_table(["Year", "Principal paid (cumulative)", "Interest paid (cumulative)", "Balance"], rows)
+    return result, table
+
+
+def _rate_tool(arguments: Dict) -> Tuple[Dict, Optional[str]]:
+    rate = _number(arguments, "rate", 0, MAX_RATE_PERCENT)
+    periods = _number(arguments, "compounding_periods", 1, 365, default=12)
+    if arguments.get("convert", "apr_to_apy") == "apy_to_apr":
+        return {"apy": rate, "apr": round(float(apy_to_apr(rate, periods)), 4), "compounding_periods": periods}, None
+    return {"apr": rate, "apy": round(float(apr_to_apy(rate, periods)), 4), "compounding_periods": periods}, None
+
+
+def _savings_tool(arguments: Dict) -> Tuple[Dict, str]:
+    initial = _number(arguments, "initial", 0, 1e9, default=0)
+    annual_rate = _number(arguments, "annual_rate", 0, MAX_RATE_PERCENT)
+    years = _number(arguments, "years", 1, MAX_YEARS)
+    if not years.is_integer():
+        raise ValueError("years must be a whole number of years")
+    years = int(years)
+    monthly = _number(arguments, "monthly_contribution", 0, 1e7, default=0)
+    growth = compound_growth(initial, annual_rate, years, monthly)
+    rows = [
+        [str(y), money(c), money(i), money(b)]
+        for y, c, i, b in zip(growth["year"], growth["contributed"], growth["interest"], growth["balance"])
+    ]
+    result = {
+        "final_balance": round(float(growth["balance"][-1]), 2),
+        "total_contributed": round(float(growth["contributed"][-1]), 2),
+        "total_interest": round(float(growth["interest"][-1]), 2),
+        "apy": round(float(apr_to_apy(annual_rate)), 4)
+    }
+    return result, markdown_table(["Year", "Contributed", "Interest earned", "Balance"], rows)
+
+
+def _affordability_tool(arguments: Dict) -> Tuple[Dict, str]:
+    monthly = _number(arguments, "monthly_payment", 1, 1e7)
+    rates = _numbers(arguments, "rates", 0, MAX_RATE_PERCENT)
+    terms = _numbers(arguments, "terms_years", 1, MAX_YEARS)
+    grid = affordability_grid(monthly, rates, terms)
+    rows = [[f"{rate:g}%", *(money(value) for value in row)] for rate, row in zip(rates, grid)]
+    best = np.unravel_index(np.argmax(grid), grid.shape)
+    result = {
+        "largest_loan": round(float(grid[best]), 2),
+        "at_rate": rates[best[0]],
+        "at_term_years": terms[best[1]],
+        "smallest_loan": round(float(grid.min()), 2)
+    }
+    return result, markdown_table(["Rate", *(f"{term:g} years" for term in terms)], rows)
+
+
+_TOOLS = {
+    "loan_payment": _loan_tool,
+    "convert_rate": _rate_tool,
+    "savings_projection": _savings_tool,
+    "affordability_grid": _affordability_tool,
+}
+
+# Function-calling schemas sent with model requests
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "loan_payment",
+            "description": "Monthly payment, total interest and yearly amortization of a loan or mortgage",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "principal": {"type": "number", "description": "Amount borrowed"},
+                    "annual_rate": {"type": "number", "description": "Annual interest rate in percent, e.g. 6.5"},
+                    "years": {"type": "number", "description": "Loan term in years"}
+                },
+                "required": ["principal", "annual_rate", "years"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "convert_rate",
+            "description": "Convert a nominal APR to the APY it yields, or an APY to its APR",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "rate": {"type": "number", "description": "Rate in percent"},
+                    "convert": {"type": "string", "enum": ["apr_to_apy", "apy_to_apr"]},
+                    "compounding_periods": {"type": "number", "description": "Compounding periods per year (12)"}
+                },
+                "required": ["rate"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "savings_projection",
+            "description": "Year-by-year growth of savings with monthly compounding and monthly deposits",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "initial": {"type": "number", "description": "Starting balance"},
+                    "annual_rate": {"type": "number", "description": "Annual interest rate in percent"},
+                    "years": {
+                        "type": "integer",
+                        "description": "Whole years to project; fractional years are rejected"
+                    },
+                    "monthly_contribution": {"type": "number", "description": "Monthly deposit"}
+                },
+                "required": ["annual_rate", "years"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "affordability_grid",
+            "description": "Largest loan a monthly payment can support for several rates and terms",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "monthly_payment": {"type": "number", "description": "Affordable monthly payment"},
+                    "rates": {"type": "array", "items": {"type": "number"}, "description": "Rates in percent"},
+                    "terms_years": {"type": "array", "items": {"type": "number"}, "description": "Terms in years"}
+                },
+                "required": ["monthly_payment", "rates", "terms_years"]
+            }
+        }
+    },
+]
+
+
+def run_tool(name: str, arguments) -> Tuple[Dict, Optional[str]]:
+    """
+    Run a calculator requested by the model
+
+    Args:
+        name: Tool name
+        arguments: Arguments as a dict or a JSON string
+
+    Returns:
+        (result for the model, Markdown table for the user or None); invalid calls
+        return {"error": ...} so the model can correct itself
+    """
+    tool = _TOOLS.get(name)
+    if tool is None:
+        return {"error": f"Unknown tool {name}"}, None
+    try:
+        if isinstance(arguments, str):
+            arguments = json.loads(arguments or "{}")
+        if not isinstance(arguments, dict):
+            raise ValueError("arguments must be an object")
+        result, table = tool(arguments)
+    except ValueError as e:
+        return {"error": str(e)}, None
+    if table is not None:
+        result["note"] = TABLE_NOTE
+    return result, table
+
+
+def main(argv=None) -> int:
+    """Main function"""
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print(f"Usage: python financial_tools.py <{'|'.join(_TOOLS)}> '<json arguments>'")
+        return 2
+    result, table = run_tool(argv[0], argv[1])
+    print(json.dumps(result, indent=2))
+    if table:
+        print("\n" + table)
+    return 1 if "error" in result else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Local Intent Router for the Banking Bot
+Answers greetings, thanks and other small talk from templates without a model call
+"""
+
+import re
+import threading
+from typing import Dict, Optional, Tuple
+
+from response_cache import normalize_text
+
+# Patterns per intent, matched against the whole normalized message (lowercase, no
+# punctuation) so that "hi, how do I open an account?" still goes to the model
+INTENT_PATTERNS = {
+    "greeting": (
+        r"(?:hi|hello|hey|hiya|howdy|greetings|good (?:morning|afternoon|evening)|yo)"
+        r"(?: there| bot| banking bot| assistant)?"
+    ),
+    "thanks": (
+        r"(?:(?:ok|okay|great|cool|perfect|awesome) )?"
+        r"(?:thanks|thank you|thx|ty|cheers|many thanks)"
+        r"(?: (?:so much|very much|a lot|again))?"
+    ),
+    "capabilities": (
+        r"(?:help|menu|options|"
+        r"what (?:can|do) you do|what can i ask(?: you)?|how can you help(?: me)?|"
+        r"what (?:can|do) you help (?:me )?with|what are your (?:features|capabilities))"
+    ),
+    "identity": (
+        r"(?:who are you|what are you|what is your name|"
+        r"are you (?:a |an )?(?:bot|robot|human|real person|person|ai))"
+    ),
+    "farewell": r"(?:bye|bye bye|goodbye|good bye|see you(?: later)?|good night|have a nice day)",
+}
+
+# Templated answers per intent
+INTENT_RESPONSES = {
+    "greeting": (
+        "Hello! 👋 I'm your Banking AI Assistant. Ask me about accounts, cards, loans, "
+        "transfers, budgeting or fraud protection."
+    ),
+    "thanks": "You're welcome! Is there anything else I can help you with?",
+    "capabilities": (
+        "I'm here to help you with:\n"
+        "- Account information and inquiries\n"
+        "- Banking products (savings, checking, loans, mortgages, credit cards)\n"
+        "- Financial planning and budgeting advice\n"
+        "- Transfers and payments\n"
+        "- Security and fraud prevention tips\n\n"
+        "Just type your question!"
+    ),
+    "identity": (
+        "I'm a Banking AI Assistant powered by Mistral AI. I'm an educational assistant: "
+        "for actual banking transactions, please contact your bank directly."
+    ),
+    "farewell": "Goodbye, and thank you for using the Banking AI Assistant! 👋",
+}
+
+# Longer messages are always real questions
+MAX_ROUTED_CHARS = 80
+
+
+class IntentRouter:
+    """Precompiled intent matcher that decides between a template and the model"""
+
+    def __init__(
+        self,
+        patterns: Optional[Dict[str, str]] = None,
+        responses: Optional[Dict[str, str]] = None
+    ):
+        """
+        Args:
+            patterns: Regex per intent, matched against the whole normalized message
+            responses: Templated answer per intent
+        """
+        patterns = patterns or INTENT_PATTERNS
+        self.responses = responses or INTENT_RESPONSES
+        # One alternation of named groups classifies a message in a single match
+        self._pattern = re.compile(
+            "|".join(f"(?P<{intent}>{pattern})" for intent, pattern in patterns.items())
+        )
+        self._lock = threading.Lock()
+        self.routed = {intent: 0 for intent in patterns}
+        self.to_model = 0
+
+    def classify(self, message: str) -> Optional[str]:
+        """
+        Find the templated intent of a message
+
+        Args:
+            message: Raw user message
+
+        Returns:
+            Intent name, or None if the message needs the model
+        """
+        if len(message) > MAX_ROUTED_CHARS:
+            return None
+        match = self._pattern.fullmatch(normalize_text(message))
+        return match.lastgroup if match else None
+
+    def route(self, message: str) -> Optional[Tuple[str, str]]:
+        """
+        Route a message and record the decision
+
+        Args:
+            message: Raw user message
+
+        Returns:
+            (intent, templated answer), or None if the message should go to the model
+        """
+        intent = self.classify(message)
+        with self._lock:
+            if intent is None:
+                self.to_model += 1
+                return None
+            self.routed[intent] += 1
+        return intent, self.responses[intent]
+
+    def get_stats(self) -> Dict:
+        """Get routing statistics"""
+        with self._lock:
+            routed = sum(self.routed.values())
+            total = routed + self.to_model
+            return {
+                "routed": routed,
+                "to_model": self.to_model,
+                "routed_rate": routed / total if total else 0.0,
+                "intents": dict(self.routed)
+            }
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Banking Knowledge Index
+Offline BM25 (and optional embedding) index over Markdown documents, stored as
+memory-mapped NumPy arrays and rebuilt incrementally when documents change
+
+Run with: python knowledge_index.py build *.md
+          python knowledge_index.py search "How do I enable semantic caching?"
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+INDEX_VERSION = 1
+
+# Default location of the index, next to the bot
+DEFAULT_INDEX_DIR = "knowledge_index"
+
+# Longest passage cut from a document section
+MAX_PASSAGE_CHARS = 800
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_HEADING = re.compile(r"^#{1,6}\s+(.*)")
+
+# Words too common to help ranking
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is it my of on or so "
+    "that the this to was what when where which who why will with you your".split()
+)
+
+# Array files of an index (besides manifest.json and vocab.json)
+_ARRAYS = ("text", "text_offsets", "doc_len", "postings_indptr", "postings_docs", "postings_tf")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords"""
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def split_markdown(text: str, max_chars: int = MAX_PASSAGE_CHARS) -> List[Dict]:
+    """
+    Cut a Markdown document into passages
+
+    Passages follow the document's sections and are split at paragraph
+    boundaries once they grow past max_chars.
+
+    Args:
+        text: Markdown source
+        max_chars: Longest passage (a single longer paragraph is kept whole)
+
+    Returns:
+        [{"heading": ..., "text": ...}] in document order
+    """
+    passages: List[Dict] = []
+    heading = ""
+    paragraphs: List[str] = []
+
+    def flush():
+        body = "\n\n".join(paragraphs).strip()
+        if body:
+            passages.append({"heading": heading, "text": body})
+        paragraphs.clear()
+
+    in_fence = False
+    for block in re.split(r"\n\s*\n", text):
+        block = block.strip()
+        if not block:
+            continue
+        # "# comment" lines inside code fences are not headings
+        match = None if in_fence else _HEADING.match(block)
+        in_fence ^= block.count("```") % 2 == 1
+        if match:
+            flush()
+            heading = match.group(1).strip()
+            rest = block.split("\n", 1)
+            if len(rest) == 1:
+                continue
+            block = rest[1].strip()
+        if paragraphs and sum(len(p) for p in paragraphs) + len(block) > max_chars:
+            flush()
+        paragraphs.append(block)
+    flush()
+    return passages
+
+
+def _file_digest(path: str) -> str:
+    """SHA-1 of a file's contents"""
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class KnowledgeIndex:
+    """Read-only view of a built index; arrays are memory-mapped, not loaded"""
+
+    def __init__(self, index_dir: str = DEFAULT_INDEX_DIR, embedder: Optional[Callable[[str], Sequence[float]]] = None):
+        """
+        Args:
+            index_dir: Directory written by build_index()
+            embedder: Callable(text) -> vector; enables hybrid ranking if the
+                index was built with embeddings
+        """
+        self.index_dir = index_dir
+        self.embedder = embedder
+        with open(os.path.join(index_dir, "manifest.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported knowledge index version in {index_dir}")
+        with open(os.path.join(index_dir, "vocab.json"), encoding="utf-8") as f:
+            self.vocab: Dict[str, int] = json.load(f)
+
+        for name in _ARRAYS:
+            setattr(self, name, np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r"))
+        vectors_path = os.path.join(index_dir, "vectors.npy")
+        self.vectors = np.load(vectors_path, mmap_mode="r") if os.path.exists(vectors_path) else None
+
+        self.passages: List[Dict] = self.manifest["passages"]
+        self.avg_doc_len = float(self.manifest["avg_doc_len"]) or 1.0
+
+    def __len__(self) -> int:
+        return len(self.passages)
+
+    def passage_text(self, i: int) -> str:
+        """Decode one passage from the memory-mapped text blob"""
+        return bytes(self.text[self.text_offsets[i]:self.text_offsets[i + 1]]).decode("utf-8")
+
+    def bm25_scores(self, query: str) -> np.ndarray:
+        """BM25 score of every passage for a query"""
+        scores = np.zeros(len(self), dtype=np.float32)
+        n = len(self)
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.postings_indptr[term_id], self.postings_indptr[term_id + 1]
+            docs = self.postings_docs[start:end]
+            tf = self.postings_tf[start:end]
+            df = end - start
+            idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self.doc_len[docs] / self.avg_doc_len)
+            # A term's postings list each passage once, so plain fancy-index adds are safe
+            scores[docs] += idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+        return scores
+
+    def search(self, query: str, k: int = 3, alpha: float = 0.5) -> List[Dict]:
+        """
+        Find the passages most relevant to a query
+
+        Args:
+            query: User question
+            k: Number of passages to return
+            alpha: Weight of embedding similarity against BM25 (hybrid indexes only)
+
+        Returns:
+            [{"source", "heading", "text", "score"}] best first; empty if nothing matches
+        """
+        if not len(self):
+            return []
+        scores = self.bm25_scores(query)
+        if scores.max() > 0:
+            scores /= scores.max()
+
+        if self.vectors is not None and self.embedder is not None:
+            vector = np.asarray(self.embedder(query), dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            if norm:
+                scores = (1 - alpha) * scores + alpha * np.maximum(self.vectors @ (vector / norm), 0)
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {**self.passages[i], "text": self.passage_text(i), "score": float(scores[i])}
+            for i in top if scores[i] > 0
+        ]
+
+
+def build_index(
+    sources: Sequence[str],
+    index_dir: str = DEFAULT_INDEX_DIR,
+    embedder: Optional[Callable[[str], Sequence[float]]] = None,
+    max_chars: int = MAX_PASSAGE_CHARS
+) -> Dict:
+    """
+    Build or incrementally update an index over Markdown files
+
+    Files whose contents did not change since the last build keep their passages
+    and embeddings; only new or edited files are split (and embedded) again.
+
+    Args:
+        sources: Markdown file paths
+        index_dir: Output directory
+        embedder: Callable(text) -> vector to store passage embeddings
+        max_chars: Longest passage
+
+    Returns:
+        Build statistics
+    """
+    previous: Optional[KnowledgeIndex] = None
+    if os.path.exists(os.path.join(index_dir, "manifest.json")):
+        try:
+            previous = KnowledgeIndex(index_dir)
+        except (ValueError, OSError, KeyError):
+            previous = None
+    reuse_vectors = previous is not None and previous.vectors is not None and embedder is not None
+
+    passages: List[Dict] = []
+    texts: List[str] = []
+    vectors: List[np.ndarray] = []
+    files: Dict[str, Dict] = {}
+    stats = {"files": 0, "reused_files": 0, "passages": 0, "embedded": 0}
+
+    for path in sorted(set(sources)):
+        digest = _file_digest(path)
+        old = previous.manifest["files"].get(path) if previous else None
+        first = len(passages)
+
+        if old and old["sha1"] == digest and (embedder is None or reuse_vectors):
+            # Unchanged: copy passages (and vectors) out of the previous index
+            for i in range(old["first"], old["first"] + old["count"]):
+                passages.append(previous.passages[i])
+                texts.append(previous.passage_text(i))
+                if embedder is not None:
+                    vectors.append(np.array(previous.vectors[i]))
+            stats["reused_files"] += 1
+        else:
+            with open(path, encoding="utf-8") as f:
+                for passage in split_markdown(f.read(), max_chars):
+                    passages.append({"source": path, "heading": passage["heading"]})
+                    texts.append(passage["text"])
+                    if embedder is not None:
+                        vector = np.asarray(embedder(passage["text"]), dtype=np.float32)
+                        norm = np.linalg.norm(vector)
+                        vectors.append(vector / norm if norm else vector)
+                        stats["embedded"] += 1
+
+        files[path] = {"sha1": digest, "first": first, "count": len(passages) - first}
+        stats["files"] += 1
+
+    # Postings: per term, the passages containing it and the term frequency
+    vocab: Dict[str, int] = {}
+    doc_len = np.zeros(len(texts), dtype=np.float32)
+    term_ids: List[int] = []
+    doc_ids: List[int] = []
+    freqs: List[int] = []
+    for doc, text in enumerate(texts):
+        counts = Counter(tokenize(f"{passages[doc]['heading']} {text}"))
+        doc_len[doc] = sum(counts.values())
+        for term, count in counts.items():
+            term_ids.append(vocab.setdefault(term, len(vocab)))
+            doc_ids.append(doc)
+            freqs.append(count)
+
+    term_array = np.asarray(term_ids, dtype=np.int64)
+    order = np.argsort(term_array, kind="stable")
+    indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_array, minlength=len(vocab)), out=indptr[1:])
+
+    encoded = [text.encode("utf-8") for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+
+    arrays = {
+        "text": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        "text_offsets": offsets,
+        "doc_len": doc_len,
+        "postings_indptr": indptr,
+        "postings_docs": np.asarray(doc_ids, dtype=np.int32)[order],
+        "postings_tf": np.asarray(freqs, dtype=np.float32)[order],
+    }
+    if embedder is not None:
+        arrays["vectors"] = np.vstack(vectors).astype(np.float32) if vectors else np.zeros((0, 0), np.float32)
+
+    manifest = {
+        "version": INDEX_VERSION,
+        "avg_doc_len": float(doc_len.mean()) if len(doc_len) else 0.0,
+        "files": files,
+        "passages": passages,
+    }
+    del previous  # release the memory maps before replacing their files
+
+    # Write everything next to the old index, then swap files in; the manifest goes last
+    os.makedirs(index_dir, exist_ok=True)
+    for name, array in arrays.items():
+        tmp = os.path.join(index_dir, f"{name}.tmp.npy")
+        np.save(tmp, array)
+        os.replace(tmp, os.path.join(index_dir, f"{name}.npy"))
+    if embedder is None and os.path.exists(os.path.join(index_dir, "vectors.npy")):
+        os.remove(os.path.join(index_dir, "vectors.npy"))
+    for name, data in (("vocab", vocab), ("manifest", manifest)):
+        tmp = os.path.join(index_dir, f"{name}.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, os.path.join(index_dir, f"{name}.json"))
+
+    stats["passages"] = len(passages)
+    return stats
+
+
+def main(argv=None) -> int:
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Build or query the banking knowledge index")
+    parser.add_argument("--index-dir", default=os.getenv("KNOWLEDGE_INDEX_DIR", DEFAULT_INDEX_DIR))
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Index Markdown files (incremental)")
+    build.add_argument("sources", nargs="*", help="Markdown files (default: *.md here)")
+    search = commands.add_parser("search", help="Show the top passages for a question")
+    search.add_argument("query")
+    search.add_argument("-k", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        sources = args.sources or glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "*.md"))
+        stats = build_index(sources, args.index_dir)
+        print(f"✅ Indexed {stats['passages']} passages from {stats['files']} files "
+              f"({stats['reused_files']} unchanged) into {args.index_dir}")
+        return 0
+
+    index = KnowledgeIndex(args.index_dir)
+    for hit in index.search(args.query, args.k):
+        print(f"\n📄 {hit['source']} › {hit['heading']} (score {hit['score']:.2f})")
+        print(hit["text"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
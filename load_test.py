@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Load Test for the Banking Bot HTTP API
+Runs many concurrent conversations against chat_api.py and reports throughput and
+latency percentiles
+
+Run with: python load_test.py --url http://127.0.0.1:8000 --sessions 100 --turns 4
+          python load_test.py --mock --latency 0.2     # in-process, no API key needed
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from typing import Dict, List
+
+from benchmark import QUESTIONS, percentile
+
+
+async def run_session(http, questions: List[str], stream: bool, results: Dict) -> None:
+    """One user's conversation; turns are sent one after another"""
+    session_id = uuid.uuid4().hex
+    for question in questions:
+        payload = {"session_id": session_id, "message": question, "stream": stream}
+        started = time.perf_counter()
+        try:
+            if stream:
+                first_byte = None
+                async with http.stream("POST", "/v1/chat", json=payload) as response:
+                    ok = response.status_code == 200
+                    async for line in response.aiter_lines():
+                        if first_byte is None and line.startswith("data:"):
+                            first_byte = time.perf_counter() - started
+                        if line.startswith("data:") and "error" in json.loads(line[5:]):
+                            ok = False
+                if first_byte is not None:
+                    results["first_byte"].append(first_byte)
+            else:
+                response = await http.post("/v1/chat", json=payload)
+                ok = response.status_code == 200
+        except Exception:
+            ok = False
+        results["latency"].append(time.perf_counter() - started)
+        results["ok" if ok else "errors"] += 1
+
+
+async def run_load_test(
+    http,
+    sessions: int = 50,
+    turns: int = 4,
+    concurrency: int = 20,
+    stream: bool = False
+) -> Dict:
+    """
+    Drive concurrent sessions through an HTTP client
+
+    Args:
+        http: httpx.AsyncClient pointed at the API
+        sessions: Number of conversations
+        turns: Questions per conversation
+        concurrency: Conversations running at the same time
+        stream: Use the streaming response option
+
+    Returns:
+        Request counts, throughput and latency percentiles
+    """
+    results = {"ok": 0, "errors": 0, "latency": [], "first_byte": []}
+    limit = asyncio.Semaphore(concurrency)
+
+    async def limited(i: int) -> None:
+        questions = [QUESTIONS[(i + t) % len(QUESTIONS)] for t in range(turns)]
+        async with limit:
+            await run_session(http, questions, stream, results)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(limited(i) for i in range(sessions)))
+    elapsed = time.perf_counter() - started
+
+    report = {
+        "requests": results["ok"] + results["errors"],
+        "errors": results["errors"],
+        "seconds": elapsed,
+        "requests_per_second": (results["ok"] + results["errors"]) / elapsed if elapsed else 0.0,
+    }
+    for name in ("latency", "first_byte"):
+        if results[name]:
+            report[name] = {f"p{p}": percentile(results[name], p) for p in (50, 95, 99)}
+    return report
+
+
+def mock_app(latency: float, tokens_per_second: float, store_path: str):
+    """In-process API backed by the mock model and a throwaway SQLite store"""
+    from benchmark import MockMistral
+    from chat_api import ChatAPI, ChatService
+    from resilient_client import ResilientClient
+    from session_store import SQLiteSessionStore
+
+    client = ResilientClient(
+        MockMistral(latency=latency, tokens_per_second=tokens_per_second),
+        api_key=f"load-test-{uuid.uuid4().hex}", requests_per_second=1e9
+    )
+    return ChatAPI(ChatService(store=SQLiteSessionStore(store_path), client=client))
+
+
+async def main_async(args) -> Dict:
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    if not args.mock:
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=120.0) as http:
+            return await run_load_test(http, args.sessions, args.turns, args.concurrency, args.stream)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = mock_app(args.latency, args.tokens_per_second, os.path.join(tmp, "sessions.db"))
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=120.0) as http:
+            report = await run_load_test(http, args.sessions, args.turns, args.concurrency, args.stream)
+        await app.service.aclose()
+        return report
+
+
+def main(argv=None) -> int:
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Load test the Banking Bot HTTP API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL of chat_api.py")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent conversations")
+    parser.add_argument("--stream", action="store_true", help="Use streaming responses")
+    parser.add_argument("--mock", action="store_true", help="Test an in-process API with a mock model")
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock first-token latency (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Mock generation speed")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(main_async(args))
+    print(f"📊 Requests: {report['requests']}  Errors: {report['errors']}  "
+          f"Throughput: {report['requests_per_second']:.1f} req/s")
+    for name, label in (("latency", "Latency"), ("first_byte", "First event")):
+        if name in report:
+            p = report[name]
+            print(f"⏱️ {label} p50 / p95 / p99: "
+                  f"{p['p50'] * 1000:.0f} / {p['p95'] * 1000:.0f} / {p['p99'] * 1000:.0f} ms")
+    return 0 if report["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Per-turn Metrics for the Banking Bot
+Latency and token-usage histograms per turn, with summaries and a Prometheus text export
+"""
+
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144)
+
+# Recent observations kept per histogram for percentile summaries
+RECENT_SAMPLES = 1024
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a window of recent samples"""
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float]):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.recent: deque = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value: float) -> None:
+        """Record one observation"""
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+                break
+        else:
+            self.bucket_counts[-1] += 1
+        self.count += 1
+        self.total += value
+        self.recent.append(value)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Percentile over the recent samples (None if empty)"""
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+    def summary(self) -> Dict:
+        """Count, mean and p50/p95/p99 of the recent samples"""
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99)
+        }
+
+    def to_prometheus(self, prefix: str, labels: str = "", header: bool = True) -> List[str]:
+        """
+        Render the histogram in Prometheus text format
+
+        Args:
+            prefix: Metric name prefix
+            labels: Extra labels, e.g. 'tier="small"'
+            header: Include the HELP/TYPE lines (once per metric family)
+        """
+        name = f"{prefix}_{self.name}"
+        lines = [f"# HELP {name} {self.help_text}", f"# TYPE {name} histogram"] if header else []
+        extra = f"{labels}," if labels else ""
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.bucket_counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{extra}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{extra}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.total}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+class TurnMetrics:
+    """Thread-safe collection of per-turn histograms and counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {
+            "request_build_seconds": Histogram(
+                "request_build_seconds", "Time spent building the request", LATENCY_BUCKETS),
+            "model_latency_seconds": Histogram(
+                "model_latency_seconds", "Network and model time per call", LATENCY_BUCKETS),
+            "time_to_first_token_seconds": Histogram(
+                "time_to_first_token_seconds", "Time from turn start to first token", LATENCY_BUCKETS),
+            "prompt_tokens": Histogram(
+                "prompt_tokens", "Prompt tokens reported by the API", TOKEN_BUCKETS),
+            "completion_tokens": Histogram(
+                "completion_tokens", "Completion tokens reported by the API", TOKEN_BUCKETS),
+            "payload_bytes_saved": Histogram(
+                "payload_bytes_saved", "Request bytes removed by payload compaction", BYTE_BUCKETS),
+            "prompt_tokens_saved": Histogram(
+                "prompt_tokens_saved", "Estimated prompt tokens removed by payload compaction", TOKEN_BUCKETS),
+            "queue_wait_seconds": Histogram(
+                "queue_wait_seconds", "Time queued by the fair scheduler before the model call", LATENCY_BUCKETS),
+        }
+        self.counters = {
+            "turns_total": 0, "cache_hits_total": 0, "routed_total": 0, "prefetch_hits_total": 0,
+            "shed_total": 0, "tier_fallbacks_total": 0, "errors_total": 0
+        }
+        # Model call latency per model tier, created as tiers are used
+        self.tier_latency: Dict[str, Histogram] = {}
+
+    def start_turn(self) -> "TurnTimer":
+        """Start timing a turn recorded into this collection"""
+        return TurnTimer(self)
+
+    def observe(self, name: str, value: float) -> None:
+        """Record a histogram observation"""
+        with self._lock:
+            self.histograms[name].observe(value)
+
+    def observe_tier(self, tier: str, seconds: float) -> None:
+        """Record the latency of one model call made with a tier"""
+        with self._lock:
+            histogram = self.tier_latency.get(tier)
+            if histogram is None:
+                histogram = Histogram("tier_latency_seconds", "Model call latency per tier", LATENCY_BUCKETS)
+                self.tier_latency[tier] = histogram
+            histogram.observe(seconds)
+
+    def increment(self, name: str) -> None:
+        """Increment a counter"""
+        with self._lock:
+            self.counters[name] += 1
+
+    def summary(self) -> Dict:
+        """Counters plus a percentile summary of every histogram"""
+        with self._lock:
+            return {
+                **self.counters,
+                **{name: histogram.summary() for name, histogram in self.histograms.items()},
+                "tiers": {tier: histogram.summary() for tier, histogram in self.tier_latency.items()}
+            }
+
+    def to_prometheus(self, prefix: str = "banking_bot") -> str:
+        """Render all metrics in Prometheus text exposition format"""
+        with self._lock:
+            lines: List[str] = []
+            for name, value in self.counters.items():
+                lines.append(f"# TYPE {prefix}_{name} counter")
+                lines.append(f"{prefix}_{name} {value}")
+            for histogram in self.histograms.values():
+                lines.extend(histogram.to_prometheus(prefix))
+            for i, (tier, histogram) in enumerate(sorted(self.tier_latency.items())):
+                lines.extend(histogram.to_prometheus(prefix, f'tier="{tier}"', header=i == 0))
+        return "\n".join(lines) + "\n"
+
+
+class TurnTimer:
+    """Timing of one turn, recorded into one or more TurnMetrics"""
+
+    def __init__(self, *registries: TurnMetrics):
+        self.registries = registries
+        self.started = time.perf_counter()
+        self.call_started: Optional[float] = None
+        self.first_token_at: Optional[float] = None
+
+    def _observe(self, name: str, value: float) -> None:
+        for registry in self.registries:
+            registry.observe(name, value)
+
+    def _increment(self, name: str) -> None:
+        for registry in self.registries:
+            registry.increment(name)
+
+    def request_built(self) -> None:
+        """Mark the end of request building and the start of the model call"""
+        self.call_started = time.perf_counter()
+        self._observe("request_build_seconds", self.call_started - self.started)
+
+    def first_token(self) -> None:
+        """Mark the arrival of the first streamed token"""
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            self._observe("time_to_first_token_seconds", self.first_token_at - self.started)
+
+    def finished(self, usage=None) -> None:
+        """
+        Mark a completed model call
+
+        Args:
+            usage: The API's usage object (prompt_tokens / completion_tokens), if any
+        """
+        now = time.perf_counter()
+        if self.first_token_at is None:
+            # Non-streaming calls deliver every token at once
+            self.first_token_at = now
+            self._observe("time_to_first_token_seconds", now - self.started)
+        self._observe("model_latency_seconds", now - (self.call_started or self.started))
+        if usage is not None:
+            if getattr(usage, "prompt_tokens", None) is not None:
+                self._observe("prompt_tokens", usage.prompt_tokens)
+            if getattr(usage, "completion_tokens", None) is not None:
+                self._observe("completion_tokens", usage.completion_tokens)
+        self._increment("turns_total")
+
+    def compacted(self, bytes_saved: int, tokens_saved: int) -> None:
+        """Record how much payload compaction removed from a request"""
+        self._observe("payload_bytes_saved", bytes_saved)
+        self._observe("prompt_tokens_saved", tokens_saved)
+
+    def queued(self, seconds: float) -> None:
+        """Record the time a request waited for a scheduler slot; the model call starts now"""
+        self._observe("queue_wait_seconds", seconds)
+        self.call_started = time.perf_counter()
+
+    def shed(self) -> None:
+        """Record a turn shed by the scheduler and answered in degraded form"""
+        self._increment("shed_total")
+        self._increment("turns_total")
+
+    def model_call(self, tier: str, seconds: float) -> None:
+        """Record one model call (fallback attempts included) and the tier it used"""
+        for registry in self.registries:
+            registry.observe_tier(tier, seconds)
+
+    def fallback(self) -> None:
+        """Record an escalation to a larger tier after a failed call"""
+        self._increment("tier_fallbacks_total")
+
+    def cache_hit(self) -> None:
+        """Record a turn answered from a cache"""
+        self._increment("cache_hits_total")
+        self._increment("turns_total")
+
+    def prefetch_hit(self) -> None:
+        """Record a turn answered with a prefetched follow-up answer"""
+        self._increment("prefetch_hits_total")
+        self._increment("turns_total")
+
+    def routed(self) -> None:
+        """Record a turn answered locally by the intent router"""
+        self._increment("routed_total")
+        self._increment("turns_total")
+
+    def error(self) -> None:
+        """Record a failed turn"""
+        self._increment("errors_total")
+        self._increment("turns_total")
+
+
+def format_seconds(value: Optional[float]) -> str:
+    """Format a latency in milliseconds for display"""
+    return "-" if value is None else f"{value * 1000:.0f} ms"
+
+
+def start_metrics_server(metrics: TurnMetrics, port: int = 9100, host: str = "0.0.0.0") -> "ThreadingHTTPServer":
+    """
+    Serve metrics at /metrics in Prometheus text format from a daemon thread
+
+    Args:
+        metrics: Metrics to expose
+        port: Port to listen on
+        host: Interface to bind
+
+    Returns:
+        The running server (call shutdown() to stop it)
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
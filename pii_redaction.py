@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+PII Redaction Pipeline
+Removes card numbers, IBANs, account numbers, email addresses and phone numbers from
+conversation records before they are persisted or exported. Records are redacted in
+batches on a background worker, so the turn that produced them does not wait for it.
+
+Usage:
+    python pii_redaction.py conversation_log.jsonl -o redacted_log.jsonl
+"""
+
+import argparse
+import queue
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+# One alternation, tried left to right at each position: emails before the digit
+# patterns so a number inside an address is not matched on its own, IBANs before
+# cards, and long digit runs before phone numbers
+_PATTERN = re.compile(r"""
+    (?P<email>\b[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}\b)
+  | (?P<iban>\b[A-Z]{2}\d{2}(?:[ ]?[A-Z0-9]{4}){2,7}(?:[ ]?[A-Z0-9]{1,3})?\b)
+  | (?P<card>(?<![\d.,])\d(?:[ -]?\d){12,18}(?![\d.,]\d))
+  | (?P<account>(?<![\d.,])\d{8,17}(?![\d.,]\d))
+  | (?P<phone>(?<![\w+])(?:\+\d{1,3}[ .-]?)?(?:\(\d{2,4}\)[ .-]?|\d{2,4}[ .-])\d{3,4}[ .-]?\d{3,4}\b)
+""", re.VERBOSE | re.ASCII)
+
+# Every match holds a digit or an @; texts without one (most chat text) skip the scan
+_TRIGGER = re.compile(r"[0-9@]")
+_NON_DIGITS = re.compile(r"\D")
+
+# Replacement text per kind of match
+PLACEHOLDERS = {
+    "email": "[email]",
+    "iban": "[IBAN]",
+    "card": "[card number]",
+    "account": "[account number]",
+    "phone": "[phone number]",
+}
+
+
+def luhn_valid(digits: str) -> bool:
+    """Luhn checksum of a digit string, as used by payment card numbers"""
+    total = 0
+    for i, digit in enumerate(reversed(digits)):
+        value = ord(digit) - 48
+        if i % 2:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return total % 10 == 0
+
+
+def iban_valid(iban: str) -> bool:
+    """ISO 13616 mod-97 check of an IBAN (spaces allowed)"""
+    compact = iban.replace(" ", "")
+    if not 15 <= len(compact) <= 34:
+        return False
+    rearranged = compact[4:] + compact[:4]
+    return int("".join(str(int(c, 36)) for c in rearranged)) % 97 == 1
+
+
+class PIIRedactor:
+    """Single-pass redaction of personal data with one precompiled pattern"""
+
+    def __init__(self):
+        self.matches: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def _classify(self, match: "re.Match") -> Optional[str]:
+        """Kind of a match after checksum validation, or None to keep the text"""
+        kind = match.lastgroup
+        text = match.group()
+        if kind == "iban":
+            return kind if iban_valid(text) else None
+        if kind == "card":
+            digits = _NON_DIGITS.sub("", text)
+            if luhn_valid(digits):
+                return kind
+            # Not a card, but a long number typed by a customer is still an identifier
+            return "account" if len(digits) <= 17 else None
+        return kind
+
+    def redact(self, text: str) -> Tuple[str, Counter]:
+        """
+        Redact one text
+
+        Args:
+            text: Message content
+
+        Returns:
+            (redacted text, matches per kind)
+        """
+        found: Counter = Counter()
+        if _TRIGGER.search(text) is None:
+            return text, found
+
+        def replace(match):
+            kind = self._classify(match)
+            if kind is None:
+                return match.group()
+            found[kind] += 1
+            return PLACEHOLDERS[kind]
+
+        redacted = _PATTERN.sub(replace, text)
+        if found:
+            with self._lock:
+                self.matches.update(found)
+        return redacted, found
+
+    def redact_text(self, text: str) -> str:
+        """Redacted copy of a text"""
+        return self.redact(text)[0]
+
+
+class RedactionPipeline:
+    """
+    Background worker that redacts records in batches and hands them to their writers
+
+    submit() only queues the record; a worker thread takes up to batch_size records at a
+    time, waiting at most max_delay for a batch to fill, redacts their "content" and
+    calls each record's writer with the redacted copy. Writers are called in submission
+    order, so a journal still receives its messages in order. flush() waits until every
+    record submitted before it has been written.
+    """
+
+    def __init__(
+        self,
+        redactor: Optional[PIIRedactor] = None,
+        batch_size: int = 64,
+        max_delay: float = 0.05,
+        max_queued: int = 10000
+    ):
+        """
+        Args:
+            redactor: Redactor to apply (a new one if omitted)
+            batch_size: Most records redacted and written per batch
+            max_delay: Seconds the worker waits for a batch to fill
+            max_queued: Queue bound; submit() blocks while it is full
+        """
+        self.redactor = redactor or PIIRedactor()
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._queue: "queue.Queue" = queue.Queue(max_queued)
+        self._cond = threading.Condition()
+        self._submitted = 0
+        self._written = 0
+        self._flushing = 0
+        self._worker: Optional[threading.Thread] = None
+        self.stats = {"records": 0, "batches": 0, "bytes": 0, "write_errors": 0, "busy_seconds": 0.0}
+
+    def submit(self, record: Dict, write: Callable[[Dict], None]) -> None:
+        """
+        Queue a record for redaction
+
+        Args:
+            record: Conversation record with a "content" string
+            write: Called with the redacted copy on the worker thread
+        """
+        with self._cond:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="pii-redaction", daemon=True)
+                self._worker.start()
+            self._submitted += 1
+        self._queue.put((record, write))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every record submitted so far has been written
+
+        Args:
+            timeout: Most seconds to wait (no limit if None)
+
+        Returns:
+            False if the timeout expired first
+        """
+        with self._cond:
+            target = self._submitted
+            self._flushing += 1
+            try:
+                return self._cond.wait_for(lambda: self._written >= target, timeout)
+            finally:
+                self._flushing -= 1
+
+    def _next_batch(self) -> List[Tuple[Dict, Callable]]:
+        """Block for the first record, then collect more until the batch or delay is full"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            # Someone is waiting in flush(), so don't hold the batch back for more
+            if remaining <= 0 or self._flushing:
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, 0.005)))
+            except queue.Empty:
+                pass
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+            size = 0
+            redacted = []
+            for record, write in batch:
+                content = record.get("content")
+                if isinstance(content, str):
+                    size += len(content.encode("utf-8"))
+                    record = {**record, "content": self.redactor.redact_text(content)}
+                redacted.append((record, write))
+            busy = time.perf_counter() - started
+
+            for record, write in redacted:
+                try:
+                    write(record)
+                except Exception as e:
+                    self.stats["write_errors"] += 1
+                    print(f"\n⚠️ Could not write a redacted record: {str(e)}")
+            with self._cond:
+                self.stats["records"] += len(batch)
+                self.stats["batches"] += 1
+                self.stats["bytes"] += size
+                self.stats["busy_seconds"] += busy
+                self._written += len(batch)
+                self._cond.notify_all()
+
+    def get_stats(self) -> Dict:
+        """Get record, batch and match counts, queue depth and redaction throughput"""
+        with self._cond:
+            stats = dict(self.stats)
+            stats["queued"] = self._submitted - self._written
+        busy = stats["busy_seconds"]
+        stats["records_per_second"] = stats["records"] / busy if busy else 0.0
+        stats["mb_per_second"] = stats["bytes"] / busy / 1e6 if busy else 0.0
+        stats["matches"] = dict(self.redactor.matches)
+        return stats
+
+
+_pipeline: Optional[RedactionPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline() -> RedactionPipeline:
+    """Redaction pipeline shared by every journal in this process, created on first use"""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = RedactionPipeline()
+        return _pipeline
+
+
+class RedactingJournal:
+    """Journal wrapper: records reach the inner journal only after redaction"""
+
+    def __init__(self, journal, pipeline: Optional[RedactionPipeline] = None):
+        """
+        Args:
+            journal: Journal with append(), sync() and close() (e.g. ConversationJournal)
+            pipeline: Redaction pipeline (the shared one if omitted)
+        """
+        self.journal = journal
+        self.pipeline = pipeline or get_pipeline()
+
+    @property
+    def path(self) -> str:
+        return self.journal.path
+
+    def append(self, record: Dict) -> None:
+        """Queue a record; it is redacted and appended on the pipeline's worker"""
+        self.pipeline.submit(record, self.journal.append)
+
+    def sync(self) -> None:
+        """Wait for queued records to be written, then sync the inner journal"""
+        self.pipeline.flush()
+        self.journal.sync()
+
+    def close(self) -> None:
+        """Write queued records, then close the inner journal"""
+        self.pipeline.flush()
+        self.journal.close()
+
+
+def main(argv=None) -> int:
+    """Redact an existing conversation log and report throughput"""
+    from conversation_journal import ConversationJournal, read_journal
+
+    parser = argparse.ArgumentParser(description="Redact PII from a conversation log")
+    parser.add_argument("log", help="JSONL conversation log (rotated segments included)")
+    parser.add_argument("-o", "--output", required=True, help="Redacted JSONL log to write")
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args(argv)
+
+    pipeline = RedactionPipeline(batch_size=args.batch_size)
+    output = ConversationJournal(args.output, max_bytes=0)
+    started = time.perf_counter()
+    try:
+        for record in read_journal(args.log):
+            pipeline.submit(record, output.append)
+        pipeline.flush()
+    finally:
+        output.close()
+    elapsed = time.perf_counter() - started
+
+    stats = pipeline.get_stats()
+    print(f"🔒 Redacted {stats['records']} records ({stats['bytes'] / 1e6:.1f} MB) in {elapsed:.2f}s")
+    print(f"   Redaction: {stats['records_per_second']:,.0f} records/s, {stats['mb_per_second']:.1f} MB/s "
+          f"in {stats['batches']} batches")
+    for kind, count in sorted(stats["matches"].items()):
+        print(f"   {kind}: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Speculative Follow-up Prefetch for the Banking Bot
+While the user reads an answer, generates answers to the follow-up questions they are most
+likely to ask next, within a budget that is a fixed share of the API quota
+"""
+
+import copy
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Tuple
+
+from bot_core import complete_chat, default_policy, get_client, ground_messages, is_grounded
+from resilient_client import TokenBucket
+from response_cache import normalize_text
+from scheduler import Overloaded
+
+# Likely follow-ups per topic of the question just answered, most likely first
+FOLLOW_UPS = {
+    "accounts": (
+        r"\b(?:accounts?|checking|savings)\b",
+        ["What are the fees?", "What is the minimum balance?", "How do I open one?"]
+    ),
+    "cards": (
+        r"\b(?:credit cards?|debit cards?|cards?)\b",
+        ["What are the fees?", "What is the interest rate?", "How do I apply?"]
+    ),
+    "loans": (
+        r"\b(?:loans?|mortgages?|refinanc\w*)\b",
+        ["What documents do I need?", "How long does approval take?", "What credit score do I need?"]
+    ),
+    "fraud": (
+        r"\b(?:fraud\w*|scam\w*|stolen|phish\w*|suspicious)\b",
+        ["How do I report it?", "Will I get my money back?"]
+    ),
+    "transfers": (
+        r"\b(?:transfers?|wire|payments?|send money)\b",
+        ["How long does it take?", "What are the fees?"]
+    ),
+    "interest": (
+        r"\b(?:interest|apy|apr|rates?)\b",
+        ["How is it calculated?", "Can you give me an example?"]
+    ),
+}
+
+# Seconds a prefetched answer stays valid
+PREFETCH_TTL_SECONDS = 120.0
+
+# API quota assumed for clients without a rate limiter (ResilientClient's default)
+DEFAULT_QUOTA_REQUESTS_PER_SECOND = 5.0
+
+# Scheduler user and weight of prefetches: a tenth of a user's share, so foreground
+# turns always go first and prefetches are shed first under load
+PREFETCH_USER = "prefetch"
+PREFETCH_WEIGHT = 0.1
+
+
+class PrefetchCache:
+    """Prefetched answers of one session; they are only valid for the turn right after"""
+
+    def __init__(self, prefetcher: "Prefetcher"):
+        self.prefetcher = prefetcher
+        self._entries: Dict[str, Tuple[Future, float]] = {}
+        self._lock = threading.Lock()
+
+    def put(self, question: str, future: Future) -> None:
+        """Store an answer being prefetched for a predicted question"""
+        with self._lock:
+            self._entries[normalize_text(question)] = (future, time.monotonic() + self.prefetcher.ttl_seconds)
+
+    def take(self, question: str) -> Optional[str]:
+        """
+        Get the prefetched answer to the user's next question, if it was predicted
+
+        Every other prediction is discarded: they were made for this turn only. A
+        prediction still being generated is waited for, which is still faster than
+        starting over.
+
+        Args:
+            question: The user's message
+
+        Returns:
+            The prefetched answer, or None
+        """
+        with self._lock:
+            entries, self._entries = self._entries, {}
+        entry = entries.pop(normalize_text(question), None)
+        self._discard(entries.values())
+
+        if entry is None:
+            return None
+        future, expires = entry
+        if time.monotonic() > expires:
+            self._discard([entry])
+            return None
+        try:
+            answer = future.result()
+        except Exception:
+            return None
+        self.prefetcher.record("hits")
+        return answer
+
+    def clear(self) -> None:
+        """Discard all predictions (e.g. when the conversation is cleared)"""
+        with self._lock:
+            entries, self._entries = self._entries, {}
+        self._discard(entries.values())
+
+    def _discard(self, entries) -> None:
+        """Cancel unused predictions that have not started yet and count them as wasted"""
+        for future, _ in entries:
+            future.cancel()
+            self.prefetcher.record("wasted")
+
+
+class Prefetcher:
+    """Predicts follow-up questions and answers them in the background, within a budget"""
+
+    def __init__(
+        self,
+        share: float = 0.2,
+        quota_requests_per_second: Optional[float] = None,
+        max_predictions: int = 2,
+        ttl_seconds: float = PREFETCH_TTL_SECONDS,
+        follow_ups: Optional[Dict[str, Tuple[str, List[str]]]] = None,
+        workers: int = 2,
+        scheduler=None
+    ):
+        """
+        Args:
+            share: Largest share of the API quota spent on prefetching
+            quota_requests_per_second: The API quota (read from the client's shared rate
+                limiter on first use if omitted)
+            max_predictions: Follow-ups prefetched after each answer
+            ttl_seconds: Seconds a prefetched answer stays valid
+            follow_ups: {topic: (regex, [follow-up questions])} (FOLLOW_UPS if omitted)
+            workers: Background threads generating answers
+            scheduler: FairScheduler that foreground model calls go through; prefetches
+                queue behind them at PREFETCH_WEIGHT and are shed first
+        """
+        self.share = share
+        self.quota_requests_per_second = quota_requests_per_second
+        self.budget: Optional[TokenBucket] = None
+        self.max_predictions = max_predictions
+        self.ttl_seconds = ttl_seconds
+        self.follow_ups = [
+            (re.compile(pattern, re.IGNORECASE), questions)
+            for pattern, questions in (follow_ups or FOLLOW_UPS).values()
+        ]
+        self.workers = workers
+        self.scheduler = scheduler
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.stats = {"issued": 0, "hits": 0, "wasted": 0, "failed": 0, "over_budget": 0, "busy": 0, "shed": 0}
+
+    def session(self) -> PrefetchCache:
+        """Create the prefetch cache of a new session"""
+        return PrefetchCache(self)
+
+    def record(self, name: str) -> None:
+        """Increment a statistic"""
+        with self._lock:
+            self.stats[name] += 1
+
+    def predict(self, question: str) -> List[str]:
+        """
+        Predict the user's next questions
+
+        Args:
+            question: The question just answered
+
+        Returns:
+            Up to max_predictions follow-up questions, most likely first
+        """
+        asked = normalize_text(question)
+        predictions: List[str] = []
+        for pattern, questions in self.follow_ups:
+            if not pattern.search(question):
+                continue
+            for follow_up in questions:
+                if follow_up not in predictions and normalize_text(follow_up) != asked:
+                    predictions.append(follow_up)
+                if len(predictions) == self.max_predictions:
+                    return predictions
+        return predictions
+
+    def _get_budget(self, client) -> TokenBucket:
+        """
+        Budget bucket, sized on first use as a share of the API quota
+
+        Every prefetch is a single attempt on a single tier (see _single_call), so one
+        token is charged per upstream request.
+
+        Args:
+            client: Client whose per-key rate limiter sets the quota
+
+        Returns:
+            The budget token bucket
+        """
+        with self._lock:
+            if self.budget is None:
+                quota = self.quota_requests_per_second
+                if quota is None:
+                    limiter = getattr(client, "rate_limiter", None)
+                    quota = limiter.rate if limiter is not None else DEFAULT_QUOTA_REQUESTS_PER_SECOND
+                rate = self.share * quota
+                self.budget = TokenBucket(rate, capacity=max(rate, self.max_predictions))
+            return self.budget
+
+    def _admit(self, client) -> bool:
+        """Allow a prefetch only with idle capacity and budget left"""
+        limiter = getattr(client, "rate_limiter", None)
+        if limiter is not None and limiter.available() < 1:
+            # Foreground requests are already using the quota
+            self.record("busy")
+            return False
+        if not self._get_budget(client).try_acquire():
+            self.record("over_budget")
+            return False
+        return True
+
+    def _single_call(self, client, policy):
+        """
+        Client and policy for a prefetch that makes exactly one upstream request
+
+        Retries and the fallback to the large tier would each cost quota the budget
+        never charged, so both are turned off. A failed prefetch is simply not served.
+
+        Returns:
+            (client without retries, policy without fallback)
+        """
+        with_max_attempts = getattr(client, "with_max_attempts", None)
+        if with_max_attempts is not None:
+            client = with_max_attempts(1)
+        policy = policy or default_policy
+        if policy.fallback:
+            policy = copy.copy(policy)
+            policy.fallback = False
+        return client, policy
+
+    def _answer(self, messages: List[Dict], client, policy) -> str:
+        """Generate one prefetched answer (runs on a background thread)"""
+        client, policy = self._single_call(client, policy)
+        slot = self.scheduler.slot(PREFETCH_USER, PREFETCH_WEIGHT) if self.scheduler else nullcontext()
+        try:
+            with slot:
+                # No calculators: tool rounds would make one budget token cost several calls
+                return complete_chat(ground_messages(messages), None, client, policy, tools=False)
+        except Overloaded:
+            self.record("shed")
+            raise
+        except Exception:
+            self.record("failed")
+            raise
+
+    def schedule(
+        self,
+        cache: PrefetchCache,
+        request: List[Dict],
+        answer: str,
+        client=None,
+        policy=None
+    ) -> int:
+        """
+        Start prefetching answers to the likely follow-ups of a turn
+
+        Args:
+            cache: The session's prefetch cache
+            request: Messages of the request just answered (copied, not kept)
+            answer: The answer to it
+            client: Mistral client override (the shared client if omitted)
+            policy: Model selection policy
+
+        Returns:
+            Number of prefetches started
+        """
+        if is_grounded(request):
+            # Drop the passages retrieved for the previous question
+            request = [*request[:-2], request[-1]]
+        client = client or get_client()
+        started = 0
+
+        for follow_up in self.predict(request[-1]["content"]):
+            if not self._admit(client):
+                break
+            if self._executor is None:
+                with self._lock:
+                    if self._executor is None:
+                        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="prefetch")
+            messages = [
+                *request,
+                {"role": "assistant", "content": answer},
+                {"role": "user", "content": follow_up}
+            ]
+            cache.put(follow_up, self._executor.submit(self._answer, messages, client, policy))
+            self.record("issued")
+            started += 1
+        return started
+
+    def get_stats(self) -> Dict:
+        """Get prefetch statistics"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats["hit_rate"] = stats["hits"] / stats["issued"] if stats["issued"] else 0.0
+        return stats
+
+    def shutdown(self) -> None:
+        """Stop the background threads"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Resilient wrapper around the Mistral client
+Deadline-based timeouts, jittered exponential retries, a circuit breaker, per-key rate limiting
+and single-flight coalescing of identical concurrent requests
+"""
+
+import asyncio
+import copy
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import AsyncIterator, Dict, Iterator, Optional
+
+from single_flight import SingleFlight, payload_key
+
+# HTTP status codes worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+# Exception class names (httpx and built-ins) that indicate a transient network problem
+RETRYABLE_EXCEPTION_NAMES = {
+    "TimeoutException", "ConnectTimeout", "ReadTimeout", "WriteTimeout", "PoolTimeout",
+    "ConnectError", "ReadError", "WriteError", "RemoteProtocolError",
+    "ConnectionError", "TimeoutError"
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised when the circuit breaker is rejecting calls"""
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call could not complete before its deadline"""
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Decide whether an error from the API is worth retrying
+
+    Args:
+        error: Exception raised by the underlying client
+
+    Returns:
+        True for rate limiting, transient server errors and network failures
+    """
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    return any(cls.__name__ in RETRYABLE_EXCEPTION_NAMES for cls in type(error).__mro__)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read a Retry-After header (in seconds) from an API error, if present"""
+    response = getattr(error, "raw_response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Token-bucket rate limiter"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate: Tokens added per second (sustained requests per second)
+            capacity: Maximum burst size (defaults to one second of tokens)
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Take one token, going into debt if none are available
+
+        Returns:
+            Seconds the caller must wait before using the reserved token
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def _refill(self) -> None:
+        """Add the tokens earned since the last update (lock held)"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        """Take one token only if one is available right now"""
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def available(self) -> float:
+        """Tokens available right now (negative while callers are waiting)"""
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+# One limiter per API key, shared by every client in the process
+_rate_limiters: Dict[str, TokenBucket] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(api_key: str, rate: float, capacity: Optional[float] = None) -> TokenBucket:
+    """Get the shared token bucket for an API key, creating it on first use"""
+    with _rate_limiters_lock:
+        bucket = _rate_limiters.get(api_key)
+        if bucket is None:
+            bucket = TokenBucket(rate, capacity)
+            _rate_limiters[api_key] = bucket
+        return bucket
+
+
+class CircuitBreaker:
+    """Circuit breaker with half-open probing"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds to stay open before letting a probe through
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """Admit a call or raise CircuitOpenError"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpenError("Circuit open: Mistral API is failing, try again shortly")
+                self.state = self.HALF_OPEN
+
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    raise CircuitOpenError("Circuit half-open: waiting for probe request")
+                self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        """Close the circuit after a successful call"""
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """Count a failure, opening the circuit at the threshold or on a failed probe"""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def release(self) -> None:
+        """Release a probe slot for a call that neither succeeded nor failed upstream"""
+        with self._lock:
+            self._probe_in_flight = False
+
+
+class ResilientClient:
+    """Drop-in wrapper for the Mistral client exposing chat.complete/stream (and async variants)"""
+
+    def __init__(
+        self,
+        client,
+        api_key: str = "",
+        deadline: float = 60.0,
+        max_attempts: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        breaker: Optional[CircuitBreaker] = None,
+        requests_per_second: float = 5.0,
+        burst: Optional[float] = None,
+        coalesce: bool = True
+    ):
+        """
+        Args:
+            client: Underlying Mistral client
+            api_key: Key used to share the rate limiter between clients
+            deadline: Total seconds allowed per call, retries included
+            max_attempts: Maximum attempts per call
+            base_delay: First retry delay in seconds (doubles each attempt)
+            max_delay: Upper bound for a single retry delay
+            breaker: Circuit breaker (a new one if omitted)
+            requests_per_second: Sustained request rate allowed for the API key
+            burst: Maximum burst of requests for the API key
+            coalesce: Share one upstream call between identical concurrent requests
+        """
+        self.client = client
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.rate_limiter = get_rate_limiter(api_key, requests_per_second, burst)
+        self.flights = SingleFlight() if coalesce else None
+        self.stats = {"calls": 0, "attempts": 0, "retries": 0, "failures": 0, "rejected": 0}
+        self.chat = SimpleNamespace(
+            complete=self.complete,
+            stream=self.stream,
+            complete_async=self.complete_async,
+            stream_async=self.stream_async
+        )
+
+    def with_max_attempts(self, max_attempts: int) -> "ResilientClient":
+        """
+        View of this client with another attempt limit (e.g. 1 for optional calls)
+
+        The view shares the underlying client, circuit breaker, rate limiter and
+        statistics, but does not coalesce: a follower must not inherit a leader's
+        smaller retry budget.
+        """
+        view = copy.copy(self)
+        view.max_attempts = max_attempts
+        view.flights = None
+        view.chat = SimpleNamespace(
+            complete=view.complete,
+            stream=view.stream,
+            complete_async=view.complete_async,
+            stream_async=view.stream_async
+        )
+        return view
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential backoff, honouring Retry-After when given"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        return max(delay, retry_after_seconds(error) or 0.0)
+
+    def _admit(self, expires: float) -> float:
+        """Check the breaker and rate limiter; return seconds to wait before the attempt"""
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self.stats["rejected"] += 1
+            raise
+        wait = self.rate_limiter.reserve()
+        if time.monotonic() + wait >= expires:
+            self.breaker.release()
+            raise DeadlineExceeded("Rate limit wait exceeds the request deadline")
+        self.stats["attempts"] += 1
+        return wait
+
+    def _remaining_ms(self, expires: float) -> int:
+        """Time left before the deadline, for the per-attempt timeout"""
+        remaining = expires - time.monotonic()
+        if remaining <= 0:
+            self.breaker.release()
+            raise DeadlineExceeded("Request deadline exceeded")
+        return int(remaining * 1000)
+
+    def _on_failure(self, attempt: int, error: Exception, expires: float) -> float:
+        """Record a failed attempt and return the retry delay, or re-raise"""
+        if not is_retryable(error):
+            # Client errors (bad request, auth) say nothing about provider health
+            self.breaker.release()
+            self.stats["failures"] += 1
+            raise error
+
+        self.breaker.record_failure()
+        delay = self._backoff(attempt, error)
+        if (attempt + 1 >= self.max_attempts
+                or time.monotonic() + delay >= expires
+                or self.breaker.state == CircuitBreaker.OPEN):
+            self.stats["failures"] += 1
+            raise error
+
+        self.stats["retries"] += 1
+        return delay
+
+    def complete(self, **kwargs):
+        """Resilient client.chat.complete; identical concurrent calls share one request"""
+        if self.flights is None:
+            return self._complete(**kwargs)
+        return self.flights.complete(payload_key(kwargs), lambda: self._complete(**kwargs))
+
+    def _complete(self, **kwargs):
+        """One upstream complete call, with retries"""
+        self.stats["calls"] += 1
+        expires = time.monotonic() + self.deadline
+
+        for attempt in range(self.max_attempts):
+            time.sleep(self._admit(expires))
+            timeout_ms = self._remaining_ms(expires)
+            try:
+                response = self.client.chat.complete(timeout_ms=timeout_ms, **kwargs)
+            except Exception as e:
+                time.sleep(self._on_failure(attempt, e, expires))
+                continue
+            self.breaker.record_success()
+            return response
+
+    def stream(self, **kwargs) -> Iterator:
+        """Resilient client.chat.stream; identical concurrent calls share one stream"""
+        if self.flights is None:
+            return self._stream(**kwargs)
+        return self.flights.stream(payload_key(kwargs), lambda: self._stream(**kwargs))
+
+    def _stream(self, **kwargs) -> Iterator:
+        """One upstream stream; retries only until the first event arrives"""
+        self.stats["calls"] += 1
+        expires = time.monotonic() + self.deadline
+
+        for attempt in range(self.max_attempts):
+            time.sleep(self._admit(expires))
+            timeout_ms = self._remaining_ms(expires)
+            received = False
+            try:
+                for event in self.client.chat.stream(timeout_ms=timeout_ms, **kwargs):
+                    received = True
+                    yield event
+            except GeneratorExit:
+                # The caller stopped reading (rerun, disconnect); free a half-open probe slot
+                self.breaker.release()
+                raise
+            except Exception as e:
+                if received:
+                    # Part of the answer was already delivered; do not replay it
+                    self.breaker.record_failure()
+                    self.stats["failures"] += 1
+                    raise
+                time.sleep(self._on_failure(attempt, e, expires))
+                continue
+            self.breaker.record_success()
+            return
+
+    async def complete_async(self, **kwargs):
+        """Resilient client.chat.complete_async; identical concurrent calls share one request"""
+        if self.flights is None:
+            return await self._complete_async(**kwargs)
+        return await self.flights.complete_async(payload_key(kwargs), lambda: self._complete_async(**kwargs))
+
+    async def _complete_async(self, **kwargs):
+        """One upstream complete_async call, with retries"""
+        self.stats["calls"] += 1
+        expires = time.monotonic() + self.deadline
+
+        for attempt in range(self.max_attempts):
+            await asyncio.sleep(self._admit(expires))
+            timeout_ms = self._remaining_ms(expires)
+            try:
+                response = await self.client.chat.complete_async(timeout_ms=timeout_ms, **kwargs)
+            except Exception as e:
+                await asyncio.sleep(self._on_failure(attempt, e, expires))
+                continue
+            self.breaker.record_success()
+            return response
+
+    async def stream_async(self, **kwargs) -> AsyncIterator:
+        """Resilient client.chat.stream_async; identical concurrent calls share one stream"""
+        if self.flights is None:
+            return self._stream_async(**kwargs)
+        return self.flights.stream_async(payload_key(kwargs), lambda: self._stream_async(**kwargs))
+
+    async def _stream_async(self, **kwargs) -> AsyncIterator:
+        """One upstream stream_async; retries only until the first event arrives"""
+        self.stats["calls"] += 1
+        expires = time.monotonic() + self.deadline
+
+        for attempt in range(self.max_attempts):
+            await asyncio.sleep(self._admit(expires))
+            timeout_ms = self._remaining_ms(expires)
+            received = False
+            try:
+                stream = await self.client.chat.stream_async(timeout_ms=timeout_ms, **kwargs)
+                async for event in stream:
+                    received = True
+                    yield event
+            except (GeneratorExit, asyncio.CancelledError):
+                # Closed or cancelled by the caller; free a half-open probe slot
+                self.breaker.release()
+                raise
+            except Exception as e:
+                if received:
+                    self.breaker.record_failure()
+                    self.stats["failures"] += 1
+                    raise
+                await asyncio.sleep(self._on_failure(attempt, e, expires))
+                continue
+            self.breaker.record_success()
+            return
+
+    def get_stats(self) -> Dict:
+        """Get retry, circuit breaker and coalescing statistics"""
+        coalesced = self.flights.get_stats()["coalesced"] if self.flights is not None else 0
+        return {**self.stats, "coalesced": coalesced, "circuit_state": self.breaker.state}
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Response Cache for repeated banking questions
+Exact, normalized-text and optional embedding-similarity lookup with TTL and LRU eviction
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence
+
+# NumPy is only imported once an embedder is used, keeping startup fast
+if TYPE_CHECKING:
+    import numpy as np
+
+# Characters dropped when normalizing questions for lookup
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize a question so trivially different phrasings share a key
+
+    Args:
+        text: Raw user question
+
+    Returns:
+        Lowercased text without punctuation and with collapsed whitespace
+    """
+    text = _PUNCTUATION.sub(" ", text.lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def is_context_free(history: List[Dict]) -> bool:
+    """
+    Check whether a conversation is a first turn with no prior context
+
+    Args:
+        history: Conversation history including the current user message
+
+    Returns:
+        True if the only message is the current user question
+    """
+    return len(history) == 1 and history[0]["role"] == "user"
+
+
+def mistral_embedder(client, model: str = "mistral-embed") -> Callable[[str], Sequence[float]]:
+    """
+    Build an embedder backed by the Mistral embeddings API
+
+    Args:
+        client: Mistral client
+        model: Embedding model name
+
+    Returns:
+        Callable mapping a text to its embedding vector
+    """
+    def embed(text: str) -> Sequence[float]:
+        response = client.embeddings.create(model=model, inputs=[text])
+        return response.data[0].embedding
+
+    return embed
+
+
+class _Entry:
+    """Cached answer with its expiry time and index row"""
+
+    __slots__ = ("answer", "question", "expires_at", "row")
+
+    def __init__(self, answer: str, question: str, expires_at: float, row: int):
+        self.answer = answer
+        self.question = question
+        self.expires_at = expires_at
+        self.row = row
+
+
+class ResponseCache:
+    """Thread-safe cache of answers to context-free banking questions"""
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl_seconds: float = 3600,
+        embedder: Optional[Callable[[str], Sequence[float]]] = None,
+        similarity_threshold: float = 0.92
+    ):
+        """
+        Args:
+            max_entries: Maximum cached answers before LRU eviction
+            ttl_seconds: Time after which a cached answer expires
+            embedder: Optional callable(text) -> vector for similarity lookup
+            similarity_threshold: Minimum cosine similarity for a semantic hit
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.embedder = embedder
+        self.similarity_threshold = similarity_threshold
+
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Nearest-neighbour index: one unit-length row per cached entry
+        self._vectors: Optional["np.ndarray"] = None
+        self._row_keys: List[Optional[str]] = []
+        self._free_rows: List[int] = []
+
+        self.hits = {"exact": 0, "normalized": 0, "semantic": 0}
+        self.misses = 0
+
+    def _evict(self, normalized: str) -> None:
+        """Remove an entry and free its index row (lock held)"""
+        entry = self._entries.pop(normalized)
+        if entry.row >= 0:
+            self._row_keys[entry.row] = None
+            self._vectors[entry.row] = 0.0
+            self._free_rows.append(entry.row)
+
+    def _embed(self, text: str) -> "np.ndarray":
+        """Embed a text as a unit-length float32 vector"""
+        import numpy as np
+
+        vector = np.asarray(self.embedder(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _add_vector(self, vector: "np.ndarray", normalized: str) -> int:
+        """Store a vector in the index and return its row (lock held)"""
+        import numpy as np
+
+        if self._free_rows:
+            row = self._free_rows.pop()
+        else:
+            row = len(self._row_keys)
+            self._row_keys.append(None)
+            if self._vectors is None:
+                self._vectors = np.zeros((max(16, self.max_entries), vector.shape[0]), dtype=np.float32)
+            elif row >= self._vectors.shape[0]:
+                grown = np.zeros((self._vectors.shape[0] * 2, self._vectors.shape[1]), dtype=np.float32)
+                grown[:row] = self._vectors[:row]
+                self._vectors = grown
+        self._vectors[row] = vector
+        self._row_keys[row] = normalized
+        return row
+
+    def _nearest(self, vector: "np.ndarray") -> Optional[str]:
+        """Find the most similar cached question above the threshold (lock held)"""
+        if self._vectors is None or not self._entries:
+            return None
+        used = len(self._row_keys)
+        scores = self._vectors[:used] @ vector
+        row = int(scores.argmax())
+        if scores[row] < self.similarity_threshold:
+            return None
+        return self._row_keys[row]
+
+    def get(self, question: str) -> Optional[str]:
+        """
+        Look up a cached answer
+
+        Args:
+            question: The user's question
+
+        Returns:
+            Cached answer or None on a miss
+        """
+        normalized = normalize_text(question)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(normalized)
+            kind = "exact" if entry is not None and question.strip() == entry.question else "normalized"
+
+        if entry is None and self.embedder is not None:
+            vector = self._embed(normalized)
+            with self._lock:
+                match = self._nearest(vector)
+                if match is not None:
+                    normalized = match
+                    entry = self._entries.get(match)
+                    kind = "semantic"
+
+        with self._lock:
+            if entry is not None and entry.expires_at <= now:
+                if normalized in self._entries:
+                    self._evict(normalized)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if normalized in self._entries:
+                self._entries.move_to_end(normalized)
+            self.hits[kind] += 1
+            return entry.answer
+
+    def put(self, question: str, answer: str) -> None:
+        """
+        Cache the answer to a question
+
+        Args:
+            question: The user's question
+            answer: The bot's answer
+        """
+        normalized = normalize_text(question)
+        vector = self._embed(normalized) if self.embedder is not None else None
+
+        with self._lock:
+            if normalized in self._entries:
+                self._evict(normalized)
+
+            while len(self._entries) >= self.max_entries:
+                self._evict(next(iter(self._entries)))
+
+            row = self._add_vector(vector, normalized) if vector is not None else -1
+            self._entries[normalized] = _Entry(
+                answer, question.strip(), time.monotonic() + self.ttl_seconds, row
+            )
+
+    def clear(self) -> None:
+        """Drop all cached answers"""
+        with self._lock:
+            self._entries.clear()
+            self._vectors = None
+            self._row_keys = []
+            self._free_rows = []
+
+    def get_stats(self) -> Dict:
+        """Get cache statistics"""
+        hits = sum(self.hits.values())
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": hits,
+            "exact_hits": self.hits["exact"],
+            "normalized_hits": self.hits["normalized"],
+            "semantic_hits": self.hits["semantic"],
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0
+        }
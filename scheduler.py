@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Fair Scheduler for Model Calls
+Weighted fair queues per user in front of the model, a global concurrency limit and a
+queue-time SLO: requests that would wait too long are shed early, so callers can answer
+from a cache or with a short reply instead of timing out late
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from metrics import LATENCY_BUCKETS, Histogram
+
+# Short reply for a shed request that has no cached answer
+BUSY_ANSWER = (
+    "⏳ I'm handling a lot of questions right now and couldn't get to yours in time. "
+    "Please ask again in a few seconds."
+)
+
+
+class Overloaded(Exception):
+    """A request was shed because it would exceed the queue-time SLO"""
+
+    def __init__(self, message: str, reason: str, wait_seconds: float):
+        super().__init__(message)
+        self.reason = reason
+        self.wait_seconds = wait_seconds
+
+
+class _Flow:
+    """Queue state of one user"""
+
+    __slots__ = ("finish", "queued")
+
+    def __init__(self):
+        self.finish = 0.0
+        self.queued = 0
+
+
+class _Ticket:
+    """One queued request"""
+
+    __slots__ = ("user", "granted", "abandoned")
+
+    def __init__(self, user: str):
+        self.user = user
+        self.granted = False
+        self.abandoned = False
+
+
+class FairScheduler:
+    """
+    Self-clocked weighted fair queueing for model calls
+
+    Each request gets a virtual finish tag of max(virtual time, the user's last tag) +
+    1 / weight, and free slots go to the smallest tag. A user sending many requests
+    only queues behind their own earlier ones, and a user with weight 2 gets twice the
+    share of one with weight 1 while both are waiting. Requests run at once while a
+    slot is free and nobody is queued.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        max_queue_seconds: float = 5.0,
+        max_queued_per_user: int = 4,
+        service_seconds: float = 2.0
+    ):
+        """
+        Args:
+            max_concurrency: Model calls allowed in flight at once
+            max_queue_seconds: Queue-time SLO; longer (or predicted longer) waits are shed
+            max_queued_per_user: Requests one user may have waiting
+            service_seconds: Initial estimate of a model call's duration (then measured)
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue_seconds = max_queue_seconds
+        self.max_queued_per_user = max_queued_per_user
+        self.service_seconds = service_seconds
+        self._cond = threading.Condition()
+        self._queue: List = []
+        self._flows: Dict[str, _Flow] = {}
+        self._sequence = itertools.count()
+        self._virtual = 0.0
+        self._active = 0
+        self._waiting = 0
+        self.wait_seconds = Histogram("queue_wait_seconds", "Time spent queued for a model call", LATENCY_BUCKETS)
+        self.stats = {"admitted": 0, "queued": 0, "rejected_early": 0, "timed_out": 0, "user_limited": 0}
+
+    def predicted_wait(self, ahead: int) -> float:
+        """Expected queue time with `ahead` requests to be served first"""
+        return (ahead + 1) * self.service_seconds / self.max_concurrency
+
+    def acquire(self, user: str, weight: float = 1.0) -> float:
+        """
+        Wait for a model call slot
+
+        Args:
+            user: User or session the request belongs to
+            weight: Share of the capacity relative to other users (default 1)
+
+        Returns:
+            Seconds spent queued
+
+        Raises:
+            ValueError: weight is not positive
+            Overloaded: The user already has max_queued_per_user requests waiting, the
+                predicted wait exceeds the SLO (raised at once), or the SLO expired
+        """
+        if not weight > 0:
+            # 1 / weight would fail for zero and put a negative weight ahead of everyone
+            raise ValueError(f"weight must be positive, got {weight}")
+        started = time.monotonic()
+        with self._cond:
+            if self._active < self.max_concurrency and not self._waiting:
+                self._active += 1
+                self.stats["admitted"] += 1
+                self.wait_seconds.observe(0.0)
+                return 0.0
+
+            flow = self._flows.get(user)
+            if flow is None:
+                flow = self._flows[user] = _Flow()
+            if flow.queued >= self.max_queued_per_user:
+                self.stats["user_limited"] += 1
+                raise Overloaded("Too many requests waiting for this user", "user_limited", 0.0)
+
+            finish = max(self._virtual, flow.finish) + 1.0 / weight
+            ahead = sum(1 for tag, _, ticket in self._queue if tag <= finish and not ticket.abandoned)
+            predicted = self.predicted_wait(ahead)
+            if predicted > self.max_queue_seconds:
+                # Fail now rather than after waiting out the SLO
+                self.stats["rejected_early"] += 1
+                raise Overloaded(f"Predicted queue time {predicted:.1f}s exceeds the SLO", "rejected_early", 0.0)
+
+            flow.finish = finish
+            flow.queued += 1
+            self._waiting += 1
+            ticket = _Ticket(user)
+            heapq.heappush(self._queue, (finish, next(self._sequence), ticket))
+            self.stats["queued"] += 1
+
+            deadline = started + self.max_queue_seconds
+            while not ticket.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    ticket.abandoned = True
+                    flow.queued -= 1
+                    self._waiting -= 1
+                    self.stats["timed_out"] += 1
+                    waited = time.monotonic() - started
+                    raise Overloaded(f"Queued for {waited:.1f}s without a free slot", "timed_out", waited)
+                self._cond.wait(remaining)
+
+            waited = time.monotonic() - started
+            self.stats["admitted"] += 1
+            self.wait_seconds.observe(waited)
+            return waited
+
+    def release(self, service_seconds: Optional[float] = None) -> None:
+        """
+        Free a slot and hand it to the next request in fair order
+
+        Args:
+            service_seconds: How long the call held the slot (refines the wait prediction)
+        """
+        with self._cond:
+            self._active -= 1
+            if service_seconds is not None:
+                self.service_seconds = 0.8 * self.service_seconds + 0.2 * service_seconds
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Grant free slots to the smallest finish tags (lock held)"""
+        granted = False
+        while self._queue and self._active < self.max_concurrency:
+            finish, _, ticket = heapq.heappop(self._queue)
+            if ticket.abandoned:
+                continue
+            ticket.granted = True
+            granted = True
+            self._active += 1
+            self._waiting -= 1
+            self._virtual = finish
+            flow = self._flows[ticket.user]
+            flow.queued -= 1
+
+        # Users with nothing queued and a finish tag in the past start over from the
+        # virtual time anyway, so their state can go
+        for user in [u for u, f in self._flows.items() if not f.queued and f.finish <= self._virtual]:
+            del self._flows[user]
+        if granted:
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, user: str, weight: float = 1.0) -> Iterator[float]:
+        """
+        Hold a model call slot for the duration of a with block (e.g. a whole stream)
+
+        Args:
+            user: User or session the request belongs to
+            weight: Share of the capacity relative to other users
+
+        Yields:
+            Seconds spent queued
+
+        Raises:
+            ValueError: weight is not positive
+            Overloaded: The request was shed (see acquire)
+        """
+        waited = self.acquire(user, weight)
+        started = time.monotonic()
+        try:
+            yield waited
+        finally:
+            self.release(time.monotonic() - started)
+
+    def get_stats(self) -> Dict:
+        """Get queue depth, slot usage, shed requests and queue time percentiles"""
+        with self._cond:
+            return {
+                **self.stats,
+                "active": self._active,
+                "queue_depth": self._waiting,
+                "queued_users": sum(1 for flow in self._flows.values() if flow.queued),
+                "service_seconds": self.service_seconds,
+                "wait_seconds": self.wait_seconds.summary()
+            }
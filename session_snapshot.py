@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Compact Binary Session Snapshots
+A versioned format for saving and resuming a BankingBot session: interned roles, integer
+epoch timestamps and length-prefixed UTF-8 content behind a fixed-size record index, so a
+memory-mapped snapshot gives random access to any turn without decoding the others
+
+Layout (little-endian):
+    header   magic "BBSS", u16 version, u32 message count, u32 turns, u32 cache hits,
+             u32 summarized messages
+    meta     u32 length + UTF-8 session id, u32 length + UTF-8 context summary
+    roles    u8 count, then u8 length + UTF-8 per role
+    index    per message: u8 role id, u8 flags, i64 epoch microseconds, u64 content offset
+    content  per message: u32 length + UTF-8 text
+"""
+
+import mmap
+import os
+import struct
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+MAGIC = b"BBSS"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHIIII")
+_LENGTH = struct.Struct("<I")
+_RECORD = struct.Struct("<BBqQ")
+
+# Record flags
+FLAG_API = 1        # The message is part of the model's context (not a routed small-talk turn)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def to_epoch_us(timestamp: str) -> int:
+    """ISO timestamp (naive ones are local time) to integer epoch microseconds"""
+    return (datetime.fromisoformat(timestamp).astimezone(timezone.utc) - _EPOCH) // _MICROSECOND
+
+
+def from_epoch_us(value: int) -> str:
+    """Integer epoch microseconds to a naive local ISO timestamp, like datetime.now().isoformat()"""
+    return (_EPOCH + timedelta(microseconds=value)).astimezone().replace(tzinfo=None).isoformat()
+
+
+def write_snapshot(
+    path: str,
+    messages: Iterable[Tuple[str, str, str, bool]],
+    session_id: str = "",
+    summary: str = "",
+    summarized: int = 0,
+    turns: int = 0,
+    cache_hits: int = 0
+) -> int:
+    """
+    Write a session snapshot atomically
+
+    Args:
+        path: Output file
+        messages: (role, content, ISO timestamp, in model context) tuples, oldest first
+        session_id: Session identifier
+        summary: Rolling summary of the summarized messages
+        summarized: Model-context messages folded into the summary
+        turns: Answered turns
+        cache_hits: Turns answered from the response cache
+
+    Returns:
+        Size of the snapshot in bytes
+    """
+    roles: Dict[str, int] = {}
+    records: List[Tuple[int, int, int, bytes]] = []
+    for role, content, timestamp, in_api in messages:
+        role_id = roles.setdefault(role, len(roles))
+        records.append((role_id, FLAG_API if in_api else 0, to_epoch_us(timestamp), content.encode("utf-8")))
+    if len(roles) > 255:
+        raise ValueError("A snapshot holds at most 255 distinct roles")
+
+    head = bytearray(_HEADER.pack(MAGIC, VERSION, len(records), turns, cache_hits, summarized))
+    for text in (session_id, summary):
+        encoded = text.encode("utf-8")
+        head += _LENGTH.pack(len(encoded)) + encoded
+    head.append(len(roles))
+    for role in roles:
+        encoded = role.encode("utf-8")
+        head += bytes([len(encoded)]) + encoded
+
+    offset = len(head) + len(records) * _RECORD.size
+    index = bytearray()
+    for role_id, flags, epoch_us, content in records:
+        index += _RECORD.pack(role_id, flags, epoch_us, offset)
+        offset += _LENGTH.size + len(content)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(head)
+        f.write(index)
+        for record in records:
+            f.write(_LENGTH.pack(len(record[3])))
+            f.write(record[3])
+    os.replace(tmp_path, path)
+    return offset
+
+
+class SessionSnapshot:
+    """Memory-mapped, read-only view of a snapshot; messages are decoded on access"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Snapshot file written by write_snapshot()
+
+        Raises:
+            ValueError: The file is not a snapshot or has an unsupported version
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError(f"{path} is not a session snapshot")
+        try:
+            self._parse()
+        except (struct.error, UnicodeDecodeError):
+            self.close()
+            raise ValueError(f"{path} is not a session snapshot")
+        except ValueError:
+            self.close()
+            raise
+
+    def _parse(self) -> None:
+        magic, version, count, turns, cache_hits, summarized = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a session snapshot")
+        if version != VERSION:
+            raise ValueError(f"Unsupported snapshot version {version} (expected {VERSION})")
+        self.count = count
+        self.turns = turns
+        self.cache_hits = cache_hits
+        self.summarized = summarized
+
+        position = _HEADER.size
+        fields = []
+        for _ in range(2):
+            (length,) = _LENGTH.unpack_from(self._map, position)
+            position += _LENGTH.size
+            fields.append(self._map[position:position + length].decode("utf-8"))
+            position += length
+        self.session_id, self.summary = fields
+
+        self.roles: List[str] = []
+        role_count = self._map[position]
+        position += 1
+        for _ in range(role_count):
+            length = self._map[position]
+            self.roles.append(sys.intern(self._map[position + 1:position + 1 + length].decode("utf-8")))
+            position += 1 + length
+        self._index = position
+        if position + count * _RECORD.size > len(self._map):
+            raise ValueError(f"{self.path} is truncated")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _record(self, i: int) -> Tuple[int, int, int, int]:
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return _RECORD.unpack_from(self._map, self._index + i * _RECORD.size)
+
+    def message(self, i: int) -> Tuple[str, str, str, bool]:
+        """
+        Decode one message
+
+        Args:
+            i: Message position, oldest first
+
+        Returns:
+            (role, content, ISO timestamp, in model context)
+        """
+        role_id, flags, epoch_us, offset = self._record(i)
+        (length,) = _LENGTH.unpack_from(self._map, offset)
+        start = offset + _LENGTH.size
+        content = self._map[start:start + length].decode("utf-8")
+        return self.roles[role_id], content, from_epoch_us(epoch_us), bool(flags & FLAG_API)
+
+    def messages(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[str, str, str, bool]]:
+        """Decode messages[start:stop] one at a time"""
+        for i in range(start, self.count if stop is None else stop):
+            yield self.message(i)
+
+    def records(self, stop: Optional[int] = None) -> Iterator[Tuple[str, bool]]:
+        """(role, in model context) of each message, read from the index without decoding content"""
+        stop = self.count if stop is None else stop
+        end = self._index + stop * _RECORD.size
+        for role_id, flags, _, _ in _RECORD.iter_unpack(self._map[self._index:end]):
+            yield self.roles[role_id], bool(flags & FLAG_API)
+
+    def close(self) -> None:
+        """Unmap the file"""
+        self._map.close()
+
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Persistent Session Store for chat history
+Pluggable storage keyed by session id, with SQLite and Redis backends and paged history loading
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+class SessionStore(ABC):
+    """Interface for persistent chat history keyed by session id"""
+
+    @abstractmethod
+    def append(self, session_id: str, role: str, content: str, timestamp: Optional[str] = None) -> Dict:
+        """
+        Persist one message
+
+        Args:
+            session_id: Identifier of the conversation
+            role: "user" or "assistant"
+            content: Message text
+            timestamp: ISO timestamp (defaults to now)
+
+        Returns:
+            The stored message, including its id
+        """
+
+    @abstractmethod
+    def load_page(self, session_id: str, limit: int = 20, before_id: Optional[int] = None) -> List[Dict]:
+        """
+        Load a page of messages, oldest first
+
+        Args:
+            session_id: Identifier of the conversation
+            limit: Maximum number of messages to return
+            before_id: Only return messages older than this id (None = most recent page)
+
+        Returns:
+            Messages with id, role, content and timestamp
+        """
+
+    @abstractmethod
+    def count_by_role(self, session_id: str) -> Dict[str, int]:
+        """Count stored messages per role for a session"""
+
+    @abstractmethod
+    def delete_session(self, session_id: str) -> None:
+        """Delete all messages of a session"""
+
+    def close(self) -> None:
+        """Release any resources held by the store"""
+
+
+class SQLiteSessionStore(SessionStore):
+    """Session store backed by a single SQLite database file"""
+
+    def __init__(self, path: str = "sessions.db"):
+        """
+        Args:
+            path: SQLite database file (":memory:" for a throwaway store)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                timestamp TEXT NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id)"
+        )
+        self._conn.commit()
+
+    def append(self, session_id: str, role: str, content: str, timestamp: Optional[str] = None) -> Dict:
+        timestamp = timestamp or datetime.now().isoformat()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO messages (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+                (session_id, role, content, timestamp)
+            )
+            self._conn.commit()
+        return {"id": cursor.lastrowid, "role": role, "content": content, "timestamp": timestamp}
+
+    def load_page(self, session_id: str, limit: int = 20, before_id: Optional[int] = None) -> List[Dict]:
+        query = "SELECT id, role, content, timestamp FROM messages WHERE session_id = ?"
+        params = [session_id]
+        if before_id is not None:
+            query += " AND id < ?"
+            params.append(before_id)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        return [
+            {"id": row[0], "role": row[1], "content": row[2], "timestamp": row[3]}
+            for row in reversed(rows)
+        ]
+
+    def count_by_role(self, session_id: str) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, COUNT(*) FROM messages WHERE session_id = ? GROUP BY role",
+                (session_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def delete_session(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class RedisSessionStore(SessionStore):
+    """Session store in Redis, shared by workers on any number of hosts"""
+
+    def __init__(
+        self,
+        url: str = "redis://localhost:6379/0",
+        prefix: str = "banking:",
+        ttl_seconds: int = 0,
+        client=None
+    ):
+        """
+        Args:
+            url: Redis URL
+            prefix: Key prefix for all session data
+            ttl_seconds: Expire a session this long after its last message (0 = keep)
+            client: Redis client returning str values (one is created from url if omitted)
+
+        Raises:
+            ImportError: The optional redis package is not installed
+        """
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise ImportError(
+                    "The Redis session store needs the redis package: pip install redis"
+                ) from e
+            client = redis.Redis.from_url(url, decode_responses=True)
+
+        self._redis = client
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+
+    def _keys(self, session_id: str):
+        """Sorted set of messages (scored by id) and hash of per-role counts"""
+        return f"{self.prefix}session:{session_id}:messages", f"{self.prefix}session:{session_id}:roles"
+
+    def append(self, session_id: str, role: str, content: str, timestamp: Optional[str] = None) -> Dict:
+        timestamp = timestamp or datetime.now().isoformat()
+        messages_key, roles_key = self._keys(session_id)
+        # Ids come from one counter so they increase across sessions, like SQLite rowids
+        message = {
+            "id": self._redis.incr(f"{self.prefix}message_id"),
+            "role": role,
+            "content": content,
+            "timestamp": timestamp
+        }
+        pipe = self._redis.pipeline()
+        pipe.zadd(messages_key, {json.dumps(message, ensure_ascii=False): message["id"]})
+        pipe.hincrby(roles_key, role, 1)
+        if self.ttl_seconds:
+            pipe.expire(messages_key, self.ttl_seconds)
+            pipe.expire(roles_key, self.ttl_seconds)
+        pipe.execute()
+        return message
+
+    def load_page(self, session_id: str, limit: int = 20, before_id: Optional[int] = None) -> List[Dict]:
+        messages_key, _ = self._keys(session_id)
+        newest = "+inf" if before_id is None else f"({before_id}"
+        rows = self._redis.zrevrangebyscore(messages_key, newest, "-inf", start=0, num=limit)
+        return [json.loads(row) for row in reversed(rows)]
+
+    def count_by_role(self, session_id: str) -> Dict[str, int]:
+        _, roles_key = self._keys(session_id)
+        return {role: int(count) for role, count in self._redis.hgetall(roles_key).items()}
+
+    def delete_session(self, session_id: str) -> None:
+        self._redis.delete(*self._keys(session_id))
+
+    def close(self) -> None:
+        self._redis.close()
+
+
+def create_session_store(url: Optional[str] = None) -> SessionStore:
+    """
+    Create a session store from a URL
+
+    Args:
+        url: Store location, e.g. "sqlite:///sessions.db" or "redis://localhost:6379/0"
+            (defaults to the SESSION_STORE_URL environment variable)
+
+    Returns:
+        A SessionStore instance
+    """
+    url = url or os.getenv("SESSION_STORE_URL", "sqlite:///sessions.db")
+    scheme, _, location = url.partition("://")
+
+    if scheme == "sqlite":
+        # sqlite:///relative.db -> "relative.db", sqlite:////abs/path.db -> "/abs/path.db"
+        return SQLiteSessionStore(location[1:] if location.startswith("/") else location)
+
+    if scheme in ("redis", "rediss"):
+        return RedisSessionStore(url, ttl_seconds=int(os.getenv("SESSION_TTL_SECONDS", "0")))
+
+    raise ValueError(f"Unsupported session store: {url}")
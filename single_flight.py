@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Single-flight Coalescing of Identical Model Requests
+Concurrent requests with the same payload share one upstream call: the first caller makes
+it and every other caller receives its result, or replays and follows its stream
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+
+def payload_key(kwargs: Dict) -> str:
+    """
+    Hash of a normalized request payload
+
+    The model, messages (system prompt included), temperature, max_tokens and any other
+    parameters are serialized canonically: sorted keys, compact separators and message
+    text without leading or trailing whitespace.
+
+    Args:
+        kwargs: Keyword arguments of a chat.complete/stream call
+
+    Returns:
+        Hex digest identifying the request
+    """
+    normalized = dict(kwargs)
+    messages = normalized.get("messages")
+    if messages is not None:
+        normalized["messages"] = [
+            {**message, "content": message["content"].strip()}
+            if isinstance(message.get("content"), str) else message
+            for message in messages
+        ]
+    encoded = json.dumps(normalized, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class _SharedStream:
+    """Events of one upstream stream, buffered for every caller following it"""
+
+    __slots__ = ("upstream", "events", "done", "error", "readers", "lock")
+
+    def __init__(self, upstream, lock):
+        self.upstream = upstream
+        self.events: List = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.readers = 0
+        self.lock = lock
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key
+
+    Only calls in flight at the same time are shared; once the upstream call finishes
+    the next caller starts a new one, so nothing is cached. Streams are pulled by
+    whichever caller needs the next event first, so every caller proceeds at its own
+    pace and the stream outlives a caller that stops reading early. It is closed when
+    the last caller stops; a caller counts as a reader from its first read, so an
+    iterator that is never read does not keep the stream open.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self._streams: Dict[str, _SharedStream] = {}
+        self._async_calls: Dict[tuple, asyncio.Task] = {}
+        self._async_streams: Dict[tuple, _SharedStream] = {}
+        self.stats = {"upstream": 0, "coalesced": 0}
+
+    def _count(self, leader: bool) -> None:
+        self.stats["upstream" if leader else "coalesced"] += 1
+
+    def in_flight(self) -> int:
+        """Number of upstream calls currently shared"""
+        with self._lock:
+            return len(self._calls) + len(self._streams) + len(self._async_calls) + len(self._async_streams)
+
+    def complete(self, key: str, call: Callable):
+        """
+        Run call() once for all concurrent callers with the same key
+
+        Args:
+            key: Payload key (see payload_key)
+            call: Makes the upstream request
+
+        Returns:
+            The shared result; an upstream error is raised to every caller
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+            self._count(leader)
+
+        if not leader:
+            return future.result()
+        try:
+            result = call()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stream(self, key: str, open_stream: Callable[[], Iterator]) -> Iterator:
+        """
+        Share one upstream stream between concurrent callers with the same key
+
+        Args:
+            key: Payload key (see payload_key)
+            open_stream: Returns the upstream event iterator
+
+        Returns:
+            Iterator over every event of the stream, from the first one
+        """
+        with self._lock:
+            shared = self._streams.get(key)
+            leader = shared is None
+            if leader:
+                shared = _SharedStream(open_stream(), threading.Lock())
+                self._streams[key] = shared
+            self._count(leader)
+        return self._follow(key, shared)
+
+    def _follow(self, key: str, shared: _SharedStream) -> Iterator:
+        """Replay the buffered events, pulling new ones from upstream as needed"""
+        # Counted here, on the first read, so the finally below always undoes it
+        self._join(shared)
+        i = 0
+        try:
+            while True:
+                if i < len(shared.events):
+                    yield shared.events[i]
+                    i += 1
+                    continue
+                with shared.lock:
+                    if i < len(shared.events):
+                        continue
+                    if shared.error is not None:
+                        raise shared.error
+                    if shared.done:
+                        return
+                    try:
+                        shared.events.append(next(shared.upstream))
+                    except StopIteration:
+                        self._finish(self._streams, key, shared)
+                        return
+                    except BaseException as e:
+                        shared.error = e
+                        self._finish(self._streams, key, shared)
+                        raise
+        finally:
+            if self._leave(self._streams, key, shared):
+                shared.upstream.close()
+
+    def _finish(self, streams: Dict, key, shared: _SharedStream) -> None:
+        """Mark a stream complete; later callers start a new upstream call"""
+        shared.done = True
+        with self._lock:
+            if streams.get(key) is shared:
+                del streams[key]
+
+    def _join(self, shared: _SharedStream) -> None:
+        """Count a caller that started reading"""
+        with self._lock:
+            shared.readers += 1
+
+    def _leave(self, streams: Dict, key, shared: _SharedStream) -> bool:
+        """Drop a reader; True if it was the last one of an unfinished stream"""
+        with self._lock:
+            shared.readers -= 1
+            if shared.readers or shared.done:
+                return False
+            shared.done = True
+            # A caller that starts reading after this gets an error, not a cut-off stream
+            shared.error = RuntimeError("The shared stream was closed by every other caller")
+            if streams.get(key) is shared:
+                del streams[key]
+            return True
+
+    async def complete_async(self, key: str, call: Callable):
+        """
+        Async variant of complete(): call() returns a coroutine
+
+        The upstream request runs as a task of its own, so a caller that is cancelled
+        does not cancel it for the others.
+        """
+        loop_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            task = self._async_calls.get(loop_key)
+            leader = task is None
+            if leader:
+                task = asyncio.ensure_future(call())
+                self._async_calls[loop_key] = task
+                task.add_done_callback(lambda done: self._call_done(loop_key, done))
+            self._count(leader)
+        return await asyncio.shield(task)
+
+    def _call_done(self, loop_key: tuple, task: asyncio.Task) -> None:
+        with self._lock:
+            if self._async_calls.get(loop_key) is task:
+                del self._async_calls[loop_key]
+        if not task.cancelled():
+            # Retrieve the error so it is not reported as unhandled when every caller left
+            task.exception()
+
+    def stream_async(self, key: str, open_stream: Callable[[], AsyncIterator]) -> AsyncIterator:
+        """Async variant of stream(): open_stream() returns an async iterator"""
+        loop_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            shared = self._async_streams.get(loop_key)
+            leader = shared is None
+            if leader:
+                shared = _SharedStream(open_stream(), asyncio.Lock())
+                self._async_streams[loop_key] = shared
+            self._count(leader)
+        return self._follow_async(loop_key, shared)
+
+    async def _follow_async(self, loop_key: tuple, shared: _SharedStream) -> AsyncIterator:
+        """Async variant of _follow()"""
+        self._join(shared)
+        i = 0
+        try:
+            while True:
+                if i < len(shared.events):
+                    yield shared.events[i]
+                    i += 1
+                    continue
+                async with shared.lock:
+                    if i < len(shared.events):
+                        continue
+                    if shared.error is not None:
+                        raise shared.error
+                    if shared.done:
+                        return
+                    try:
+                        shared.events.append(await shared.upstream.__anext__())
+                    except StopAsyncIteration:
+                        self._finish(self._async_streams, loop_key, shared)
+                        return
+                    except BaseException as e:
+                        shared.error = e
+                        self._finish(self._async_streams, loop_key, shared)
+                        raise
+        finally:
+            if self._leave(self._async_streams, loop_key, shared):
+                await shared.upstream.aclose()
+
+    def get_stats(self) -> Dict:
+        """Get upstream and coalesced call counts"""
+        with self._lock:
+            stats = dict(self.stats)
+        total = stats["upstream"] + stats["coalesced"]
+        stats["coalesced_rate"] = stats["coalesced"] / total if total else 0.0
+        return stats
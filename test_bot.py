@@ -1,10 +1,192 @@
 #!/usr/bin/env python3
 """Test script for the banking bot"""
 
+import os
 import sys
-sys.path.insert(0, 'd:\\LISRC\\AI\\Banking')
+import json
+import time
+import asyncio
+import subprocess
+import tempfile
+from types import SimpleNamespace
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from banking_bot import chat_with_bot, create_chat_conversation
+import banking_bot
+import advanced_banking_bot
+from banking_bot import chat_with_bot, create_chat_conversation, stream_chat_with_bot
+from context_window import ContextWindow, estimate_tokens
+from async_banking_bot import SessionEngine
+from response_cache import ResponseCache
+from conversation_journal import ConversationJournal, list_segments, read_journal
+from session_store import create_session_store
+from resilient_client import CircuitBreaker, CircuitOpenError, ResilientClient, TokenBucket
+from benchmark import MockMistral, install_mock, make_cli_driver, run_benchmark
+from metrics import TurnMetrics
+from batch_answer import run_batch
+from intent_router import IntentRouter
+from bot_core import (
+    BANKING_SYSTEM_PROMPT, TRUNCATED_MARKER, ModelPolicy, ModelTier, compact_messages, complete_chat,
+    complete_chat_async, default_policy, ground_messages, stream_chat, stream_chat_async
+)
+from knowledge_index import KnowledgeIndex, build_index
+from chat_api import ChatAPI, ChatService, StoreJournal
+from session_store import RedisSessionStore, SessionStore, SQLiteSessionStore
+from analytics import analyze, load_summary, write_summary
+from prefetch import Prefetcher
+from single_flight import SingleFlight, payload_key
+from scheduler import FairScheduler, Overloaded
+from session_snapshot import SessionSnapshot
+from pii_redaction import PIIRedactor, RedactionPipeline, luhn_valid
+from financial_tools import affordability_grid, amortization_schedule, apr_to_apy, apy_to_apr, loan_payment, run_tool
+
+
+class FakeStreamingClient:
+    """Local stand-in for the Mistral client that streams canned chunks"""
+    
+    def __init__(self, chunks, fail_after=None):
+        self.chunks = chunks
+        self.fail_after = fail_after
+        self.chat = SimpleNamespace(stream=self.stream)
+    
+    def stream(self, **kwargs):
+        for i, chunk in enumerate(self.chunks):
+            if i == self.fail_after:
+                raise RuntimeError("connection reset")
+            delta = SimpleNamespace(content=chunk)
+            yield SimpleNamespace(data=SimpleNamespace(choices=[SimpleNamespace(delta=delta)]))
+
+
+class FakeToolClient:
+    """Local stand-in for the Mistral client that asks for one calculator call, then answers"""
+    
+    def __init__(self, name, arguments):
+        self.call = SimpleNamespace(id="call-1", index=0, function=SimpleNamespace(name=name, arguments=arguments))
+        self.requests = []
+        self.chat = SimpleNamespace(complete=self.complete, stream=self.stream)
+    
+    def _asks_tool(self, messages, kwargs):
+        self.requests.append((messages, kwargs))
+        return messages[-1]["role"] != "tool"
+    
+    def complete(self, messages, **kwargs):
+        if self._asks_tool(messages, kwargs):
+            message = SimpleNamespace(content="", tool_calls=[self.call])
+        else:
+            message = SimpleNamespace(content="Your payment is $1,199.10 a month.", tool_calls=None)
+        usage = SimpleNamespace(prompt_tokens=100 * len(self.requests), completion_tokens=10)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+    
+    def stream(self, messages, **kwargs):
+        if self._asks_tool(messages, kwargs):
+            # Arguments split over two chunks, as streamed tool calls may be
+            half = len(self.call.function.arguments) // 2
+            for part in (self.call.function.arguments[:half], self.call.function.arguments[half:]):
+                call = SimpleNamespace(id=self.call.id, index=0,
+                                       function=SimpleNamespace(name=self.call.function.name, arguments=part))
+                delta = SimpleNamespace(content=None, tool_calls=[call])
+                yield SimpleNamespace(data=SimpleNamespace(choices=[SimpleNamespace(delta=delta)]))
+            return
+        for chunk in ["Your payment ", "is $1,199.10."]:
+            delta = SimpleNamespace(content=chunk, tool_calls=None)
+            yield SimpleNamespace(data=SimpleNamespace(choices=[SimpleNamespace(delta=delta)]))
+
+
+class FakeAsyncClient:
+    """Local stand-in for the Mistral client with a slow async completion"""
+    
+    def __init__(self, latency=0.001):
+        self.latency = latency
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.chat = SimpleNamespace(complete_async=self.complete_async)
+    
+    async def complete_async(self, messages, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.latency)
+        self.in_flight -= 1
+        message = SimpleNamespace(content=f"echo: {messages[-1]['content']}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class FakeRedis:
+    """In-memory stand-in for the redis client commands used by RedisSessionStore"""
+    
+    def __init__(self):
+        self.data = {}
+        self.expiring = set()
+    
+    def incr(self, key):
+        self.data[key] = self.data.get(key, 0) + 1
+        return self.data[key]
+    
+    def pipeline(self):
+        commands = []
+        pipe = SimpleNamespace(execute=lambda: [command() for command in commands])
+        for name in ("zadd", "hincrby", "expire"):
+            method = getattr(self, name)
+            setattr(pipe, name, lambda *args, method=method: commands.append(lambda: method(*args)))
+        return pipe
+    
+    def zadd(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+    
+    def hincrby(self, key, field, amount):
+        counts = self.data.setdefault(key, {})
+        counts[field] = counts.get(field, 0) + amount
+    
+    def expire(self, key, seconds):
+        self.expiring.add(key)
+    
+    def zrevrangebyscore(self, key, max_score, min_score, start=0, num=None):
+        if max_score == "+inf":
+            keep = lambda score: True
+        else:
+            keep = lambda score: score < int(max_score.lstrip("("))
+        rows = sorted((score, member) for member, score in self.data.get(key, {}).items() if keep(score))
+        rows = [member for _, member in reversed(rows)][start:]
+        return rows if num is None else rows[:num]
+    
+    def hgetall(self, key):
+        return {field: str(count) for field, count in self.data.get(key, {}).items()}
+    
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+    
+    def close(self):
+        pass
+
+
+class APIError(Exception):
+    """Error carrying an HTTP status code, like the Mistral SDK's errors"""
+    
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class FaultInjectingClient:
+    """Local stand-in for the Mistral API that fails with scripted status codes"""
+    
+    def __init__(self, faults):
+        self.faults = list(faults)
+        self.calls = 0
+        self.chat = SimpleNamespace(complete=self.complete, stream=self.stream)
+    
+    def stream(self, timeout_ms=None, **kwargs):
+        self.complete(timeout_ms, **kwargs)
+        yield from ["o", "k"]
+    
+    def complete(self, timeout_ms=None, **kwargs):
+        self.calls += 1
+        assert timeout_ms > 0
+        if self.faults:
+            status = self.faults.pop(0)
+            if status:
+                raise APIError(status)
+        message = SimpleNamespace(content="ok")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
 
 def test_banking_bot():
     """Test the banking bot with sample queries"""
@@ -34,5 +216,1380 @@ def test_banking_bot():
         
         print("=" * 60 + "\n")
 
+
+def test_streaming_bot():
+    """Test that streamed chunks arrive incrementally and land in history"""
+    
+    print("🧪 Testing streaming with a fake client...\n")
+    
+    chunks = ["Savings ", "accounts ", "earn ", "interest."]
+    real_client = banking_bot.client
+    banking_bot.client = FakeStreamingClient(chunks)
+    try:
+        conversation_history = create_chat_conversation()
+        received = list(stream_chat_with_bot("What is a savings account?", conversation_history))
+    finally:
+        banking_bot.client = real_client
+    
+    assert received == chunks
+    assert conversation_history[-1] == {"role": "assistant", "content": "".join(chunks)}
+    
+    # An answer cut off mid-stream is never sent back to the model or cached
+    real_client = banking_bot.client
+    banking_bot.client = FakeStreamingClient(chunks, fail_after=2)
+    try:
+        conversation_history = create_chat_conversation()
+        received = list(stream_chat_with_bot("What is a money market account?", conversation_history))
+    finally:
+        banking_bot.client = real_client
+    assert received == chunks[:2] and conversation_history[-1]["role"] == "user"
+    assert banking_bot.response_cache.get("What is a money market account?") is None
+    
+    real_client = advanced_banking_bot.client
+    advanced_banking_bot.client = FakeStreamingClient(chunks, fail_after=2)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            bot = advanced_banking_bot.BankingBot(log_file=os.path.join(tmp, "log.jsonl"), cache=ResponseCache())
+            assert list(bot.stream_response("What is a money market account?")) == chunks[:2]
+            bot.close()
+            assert bot.conversation_history[-1].content == "".join(chunks[:2]) + TRUNCATED_MARKER
+            assert [m["role"] for m in bot.api_history] == ["user"] and bot.message_count == 0
+            assert bot.response_cache.get("What is a money market account?") is None
+            assert list(read_journal(bot.log_file))[-1]["content"].endswith(TRUNCATED_MARKER)
+    finally:
+        advanced_banking_bot.client = real_client
+    print("✅ Streaming test passed\n")
+
+
+def test_context_window():
+    """Test that long histories stay within budget and summarize incrementally"""
+    
+    print("🧪 Testing bounded context window...\n")
+    
+    calls = []
+    
+    def summarizer(previous_summary, evicted, max_tokens):
+        calls.append(len(evicted))
+        return previous_summary + f"[{len(evicted)} messages]"
+    
+    window = ContextWindow(token_budget=200, summary_tokens=50, summarizer=summarizer)
+    history = []
+    for i in range(20):
+        history.append({"role": "user", "content": f"Question {i} " + "x" * 200})
+        messages = window.build(history)
+        history.append({"role": "assistant", "content": f"Answer {i} " + "y" * 200})
+        
+        sent_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+        assert sent_tokens <= 200 + estimate_tokens(window.summary) or len(messages) <= 3
+        assert messages[-1]["content"] == history[-2]["content"]
+    
+    assert messages[0]["role"] == "system"
+    assert window.summarized_upto > 0
+    # Each slide only summarizes the newly evicted messages
+    assert sum(calls) == window.summarized_upto
+    
+    # Building again without new messages does not resummarize
+    window.build(history)
+    assert sum(calls) == window.summarized_upto
+
+    # The incremental request list matches build() without copying history
+    incremental = ContextWindow(token_budget=200, summary_tokens=50)
+    reference = ContextWindow(token_budget=200, summary_tokens=50)
+    history = []
+    request = None
+    for i in range(20):
+        history.append({"role": "user", "content": f"Question {i} " + "x" * 200})
+        messages = incremental.request_messages("system prompt", history)
+        assert request is None or messages is request
+        request = messages
+        assert messages == [{"role": "system", "content": "system prompt"}] + reference.build(history)
+        assert messages[-1] is history[-1]
+        history.append({"role": "assistant", "content": f"Answer {i} " + "y" * 200})
+    
+    # Conversations run side by side never share a window or its summary
+    requests = []
+    
+    def complete(messages, **kwargs):
+        requests.append(list(messages))
+        message = SimpleNamespace(content="Answer " + "y" * 200, tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+    
+    real_client = banking_bot.client
+    banking_bot.client = SimpleNamespace(chat=SimpleNamespace(complete=complete))
+    try:
+        alice = create_chat_conversation(ContextWindow(token_budget=200, summary_tokens=50))
+        bob = create_chat_conversation(ContextWindow(token_budget=200, summary_tokens=50))
+        assert alice.context_window is not bob.context_window
+        for i in range(6):
+            chat_with_bot(f"Alice question {i} " + "x" * 200, alice)
+        chat_with_bot("Bob question " + "x" * 200, bob)
+    finally:
+        banking_bot.client = real_client
+    assert alice.context_window.summary and not bob.context_window.summary
+    assert [m["role"] for m in requests[-1]] == ["system", "user"]
+    assert requests[-1][-1]["content"].startswith("Bob question")
+    
+    # One window given two histories in turn rebuilds the request for each of them
+    shared = ContextWindow()
+    alice, bob = [], []
+    for turn in range(2):
+        for name, history in (("Alice", alice), ("Bob", bob)):
+            history.append({"role": "user", "content": f"{name} question {turn}"})
+            request = shared.request_messages("system prompt", history)
+            assert request[1:] == history
+            history.append({"role": "assistant", "content": f"{name} answer {turn}"})
+    
+    # A message replaced in place (same length) is noticed too
+    alice[-1] = {"role": "assistant", "content": "Rewritten answer"}
+    assert shared.request_messages("system prompt", alice)[1:] == alice
+    
+    # A shed question leaves the history (as in the web app); the next request carries
+    # the new question, not the shed one
+    window = ContextWindow()
+    history = [{"role": "user", "content": "q1"}, {"role": "assistant", "content": "a1"}]
+    window.request_messages("S", history)
+    history.append({"role": "user", "content": "shed question"})
+    window.request_messages("S", history)
+    history.pop()
+    window.reset()
+    history.append({"role": "user", "content": "q2"})
+    assert [m["content"] for m in window.request_messages("S", history)] == ["S", "q1", "a1", "q2"]
+    print("✅ Context window test passed\n")
+
+
+def test_session_engine():
+    """Test many concurrent sessions with ordering and a concurrency cap"""
+    
+    print("🧪 Testing async session engine...\n")
+    
+    fake_client = FakeAsyncClient()
+    turns = [(f"session-{i % 200}", f"question {i}") for i in range(1000)]
+    
+    async def run(journal):
+        engine = SessionEngine(client=fake_client, max_concurrency=16, max_pending=64, journal=journal)
+        # Count turns submitted but not finished: chat_many keeps a bounded window
+        chat = engine.chat
+        outstanding = {"now": 0, "peak": 0}
+        
+        async def counted_chat(session_id, message):
+            outstanding["now"] += 1
+            outstanding["peak"] = max(outstanding["peak"], outstanding["now"])
+            try:
+                return await chat(session_id, message)
+            finally:
+                outstanding["now"] -= 1
+        
+        engine.chat = counted_chat
+        responses = await engine.chat_many(turns)
+        assert outstanding["peak"] <= 16 * 4
+        await engine.aclose()
+        return engine, responses
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = ConversationJournal(os.path.join(tmp, "sessions.jsonl"))
+        engine, responses = asyncio.run(run(journal))
+        assert journal.records_written == 2000
+    
+    assert responses == [f"echo: {message}" for _, message in turns]
+    assert fake_client.max_in_flight <= 16
+    assert engine.get_stats()["sessions"] == 200
+    assert engine.get_stats()["completed"] == 1000
+    
+    # Each session saw its turns in submission order
+    history = engine.sessions["session-3"].conversation_history
+    questions = [m.content for m in history if m.role == "user"]
+    assert questions == [message for session_id, message in turns if session_id == "session-3"]
+    print("✅ Session engine test passed\n")
+
+
+def test_response_cache():
+    """Test exact, normalized and semantic cache hits plus TTL and LRU eviction"""
+    
+    print("🧪 Testing response cache...\n")
+    
+    vectors = {
+        "how can i protect myself from fraud": [1.0, 0.0, 0.0],
+        "how do i protect against fraud": [0.99, 0.05, 0.0],
+        "what is a mortgage": [0.0, 1.0, 0.0],
+        "what is apy": [0.0, 0.0, 1.0],
+    }
+    cache = ResponseCache(max_entries=2, embedder=lambda text: vectors[text])
+    
+    cache.put("How can I protect myself from fraud?", "Use strong passwords.")
+    assert cache.get("How can I protect myself from fraud?") == "Use strong passwords."
+    assert cache.get("how can i protect myself from FRAUD") == "Use strong passwords."
+    assert cache.get("How do I protect against fraud?") == "Use strong passwords."
+    assert cache.get("What is a mortgage?") is None
+    
+    # LRU: the fraud answer was used most recently, so the mortgage one is evicted
+    cache.put("What is a mortgage?", "A loan for a home.")
+    cache.get("How can I protect myself from fraud?")
+    cache.put("What is APY?", "Annual percentage yield.")
+    assert cache.get("What is a mortgage?") is None
+    assert cache.get("What is APY?") == "Annual percentage yield."
+    
+    stats = cache.get_stats()
+    assert (stats["exact_hits"], stats["normalized_hits"], stats["semantic_hits"]) == (3, 1, 1)
+    assert stats["misses"] == 2
+    
+    expired = ResponseCache(ttl_seconds=0)
+    expired.put("What is APY?", "Annual percentage yield.")
+    assert expired.get("What is APY?") is None
+    
+    # Only context-free first turns are cached
+    banking_bot.response_cache.clear()
+    real_client = banking_bot.client
+    banking_bot.client = FakeStreamingClient(["Compare ", "fees."])
+    try:
+        first = create_chat_conversation()
+        list(stream_chat_with_bot("Savings or checking?", first))
+        list(stream_chat_with_bot("And the fees?", first))
+        banking_bot.client = SimpleNamespace()  # any request would fail
+        second = create_chat_conversation()
+        assert list(stream_chat_with_bot("savings or checking", second)) == ["Compare fees."]
+    finally:
+        banking_bot.client = real_client
+    assert banking_bot.response_cache.get_stats()["entries"] == 1
+    print("✅ Response cache test passed\n")
+
+
+def test_conversation_journal():
+    """Test append-only journaling with rotation, compression and streaming reads"""
+    
+    print("🧪 Testing conversation journal...\n")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "log.jsonl")
+        journal = ConversationJournal(path, fsync_every=10, max_bytes=2000, compress=True)
+        for i in range(200):
+            journal.append({"session_id": f"s{i % 2}", "role": "user", "content": f"message {i}"})
+        journal.close()
+        
+        segments = list_segments(path)
+        assert len(segments) > 1
+        assert all(segment.endswith(".jsonl.gz") for segment in segments)
+        
+        records = read_journal(path)
+        assert not isinstance(records, list)
+        assert [r["content"] for r in records] == [f"message {i}" for i in range(200)]
+        assert sum(1 for _ in read_journal(path, session_id="s1")) == 100
+        
+        # Reopening appends instead of overwriting
+        journal = ConversationJournal(path, max_bytes=0)
+        journal.append({"session_id": "s2", "role": "user", "content": "again"})
+        journal.close()
+        assert sum(1 for _ in read_journal(path)) == 201
+    print("✅ Conversation journal test passed\n")
+
+
+def test_session_store():
+    """Test persisted sessions with paged loading of older history"""
+    
+    print("🧪 Testing SQLite session store...\n")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        url = "sqlite:///" + os.path.join(tmp, "sessions.db")
+        store = create_session_store(url)
+        for i in range(45):
+            store.append("alice", "user" if i % 2 == 0 else "assistant", f"message {i}")
+        store.append("bob", "user", "hello")
+        store.close()
+        
+        # A fresh store (e.g. after a restart) sees the same history
+        store = create_session_store(url)
+        page = store.load_page("alice", limit=20)
+        assert [m["content"] for m in page] == [f"message {i}" for i in range(25, 45)]
+        
+        older = store.load_page("alice", limit=20, before_id=page[0]["id"])
+        assert [m["content"] for m in older] == [f"message {i}" for i in range(5, 25)]
+        oldest = store.load_page("alice", limit=20, before_id=older[0]["id"])
+        assert len(oldest) == 5
+        
+        assert store.count_by_role("alice") == {"user": 23, "assistant": 22}
+        store.delete_session("alice")
+        assert store.load_page("alice") == []
+        assert len(store.load_page("bob")) == 1
+        store.close()
+    
+    # Redis backend, against an in-memory fake client
+    fake = FakeRedis()
+    store = RedisSessionStore(client=fake, ttl_seconds=60)
+    for i in range(25):
+        store.append("alice", "user" if i % 2 == 0 else "assistant", f"message {i}")
+    store.append("bob", "user", "hello")
+    page = store.load_page("alice", limit=10)
+    assert [m["content"] for m in page] == [f"message {i}" for i in range(15, 25)]
+    older = store.load_page("alice", limit=10, before_id=page[0]["id"])
+    assert [m["content"] for m in older] == [f"message {i}" for i in range(5, 15)]
+    assert store.count_by_role("alice") == {"user": 13, "assistant": 12}
+    assert "banking:session:alice:messages" in fake.expiring
+    store.delete_session("alice")
+    assert store.load_page("alice") == [] and store.count_by_role("alice") == {}
+    assert [m["content"] for m in store.load_page("bob")] == ["hello"]
+    store.close()
+    
+    # A backend missing part of the interface fails when it is built, not mid-request
+    class PartialStore(SessionStore):
+        def append(self, session_id, role, content, timestamp=None):
+            return {}
+    
+    try:
+        PartialStore()
+        assert False, "expected TypeError"
+    except TypeError:
+        pass
+    print("✅ Session store test passed\n")
+
+
+def test_resilient_client():
+    """Test retries, non-retryable errors, circuit breaking and half-open probing"""
+    
+    print("🧪 Testing resilient client against injected faults...\n")
+    
+    def resilient(faults, breaker=None):
+        fake = FaultInjectingClient(faults)
+        client = ResilientClient(fake, api_key=f"test-{id(fake)}", base_delay=0.001, max_delay=0.002,
+                                 breaker=breaker, requests_per_second=1000)
+        return fake, client
+    
+    # Transient 429/503 errors are retried until success
+    fake, client = resilient([429, 503, 0])
+    assert client.chat.complete(model="m", messages=[]).choices[0].message.content == "ok"
+    assert fake.calls == 3 and client.get_stats()["retries"] == 2
+    
+    # Client errors are not retried
+    fake, client = resilient([400])
+    try:
+        client.chat.complete(model="m", messages=[])
+        assert False, "expected APIError"
+    except APIError:
+        pass
+    assert fake.calls == 1
+    
+    # Repeated failures open the circuit, which then rejects calls without hitting the API
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.05)
+    fake, client = resilient([500] * 3, breaker=breaker)
+    try:
+        client.chat.complete(model="m", messages=[])
+    except APIError:
+        pass
+    assert breaker.state == CircuitBreaker.OPEN
+    try:
+        client.chat.complete(model="m", messages=[])
+        assert False, "expected CircuitOpenError"
+    except CircuitOpenError:
+        pass
+    assert fake.calls == 3
+    
+    # After the reset timeout a single probe closes the circuit again
+    time.sleep(0.06)
+    assert client.chat.complete(model="m", messages=[]).choices[0].message.content == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+    
+    # A probe stream the caller stops reading early does not leave the circuit stuck half-open
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    fake, client = resilient([500, 0, 0], breaker=breaker)
+    try:
+        list(client.chat.stream(model="m", messages=[]))
+    except APIError:
+        pass
+    time.sleep(0.06)
+    probe = client.chat.stream(model="m", messages=[])
+    assert next(probe) == "o" and breaker.state == CircuitBreaker.HALF_OPEN
+    probe.close()
+    assert list(client.chat.stream(model="m", messages=[])) == ["o", "k"]
+    assert breaker.state == CircuitBreaker.CLOSED
+    print("✅ Resilient client test passed\n")
+
+
+def test_offline_benchmark():
+    """Test the benchmark harness against the mock Mistral backend"""
+    
+    print("🧪 Testing offline benchmark...\n")
+    
+    real_client = banking_bot.client
+    mock = MockMistral(answer_tokens=20, error_rate=0.1, seed=7)
+    try:
+        report = run_benchmark(make_cli_driver(mock), mock, sessions=3, turns=5, trace_allocations=True)
+    finally:
+        banking_bot.client = real_client
+    
+    assert report["turns"] == 15
+    assert 0 < report["p50_ms"] <= report["p95_ms"] <= report["p99_ms"]
+    assert report["payload_bytes_per_turn"] > 0
+    assert report["peak_alloc_bytes_per_turn"] > 0
+    # Injected 503s are retried by the resilient client
+    assert mock.calls > 15
+    print("✅ Offline benchmark test passed\n")
+
+
+def test_turn_metrics():
+    """Test per-turn latency, token usage and the Prometheus export"""
+    
+    print("🧪 Testing per-turn metrics...\n")
+    
+    real_client, real_metrics = banking_bot.client, banking_bot.metrics
+    banking_bot.metrics = TurnMetrics()
+    install_mock(banking_bot, MockMistral(answer_tokens=30))
+    try:
+        history = create_chat_conversation()
+        chat_with_bot("How do wire transfers work? (metrics test)", history)
+        list(stream_chat_with_bot("And what do they cost?", history))
+        banking_bot.client = SimpleNamespace()  # any request would fail
+        chat_with_bot("Will this fail?", history)
+        summary = banking_bot.metrics.summary()
+        prometheus = banking_bot.metrics.to_prometheus()
+    finally:
+        banking_bot.client, banking_bot.metrics = real_client, real_metrics
+    
+    assert summary["turns_total"] == 3 and summary["errors_total"] == 1
+    assert summary["model_latency_seconds"]["count"] == 2
+    assert summary["time_to_first_token_seconds"]["count"] == 2
+    # Only the non-streaming mock response carries usage
+    assert summary["completion_tokens"]["count"] == 1
+    assert summary["completion_tokens"]["mean"] == 30
+    assert "banking_bot_errors_total 1" in prometheus
+    assert 'banking_bot_model_latency_seconds_bucket{le="+Inf"} 2' in prometheus
+    print("✅ Turn metrics test passed\n")
+
+
+
+def test_lazy_startup():
+    """Test that importing the bots needs no API key and loads no heavy dependencies"""
+    
+    print("🧪 Testing side-effect-free startup...\n")
+    
+    script = (
+        "import sys, bot_core, banking_bot, advanced_banking_bot, async_banking_bot\n"
+        "assert bot_core._client is None\n"
+        "loaded = {'mistralai', 'dotenv', 'httpx', 'numpy'} & set(sys.modules)\n"
+        "assert not loaded, loaded\n"
+        # Reporting stats must not build the client either (it would need the key)
+        "bot = advanced_banking_bot.BankingBot()\n"
+        "bot.display_stats()\n"
+        "bot.close()\n"
+        "assert bot_core._client is None and bot_core.client_stats() == {}\n"
+    )
+    env = {k: v for k, v in os.environ.items() if k != "MISTRAL_API_KEY"}
+    env["PYTHONPATH"] = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        result = subprocess.run(
+            [sys.executable, "-c", script], cwd=tmp, env=env, capture_output=True, text=True
+        )
+    assert result.returncode == 0, result.stderr
+    print("✅ Lazy startup test passed\n")
+
+
+
+def test_batch_answer():
+    """Test ordered, de-duplicated and resumable batch answering"""
+    
+    print("🧪 Testing batch question answering...\n")
+    
+    calls = []
+    
+    def answer(question):
+        calls.append(question)
+        # Finish out of order to exercise the reordering
+        time.sleep(0.001 * (len(question) % 5))
+        return f"answer to {question.lower()}"
+    
+    questions = [f"Question {i % 30}?" for i in range(100)] + ["QUESTION 3"]
+    expected = [f"answer to {q.lower()}" for q in questions]
+    # Duplicates answer with the first phrasing seen
+    expected[-1] = "answer to question 3?"
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "questions.jsonl")
+        output_path = os.path.join(tmp, "answers.jsonl")
+        with open(input_path, "w") as f:
+            for i, question in enumerate(questions):
+                f.write(json.dumps({"id": f"q{i}", "question": question}) + "\n")
+        
+        stats = run_batch(input_path, output_path, workers=4, answer=answer)
+        assert stats["answered"] == 101 and stats["failed"] == 0
+        assert len(calls) == stats["requests"] == 30
+        with open(output_path) as f:
+            records = [json.loads(line) for line in f]
+        assert [r["id"] for r in records] == [f"q{i}" for i in range(101)]
+        assert [r["answer"] for r in records] == expected
+        
+        # Simulate an interrupted run: keep 40 results and a torn line
+        with open(output_path) as f:
+            lines = f.readlines()
+        with open(output_path, "w") as f:
+            f.writelines(lines[:40])
+            f.write(lines[40][:10])
+        calls.clear()
+        
+        stats = run_batch(input_path, output_path, workers=4, answer=answer)
+        assert stats["skipped"] == 40 and stats["answered"] == 61
+        # Answers from the first 40 results are reused
+        assert len(calls) == 0
+        with open(output_path) as f:
+            assert [json.loads(line)["answer"] for line in f] == expected
+        
+        # CSV input
+        csv_path = os.path.join(tmp, "questions.csv")
+        with open(csv_path, "w") as f:
+            f.write("question\nWhat is APY?\n\"Fees, limits?\"\n")
+        stats = run_batch(csv_path, output_path, resume=False, answer=answer)
+        with open(output_path) as f:
+            records = [json.loads(line) for line in f]
+        assert [(r["id"], r["question"]) for r in records] == [(1, "What is APY?"), (2, "Fees, limits?")]
+    print("✅ Batch answer test passed\n")
+
+
+
+def test_intent_router():
+    """Test that small talk is answered locally and real questions reach the model"""
+    
+    print("🧪 Testing local intent router...\n")
+    
+    router = IntentRouter()
+    assert router.classify("Hi there!") == "greeting"
+    assert router.classify("Thank you so much.") == "thanks"
+    assert router.classify("What can you do?") == "capabilities"
+    assert router.classify("are you a bot") == "identity"
+    assert router.classify("Bye!") == "farewell"
+    assert router.classify("Hi, how do I open a savings account?") is None
+    assert router.classify("What can you do about a stolen card?") is None
+    
+    real_client = advanced_banking_bot.client
+    advanced_banking_bot.client = SimpleNamespace()  # any request would fail
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            bot = advanced_banking_bot.BankingBot(
+                log_file=os.path.join(tmp, "log.jsonl"), router=IntentRouter()
+            )
+            assert bot.get_response("Hello") == router.responses["greeting"]
+            assert list(bot.stream_response("thanks!")) == [router.responses["thanks"]]
+            assert bot.get_response("How do I dispute a charge?") is None
+            bot.close()
+    finally:
+        advanced_banking_bot.client = real_client
+    
+    stats = bot.get_stats()
+    assert stats["routed_locally"] == 2
+    assert stats["turns"]["errors_total"] == 1
+    assert bot.intent_router.get_stats()["to_model"] == 1
+    # Small talk is shown in the history but not sent to the model
+    assert len(bot.conversation_history) == 5
+    assert bot.api_history == [{"role": "user", "content": "How do I dispute a charge?"}]
+    print("✅ Intent router test passed\n")
+
+
+
+class TieredClient:
+    """Local stand-in for the Mistral API where some models fail"""
+    
+    def __init__(self, failing_models=()):
+        self.failing_models = set(failing_models)
+        self.models = []
+        self.chat = SimpleNamespace(complete=self.complete, stream=self.stream)
+    
+    def _call(self, model):
+        self.models.append(model)
+        if model in self.failing_models:
+            raise APIError(404)
+    
+    def complete(self, model, **kwargs):
+        self._call(model)
+        message = SimpleNamespace(content=f"answer from {model}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+    
+    def stream(self, model, **kwargs):
+        self._call(model)
+        delta = SimpleNamespace(content=f"answer from {model}")
+        yield SimpleNamespace(data=SimpleNamespace(choices=[SimpleNamespace(delta=delta)]))
+
+
+def test_model_tiering():
+    """Test small/large model selection, fallback and per-tier metrics"""
+    
+    print("🧪 Testing model tiering...\n")
+    
+    policy = ModelPolicy(
+        small=ModelTier("small", "small-model", 256),
+        large=ModelTier("large", "large-model", 1024)
+    )
+    ask = lambda question: [{"role": "user", "content": question}]
+    assert policy.select(ask("What is APY?")).name == "small"
+    assert policy.select(ask("Should I refinance my mortgage?")).name == "large"
+    assert policy.select(ask("Explain " + "this " * 60)).name == "large"
+    assert ModelPolicy().select(ask("What is APY?")).name == "large"
+    
+    metrics = TurnMetrics()
+    client = TieredClient()
+    assert complete_chat(ask("What is APY?"), metrics.start_turn(), client, policy) == "answer from small-model"
+    assert list(stream_chat(ask("Best investment strategy?"), metrics.start_turn(), client, policy)) == [
+        "answer from large-model"
+    ]
+    
+    # A failing small model falls back to the large one
+    client = TieredClient(failing_models={"small-model"})
+    assert complete_chat(ask("What is APY?"), metrics.start_turn(), client, policy) == "answer from large-model"
+    assert list(stream_chat(ask("What is APR?"), metrics.start_turn(), client, policy)) == [
+        "answer from large-model"
+    ]
+    assert client.models == ["small-model", "large-model"] * 2
+    
+    # Without fallback the error surfaces
+    policy.fallback = False
+    try:
+        complete_chat(ask("What is APY?"), metrics.start_turn(), client, policy)
+        assert False, "expected the small-model error"
+    except APIError:
+        pass
+    
+    summary = metrics.summary()
+    assert summary["tier_fallbacks_total"] == 2
+    assert summary["tiers"]["small"]["count"] == 4
+    assert summary["tiers"]["large"]["count"] == 3
+    prometheus = metrics.to_prometheus()
+    assert prometheus.count("# TYPE banking_bot_tier_latency_seconds histogram") == 1
+    assert 'banking_bot_tier_latency_seconds_count{tier="small"} 4' in prometheus
+    print("✅ Model tiering test passed\n")
+
+
+def test_knowledge_index():
+    """Test the memory-mapped knowledge index, incremental rebuilds and prompt grounding"""
+    
+    print("🧪 Testing knowledge index...\n")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        cards = os.path.join(tmp, "cards.md")
+        loans = os.path.join(tmp, "loans.md")
+        with open(cards, "w", encoding="utf-8") as f:
+            f.write("# Cards\n\n## Lost card\n\nFreeze a lost debit card in the app, then order a replacement.\n\n"
+                    "```bash\n# not a heading\n```\n\n## Rewards\n\nCredit cards earn 1% cashback on purchases.\n")
+        with open(loans, "w", encoding="utf-8") as f:
+            f.write("# Loans\n\nPersonal loans have a fixed APR between 6% and 12%.\n")
+        
+        index_dir = os.path.join(tmp, "index")
+        embed = lambda text: [text.count("card"), text.count("loan"), 1.0]
+        stats = build_index([cards, loans], index_dir, embedder=embed)
+        assert stats == {"files": 2, "reused_files": 0, "passages": 3, "embedded": 3}
+        
+        index = KnowledgeIndex(index_dir)
+        assert [p["heading"] for p in index.passages] == ["Lost card", "Rewards", "Loans"]
+        hits = index.search("I lost my debit card", k=2)
+        assert hits[0]["heading"] == "Lost card" and "replacement" in hits[0]["text"]
+        assert index.search("zzz unknown words") == []
+        assert KnowledgeIndex(index_dir, embedder=embed).search("personal loan APR")[0]["heading"] == "Loans"
+        del index, hits
+        
+        # Only the edited file is split and embedded again
+        with open(loans, "a", encoding="utf-8") as f:
+            f.write("\n## Early repayment\n\nLoans can be repaid early without a fee.\n")
+        stats = build_index([cards, loans], index_dir, embedder=embed)
+        assert stats == {"files": 2, "reused_files": 1, "passages": 4, "embedded": 2}
+        index = KnowledgeIndex(index_dir)
+        assert index.search("repay early fee")[0]["heading"] == "Early repayment"
+        
+        # Retrieved passages go just before the question, without touching the history
+        messages = [
+            {"role": "system", "content": "system prompt"},
+            {"role": "user", "content": "Should I get a loan? Is the APR fixed?"}
+        ]
+        grounded = ground_messages(messages, index)
+        assert grounded[:1] == messages[:1] and grounded[-1] is messages[-1]
+        assert grounded[1]["role"] == "system" and "fixed APR" in grounded[1]["content"]
+        assert ground_messages([{"role": "user", "content": "zzz"}], index)[0]["content"] == "zzz"
+        
+        # Grounded complex-topic questions can use the small model
+        policy = ModelPolicy(small=ModelTier("small", "small-model", 256))
+        assert policy.select(messages).name == "large"
+        assert policy.select(grounded).name == "small"
+        del index
+    print("✅ Knowledge index test passed\n")
+
+
+def test_chat_api():
+    """Test the HTTP API across two workers sharing one session store"""
+    import httpx
+    
+    print("🧪 Testing HTTP chat API...\n")
+    
+    class RecordingMock(MockMistral):
+        def _begin(self, messages, wait=True):
+            self.requests.append([m["content"] for m in messages])
+            return super()._begin(messages, wait)
+    
+    async def run(db_path):
+        mock = RecordingMock(answer_tokens=5)
+        mock.requests = []
+        workers = [
+            ChatAPI(ChatService(
+                store=SQLiteSessionStore(db_path),
+                client=ResilientClient(mock, api_key="test-chat-api", requests_per_second=1000)
+            ))
+            for _ in range(2)
+        ]
+        clients = [
+            httpx.AsyncClient(transport=httpx.ASGITransport(app=worker), base_url="http://api")
+            for worker in workers
+        ]
+        try:
+            first = await clients[0].post("/v1/chat", json={"message": "What is APY?"})
+            assert first.status_code == 200, first.text
+            session_id = first.json()["session_id"]
+            
+            # The next turn lands on the other worker and still sees the history
+            second = await clients[1].post(
+                "/v1/chat", json={"session_id": session_id, "message": "And APR?", "stream": True}
+            )
+            events = [json.loads(line[5:]) for line in second.text.splitlines() if line.startswith("data:")]
+            assert events[-1] == {"done": True, "session_id": session_id}
+            assert "".join(e.get("delta", "") for e in events).strip()
+            contents = mock.requests[-1]
+            assert "What is APY?" in contents and contents[-1] == "And APR?"
+            
+            page = (await clients[0].get(f"/v1/sessions/{session_id}/messages")).json()["messages"]
+            assert [m["role"] for m in page] == ["user", "assistant"] * 2
+            
+            assert (await clients[0].post("/v1/chat", json={"message": ""})).status_code == 400
+            assert (await clients[0].post("/v1/chat", json={"message": "hi", "session_id": "../x"})).status_code == 400
+            assert (await clients[0].get("/v1/chat")).status_code == 405
+            assert (await clients[1].delete(f"/v1/sessions/{session_id}")).status_code == 204
+            assert (await clients[0].get(f"/v1/sessions/{session_id}/messages")).json()["messages"] == []
+            metrics_text = (await clients[0].get("/metrics")).text
+            assert "banking_bot_turns_total" in metrics_text
+            assert "banking_bot_client_coalesced_total" in metrics_text
+            
+            # A stream that fails partway ends with an error, after the deltas already sent
+            async def stream_async(**kwargs):
+                async def events():
+                    delta = SimpleNamespace(content="Partial ", tool_calls=None)
+                    yield SimpleNamespace(data=SimpleNamespace(choices=[SimpleNamespace(delta=delta)]))
+                    raise RuntimeError("connection reset")
+                return events()
+            
+            broken = ChatAPI(ChatService(
+                store=workers[0].service.store, client=SimpleNamespace(chat=SimpleNamespace(stream_async=stream_async))
+            ))
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=broken), base_url="http://api") as client:
+                response = await client.post("/v1/chat", json={"message": "Tell me about CDs", "stream": True})
+            events = [json.loads(line[5:]) for line in response.text.splitlines() if line.startswith("data:")]
+            assert events[0] == {"delta": "Partial "}
+            assert events[-1]["done"] and events[-1]["error"] == "The model request failed"
+        finally:
+            for client, worker in zip(clients, workers):
+                await client.aclose()
+                await worker.service.aclose()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(os.path.join(tmp, "sessions.db")))
+    print("✅ HTTP chat API test passed\n")
+
+
+def test_payload_compaction():
+    """Test that old long answers are sent as stable digests and the savings are reported"""
+    
+    print("🧪 Testing payload compaction...\n")
+    
+    long_answer = "Savings accounts pay interest on your balance. " * 40
+    history = []
+    for i in range(4):
+        history.append({"role": "user", "content": f"Question {i}?"})
+        history.append({"role": "assistant", "content": long_answer + str(i)})
+    history.append({"role": "user", "content": "Question 4?"})
+    messages = [{"role": "system", "content": BANKING_SYSTEM_PROMPT}, *history]
+    
+    metrics = TurnMetrics()
+    compacted = compact_messages(messages, metrics.start_turn())
+    assert compacted is not messages and len(compacted) == len(messages)
+    assert compacted[0] is messages[0]
+    # The last four messages are sent verbatim, older long answers as digests
+    assert compacted[-4:] == messages[-4:]
+    digests = [m for m in compacted[:-4] if m["role"] == "assistant"]
+    assert len(digests) == 2
+    assert all(m["content"].endswith("[earlier answer shortened]") for m in digests)
+    assert all(len(m["content"]) < 400 for m in digests)
+    assert history[1]["content"] == long_answer + "0"  # history itself is untouched
+    
+    # The next turn's request starts with the same bytes
+    history += [{"role": "assistant", "content": "Short answer."}, {"role": "user", "content": "More?"}]
+    later = compact_messages([messages[0], *history])
+    assert json.dumps(later[:len(compacted) - 4]) == json.dumps(compacted[:-4])
+    
+    short = [{"role": "system", "content": "prompt"}, {"role": "user", "content": "hi"}]
+    assert compact_messages(short) is short
+    
+    summary = metrics.summary()
+    assert summary["payload_bytes_saved"]["count"] == 1
+    assert summary["payload_bytes_saved"]["mean"] > 2 * 1500
+    assert summary["prompt_tokens_saved"]["mean"] > 2 * 350
+    assert "banking_bot_payload_bytes_saved_sum" in metrics.to_prometheus()
+    print("✅ Payload compaction test passed\n")
+
+
+def test_analytics():
+    """Test log analytics across legacy files and rotated journal segments"""
+    
+    print("🧪 Testing conversation analytics...\n")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = ConversationJournal(os.path.join(tmp, "conversation_log.jsonl"), max_bytes=1500, compress=True)
+        questions = ["What is APY?", "How do I report a stolen card?", "Should I refinance my mortgage?"]
+        for session in range(12):
+            for question in questions[session % 3:]:
+                journal.append({"session_id": f"s{session}", "role": "user", "content": question,
+                                "timestamp": "2026-01-01T10:00:00"})
+                journal.append({"session_id": f"s{session}", "role": "assistant", "content": "x" * 300,
+                                "timestamp": "2026-01-01T10:00:02"})
+        journal.close()
+        assert len(list_segments(journal.path)) > 1
+        with open(os.path.join(tmp, "conversation_log.json"), "w") as f:
+            json.dump({"conversation": [
+                {"role": "user", "content": "what is APY", "timestamp": "2026-01-01T09:00:00"},
+                {"role": "assistant", "content": "Annual percentage yield.", "timestamp": "2026-01-01T09:00:01"}
+            ]}, f, indent=2)
+        
+        serial = analyze([tmp], workers=1)
+        parallel = analyze([tmp], workers=2)
+        for aggregate in (serial, parallel):
+            assert aggregate.sessions == 13 and aggregate.messages == 50
+            assert aggregate.questions["what is apy"] == 5
+            assert aggregate.topics == {"interest_rates": 5, "fraud_security": 8, "loans_mortgages": 12}
+            # Sessions split across segments still count their first question once
+            assert aggregate.first_questions == {
+                "what is apy": 5, "how do i report a stolen card": 4, "should i refinance my mortgage": 4
+            }
+        
+        path = os.path.join(tmp, "summary.npz")
+        write_summary(parallel, path)
+        summary = load_summary(path)
+        assert list(summary["totals"]) == [parallel.files, 13, 50]
+        assert summary["question_texts"][0] == "Should I refinance my mortgage?"
+        assert list(summary["question_counts"]) == [12, 8, 5]
+        assert summary["candidate_texts"][0] == "What is APY?"
+        assert summary["latency_counts"].sum() == 25
+        assert abs(float(summary["latency_total"]) - 49.0) < 1e-6
+    print("✅ Analytics test passed\n")
+
+
+def test_prefetch():
+    """Test that predicted follow-ups are answered ahead of time within the budget"""
+    
+    print("🧪 Testing follow-up prefetch...\n")
+    
+    prefetcher = Prefetcher(share=0.2, quota_requests_per_second=5.0, max_predictions=2)
+    assert prefetcher.predict("How do I open a savings account?") == [
+        "What are the fees?", "What is the minimum balance?"
+    ]
+    assert prefetcher.predict("Hello there") == []
+    
+    # Without an explicit quota, the budget is a share of the client's shared rate limit
+    limited = SimpleNamespace(rate_limiter=TokenBucket(10.0))
+    assert Prefetcher(share=0.3)._get_budget(limited).rate == 3.0
+    
+    # A prefetch is one upstream request: no retries and no fallback to the large tier
+    question = [{"role": "system", "content": BANKING_SYSTEM_PROMPT},
+                {"role": "user", "content": "What are the fees?"}]
+    faulty = FaultInjectingClient([503, 503, 0])
+    single = Prefetcher(share=0.2)
+    try:
+        single._answer(question, ResilientClient(faulty, api_key="prefetch-test", base_delay=0.0), None)
+        assert False, "expected APIError"
+    except APIError:
+        pass
+    assert faulty.calls == 1 and single.get_stats()["failed"] == 1
+    
+    # Prefetches queue behind foreground calls in the scheduler and are shed first
+    busy = FairScheduler(max_concurrency=1, max_queue_seconds=0.05, service_seconds=1.0)
+    busy.acquire("foreground")
+    shed = Prefetcher(scheduler=busy)
+    healthy = ResilientClient(FaultInjectingClient([]), api_key="prefetch-test")
+    try:
+        shed._answer(question, healthy, None)
+        assert False, "expected Overloaded"
+    except Overloaded:
+        pass
+    busy.release()
+    assert shed.get_stats()["shed"] == 1
+    assert shed._answer(question, healthy, None) == "ok"
+    
+    mock = MockMistral(answer_tokens=5)
+    real_client = advanced_banking_bot.client
+    install_mock(advanced_banking_bot, mock)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            bot = advanced_banking_bot.BankingBot(
+                log_file=os.path.join(tmp, "log.jsonl"), cache=ResponseCache(), prefetcher=prefetcher
+            )
+            bot.get_response("How do I open a savings account?")
+            assert prefetcher.get_stats()["issued"] == 2
+            
+            # The predicted follow-up is served without another model call; the unused
+            # prediction is cancelled if it has not started yet
+            answer = bot.get_response("What are the fees")
+            assert answer and mock.calls <= 3
+            assert bot.get_stats()["prefetch_hits"] == 1
+            assert bot.api_history[-1] == {"role": "assistant", "content": answer}
+            stats = prefetcher.get_stats()
+            assert stats["hits"] == 1 and stats["wasted"] == 1
+            
+            # An unpredicted question goes to the model; the budget caps further prefetching
+            assert bot.get_response("Tell me about savings accounts for kids")
+            assert prefetcher.get_stats()["issued"] == 2
+            assert prefetcher.get_stats()["over_budget"] == 1
+            
+            # Expired predictions are not served
+            expiring = Prefetcher(ttl_seconds=0.0)
+            bot = advanced_banking_bot.BankingBot(
+                log_file=os.path.join(tmp, "log2.jsonl"), cache=ResponseCache(), prefetcher=expiring
+            )
+            bot.get_response("How do I report a stolen card?")
+            time.sleep(0.01)
+            calls = mock.calls
+            bot.get_response("How do I report it?")
+            assert mock.calls > calls and expiring.get_stats()["hits"] == 0
+            bot.close()
+    finally:
+        advanced_banking_bot.client = real_client
+        prefetcher.shutdown()
+    print("✅ Prefetch test passed\n")
+
+
+def test_request_coalescing():
+    """Test that identical concurrent requests share one upstream call"""
+    
+    print("🧪 Testing single-flight request coalescing...\n")
+    
+    from concurrent.futures import ThreadPoolExecutor
+    
+    def request(question):
+        return [{"role": "system", "content": BANKING_SYSTEM_PROMPT}, {"role": "user", "content": question}]
+    
+    # The key ignores dict order and surrounding whitespace, but not parameters
+    key = payload_key({"model": "m", "messages": request("What is APY?"), "temperature": 0.7})
+    assert key == payload_key({"temperature": 0.7, "messages": request(" What is APY?\n"), "model": "m"})
+    assert key != payload_key({"model": "m", "messages": request("What is APY?"), "temperature": 0.2})
+    
+    mock = MockMistral(latency=0.05, tokens_per_second=400, answer_tokens=8)
+    client = ResilientClient(mock, api_key="test-coalescing", requests_per_second=1000)
+    
+    # Concurrent identical completions: one upstream call, the same answer for everyone
+    with ThreadPoolExecutor(8) as pool:
+        answers = list(pool.map(lambda _: complete_chat(request("What is APY?"), None, client), range(8)))
+    assert len(set(answers)) == 1 and mock.calls == 1
+    assert client.get_stats()["coalesced"] == 7
+    
+    # Concurrent identical streams: every reader gets the whole stream, even when one stops early
+    def read_stream(i):
+        chunks = []
+        for delta in stream_chat(request("What is APR?"), None, client):
+            chunks.append(delta)
+            if i == 0:
+                break
+        return "".join(chunks)
+    
+    with ThreadPoolExecutor(4) as pool:
+        streamed = list(pool.map(read_stream, range(4)))
+    assert mock.calls == 2
+    assert len(set(streamed[1:])) == 1 and len(streamed[1].split()) == 8
+    assert streamed[1].startswith(streamed[0])
+    
+    # Different questions are not shared, and finished calls are not cached
+    with ThreadPoolExecutor(2) as pool:
+        list(pool.map(lambda q: complete_chat(request(q), None, client), ["Hi", "Hello"]))
+    complete_chat(request("What is APY?"), None, client)
+    assert mock.calls == 5
+    
+    # Async completions and streams on one event loop
+    async def run_async():
+        answers = await asyncio.gather(*(
+            complete_chat_async(request("How do wires work?"), None, client) for _ in range(5)
+        ))
+        
+        async def collect():
+            return "".join([delta async for delta in stream_chat_async(request("Wire fees?"), None, client)])
+        
+        streamed = await asyncio.gather(*(collect() for _ in range(3)))
+        return answers, streamed
+    
+    answers, streamed = asyncio.run(run_async())
+    assert len(set(answers)) == 1 and len(set(streamed)) == 1
+    assert mock.calls == 7
+    assert client.get_stats()["coalesced"] == 7 + 3 + 4 + 2
+    assert client.flights.in_flight() == 0
+    
+    # Coalescing can be turned off
+    client = ResilientClient(mock, api_key="test-coalescing", coalesce=False)
+    with ThreadPoolExecutor(3) as pool:
+        list(pool.map(lambda _: complete_chat(request("What is APY?"), None, client), range(3)))
+    assert mock.calls == 10 and client.get_stats()["coalesced"] == 0
+    
+    # A follower that never reads does not keep the stream (and its buffer) alive
+    closed = []
+    
+    def upstream():
+        try:
+            yield from range(100)
+        finally:
+            closed.append(True)
+    
+    flights = SingleFlight()
+    leader = flights.stream("key", upstream)
+    idle = flights.stream("key", upstream)
+    assert next(leader) == 0
+    leader.close()
+    assert closed and flights.in_flight() == 0
+    # Reading it later replays what was buffered, then reports the closed stream
+    try:
+        list(idle)
+        assert False, "expected RuntimeError"
+    except RuntimeError:
+        pass
+    print("✅ Request coalescing test passed\n")
+
+
+def test_fair_scheduler():
+    """Test fair ordering between users, per-user limits and early load shedding"""
+    
+    print("🧪 Testing fair scheduler...\n")
+    
+    import threading
+    
+    scheduler = FairScheduler(max_concurrency=1, max_queue_seconds=2.0, max_queued_per_user=3,
+                              service_seconds=0.01)
+    order = []
+    
+    def run(user):
+        with scheduler.slot(user):
+            order.append(user)
+            time.sleep(0.005)
+    
+    def enqueue(user):
+        depth = scheduler.get_stats()["queue_depth"]
+        thread = threading.Thread(target=run, args=(user,))
+        thread.start()
+        while scheduler.get_stats()["queue_depth"] == depth:
+            time.sleep(0.001)
+        return thread
+    
+    # A free slot is granted at once
+    assert scheduler.acquire("holder") == 0.0
+    
+    # A heavy user queues three requests, then a light user one: the light user is
+    # served after the heavy user's first request, not after all of them
+    threads = [enqueue("heavy") for _ in range(3)]
+    threads.append(enqueue("light"))
+    try:
+        scheduler.acquire("heavy")
+        assert False, "expected Overloaded"
+    except Overloaded as e:
+        assert e.reason == "user_limited"
+    scheduler.release(0.01)
+    for thread in threads:
+        thread.join()
+    assert order == ["heavy", "light", "heavy", "heavy"]
+    
+    stats = scheduler.get_stats()
+    assert stats["queue_depth"] == 0 and stats["active"] == 0
+    assert stats["admitted"] == 5 and stats["queued"] == 4 and stats["user_limited"] == 1
+    assert stats["wait_seconds"]["count"] == 5
+    
+    # A request predicted to miss the SLO is rejected at once instead of waiting
+    slow = FairScheduler(max_concurrency=1, max_queue_seconds=0.1, service_seconds=1.0)
+    slow.acquire("a")
+    started = time.monotonic()
+    try:
+        slow.acquire("b")
+        assert False, "expected Overloaded"
+    except Overloaded as e:
+        assert e.reason == "rejected_early"
+    assert time.monotonic() - started < 0.05
+    
+    # A queued request that does not get a slot in time is shed at the SLO
+    stuck = FairScheduler(max_concurrency=1, max_queue_seconds=0.05, service_seconds=0.001)
+    stuck.acquire("a")
+    try:
+        stuck.acquire("b")
+        assert False, "expected Overloaded"
+    except Overloaded as e:
+        assert e.reason == "timed_out" and e.wait_seconds >= 0.05
+    stuck.release()
+    assert stuck.get_stats()["queue_depth"] == 0 and stuck.acquire("c") == 0.0
+    
+    # Weights: a weight-2 user gets two turns for every one of a weight-1 user
+    weighted = FairScheduler(max_concurrency=1, max_queue_seconds=2.0, service_seconds=0.001)
+    scheduler, order = weighted, []
+    scheduler.acquire("holder")
+    
+    def run_weighted(user, weight):
+        with scheduler.slot(user, weight):
+            order.append(user)
+    
+    threads = []
+    for user, weight in [("gold", 2.0)] * 4 + [("basic", 1.0)] * 2:
+        depth = scheduler.get_stats()["queue_depth"]
+        threads.append(threading.Thread(target=run_weighted, args=(user, weight)))
+        threads[-1].start()
+        while scheduler.get_stats()["queue_depth"] == depth:
+            time.sleep(0.001)
+    scheduler.release()
+    for thread in threads:
+        thread.join()
+    assert order == ["gold", "gold", "basic", "gold", "gold", "basic"]
+    
+    # Zero or negative weights are refused, even when a slot is free
+    for weight in (0.0, -1.0):
+        try:
+            FairScheduler().acquire("user", weight)
+            assert False, "expected ValueError"
+        except ValueError:
+            pass
+    print("✅ Fair scheduler test passed\n")
+
+
+def test_session_snapshot():
+    """Test that a session snapshot is compact and resumes the conversation exactly"""
+    
+    print("🧪 Testing session snapshots...\n")
+    
+    mock = MockMistral(answer_tokens=60)
+    real_client = advanced_banking_bot.client
+    install_mock(advanced_banking_bot, mock)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            def new_bot(name):
+                return advanced_banking_bot.BankingBot(
+                    log_file=os.path.join(tmp, name), cache=ResponseCache(),
+                    context_window=ContextWindow(token_budget=400, summary_tokens=100)
+                )
+            
+            bot = new_bot("log.jsonl")
+            bot.get_response("Hello")
+            for i in range(12):
+                bot.get_response(f"Tell me about savings option {i} — ünïcode included")
+            bot.close()
+            assert bot.context_window.summarized_upto > 0
+            
+            path = os.path.join(tmp, "session.snapshot")
+            size = bot.snapshot(path)
+            assert size == os.path.getsize(path)
+            assert size < 0.8 * os.path.getsize(bot.log_file)
+            
+            # Only the turns still in the context window are decoded on restore
+            resumed = new_bot("log2.jsonl")
+            assert resumed.restore(path) == len(bot.conversation_history)
+            assert resumed.archived > 0
+            assert len(resumed.conversation_history) == len(bot.conversation_history) - resumed.archived
+            assert resumed.session_id == bot.session_id
+            assert resumed.get_stats()["user_messages"] == bot.get_stats()["user_messages"] == 13
+            assert resumed.get_stats()["message_count"] == bot.get_stats()["message_count"]
+            
+            # Old turns are still there, timestamps included
+            assert [m.to_dict() for m in resumed.iter_history()] == [m.to_dict() for m in bot.conversation_history]
+            assert resumed.archive.message(0)[:2] == ("user", "Hello")
+            
+            # The resumed bot sends the same request the original would
+            for b in (bot, resumed):
+                b.add_to_history("user", "And the fees?")
+            assert (resumed.context_window.request_messages(BANKING_SYSTEM_PROMPT, resumed.api_history)
+                    == bot.context_window.request_messages(BANKING_SYSTEM_PROMPT, bot.api_history))
+            
+            # Snapshots of a resumed session include the archived turns
+            again = os.path.join(tmp, "again.snapshot")
+            resumed.snapshot(again)
+            reread = SessionSnapshot(again)
+            assert len(reread) == len(bot.conversation_history)
+            assert reread.roles == ["user", "assistant"] and reread.summarized == resumed.archived_api + \
+                resumed.context_window.summarized_upto
+            reread.close()
+            
+            resumed.clear_history()
+            assert resumed.archive is None and list(resumed.iter_history()) == []
+            resumed.close()
+            
+            with open(os.path.join(tmp, "bad.snapshot"), "wb") as f:
+                f.write(b"{}")
+            try:
+                SessionSnapshot(os.path.join(tmp, "bad.snapshot"))
+                assert False, "expected ValueError"
+            except ValueError:
+                pass
+    finally:
+        advanced_banking_bot.client = real_client
+    print("✅ Session snapshot test passed\n")
+
+
+def test_financial_tools():
+    """Test the vectorized calculators and their use as model tools"""
+    
+    print("🧪 Testing financial calculator tools...\n")
+    
+    import numpy as np
+    
+    # Calculators, vectorized over rates and terms
+    assert round(float(loan_payment(200000, 6, 30)), 2) == 1199.10
+    assert np.allclose(loan_payment(120000, [0, 6], [10, 10]), [1000.0, 1332.25], atol=0.01)
+    schedule = amortization_schedule(200000, 6, 30)
+    assert len(schedule["month"]) == 360 and schedule["balance"][-1] == 0
+    assert abs(schedule["principal"].sum() - 200000) < 0.01
+    assert abs(schedule["interest"].sum() - (1199.10 * 360 - 200000)) < 5
+    assert round(float(apr_to_apy(5)), 4) == 5.1162
+    assert abs(float(apy_to_apr(apr_to_apy(4.25))) - 4.25) < 1e-9
+    grid = affordability_grid(2000, [0, 5, 6.5], [15, 30])
+    assert grid.shape == (3, 2) and grid[0, 1] == 720000
+    assert np.all(np.diff(grid, axis=0) < 0) and np.all(np.diff(grid, axis=1) > 0)
+    
+    # Tool layer: JSON arguments in, figures for the model and a table for the user out
+    result, table = run_tool("loan_payment", '{"principal": 200000, "annual_rate": 6, "years": 30}')
+    assert result["monthly_payment"] == 1199.10 and "note" in result
+    assert table.count("\n") == 31 and "| 30 |" in table
+    result, table = run_tool("convert_rate", {"rate": 5})
+    assert result["apy"] == 5.1162 and table is None
+    assert "error" in run_tool("loan_payment", {"principal": -5, "annual_rate": 6, "years": 30})[0]
+    assert "error" in run_tool("loan_payment", "not json")[0]
+    assert "error" in run_tool("launch_rocket", {})[0]
+    
+    # The model's tool call runs locally; the table is appended to its answer
+    arguments = '{"principal": 200000, "annual_rate": 6, "years": 30}'
+    messages = [{"role": "system", "content": BANKING_SYSTEM_PROMPT},
+                {"role": "user", "content": "What would I pay on a $200k mortgage at 6%?"}]
+    fake = FakeToolClient("loan_payment", arguments)
+    turn_metrics = TurnMetrics()
+    answer = complete_chat(messages, turn_metrics.start_turn(), fake)
+    # Token usage counts every round of the turn, not just the last one
+    assert turn_metrics.summary()["prompt_tokens"]["mean"] == 300
+    assert turn_metrics.summary()["completion_tokens"]["mean"] == 20
+    assert answer.startswith("Your payment is $1,199.10 a month.") and "| Year |" in answer
+    first, second = fake.requests
+    assert first[1]["tool_choice"] == "auto" and len(first[0]) == 2
+    assert second[0][-2]["tool_calls"][0]["function"]["arguments"] == arguments
+    assert json.loads(second[0][-1]["content"])["monthly_payment"] == 1199.10
+    assert second[0][-1]["tool_call_id"] == "call-1"
+    assert len(messages) == 2  # the caller's request is untouched
+    
+    # Streaming: arguments arrive in pieces; the table follows the streamed answer
+    fake = FakeToolClient("loan_payment", arguments)
+    chunks = list(stream_chat(messages, None, fake))
+    assert "".join(chunks[:2]) == "Your payment is $1,199.10." and chunks[2].startswith("\n\n| Year |")
+    assert json.loads(fake.requests[1][0][-1]["content"])["months"] == 360
+    
+    # Tools can be left out of a request, and are by default on turns that need no
+    # calculation
+    fake = FakeToolClient("loan_payment", arguments)
+    complete_chat(messages, None, fake, tools=False)
+    assert "tools" not in fake.requests[0][1]
+    small_talk = [messages[0], {"role": "user", "content": "What are your branch opening hours?"}]
+    fake = FakeToolClient("loan_payment", arguments)
+    complete_chat(small_talk, None, fake)
+    assert "tools" not in fake.requests[0][1] and fake.requests[0][1]["model"] == default_policy.small.model
+    # Nor on large-tier turns: the tier alone does not make a question need a calculator
+    security = [messages[0], {"role": "user", "content": (
+        "Can you explain in detail how two-factor authentication protects my online banking "
+        "login from phishing attempts, and what I should do if I notice a sign-in from a device "
+        "I do not recognize? Please also cover what the bank will never ask me for by text "
+        "message or email."
+    )}]
+    assert default_policy.select(security) is default_policy.large
+    fake = FakeToolClient("loan_payment", arguments)
+    complete_chat(security, None, fake)
+    assert "tools" not in fake.requests[0][1] and fake.requests[0][1]["model"] == default_policy.large.model
+    assert "error" in run_tool("savings_projection", {"annual_rate": 4, "years": 2.5})[0]
+    print("✅ Financial tools test passed\n")
+
+
+def test_pii_redaction():
+    """Test that PII is redacted off the response path before anything is persisted"""
+    
+    print("🧪 Testing PII redaction...\n")
+    
+    redactor = PIIRedactor()
+    assert luhn_valid("4111111111111111") and not luhn_valid("4111111111111112")
+    text, found = redactor.redact(
+        "Card 4111 1111 1111 1111, IBAN GB82 WEST 1234 5698 7654 32, account 12345678, "
+        "mail jane.doe@example.com or call +1 (555) 123-4567"
+    )
+    assert text == ("Card [card number], IBAN [IBAN], account [account number], "
+                    "mail [email] or call [phone number]")
+    assert found == {"card": 1, "iban": 1, "account": 1, "email": 1, "phone": 1}
+    # Numbers failing Luhn are still identifiers; failed IBAN checks, amounts and dates are kept
+    assert redactor.redact_text("card 4111111111111112") == "card [account number]"
+    for kept in ["IBAN GB82 WEST 1234 5698 7654 33", "$1,628.89 after 10 years",
+                 "On 2024-01-15 I paid 250000", "How do I open a savings account?"]:
+        assert redactor.redact_text(kept) == kept
+    
+    # Writers run on the worker, in order and in batches; submit() does not wait for them
+    written = []
+    
+    def slow_write(record):
+        time.sleep(0.002)
+        written.append(record["content"])
+    
+    pipeline = RedactionPipeline(batch_size=16)
+    started = time.perf_counter()
+    for i in range(100):
+        pipeline.submit({"content": f"message {i} from 4111-1111-1111-1111"}, slow_write)
+    assert time.perf_counter() - started < 0.1
+    assert pipeline.flush(timeout=10)
+    assert written == [f"message {i} from [card number]" for i in range(100)]
+    stats = pipeline.get_stats()
+    assert stats["records"] == 100 and stats["batches"] < 100 and stats["queued"] == 0
+    assert stats["matches"] == {"card": 100} and stats["records_per_second"] > 0
+    
+    # The bot's journal and snapshots never see the raw number; the model's context does
+    mock = MockMistral()
+    real_client = advanced_banking_bot.client
+    install_mock(advanced_banking_bot, mock)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            bot = advanced_banking_bot.BankingBot(log_file=os.path.join(tmp, "log.jsonl"), cache=ResponseCache())
+            bot.get_response("My card 4111 1111 1111 1111 was charged twice")
+            assert "4111 1111 1111 1111" in bot.api_history[0]["content"]
+            bot.snapshot(os.path.join(tmp, "session.snapshot"))
+            bot.close()
+            
+            logged = [record["content"] for record in read_journal(bot.log_file)]
+            assert logged[0] == "My card [card number] was charged twice"
+            snapshot = SessionSnapshot(os.path.join(tmp, "session.snapshot"))
+            assert snapshot.message(0)[1] == logged[0]
+            snapshot.close()
+            
+            raw = advanced_banking_bot.BankingBot(log_file=os.path.join(tmp, "raw.jsonl"), redact=False)
+            raw.add_to_history("user", "account 12345678")
+            raw.close()
+            assert next(read_journal(raw.log_file))["content"] == "account 12345678"
+            
+            # The session store is written inline, already redacted, for the next request to read
+            store = SQLiteSessionStore(os.path.join(tmp, "sessions.db"))
+            StoreJournal(store, PIIRedactor()).append(
+                {"session_id": "s1", "role": "user", "content": "IBAN DE89370400440532013000",
+                 "timestamp": "2026-01-01T00:00:00"}
+            )
+            assert store.load_page("s1")[0]["content"] == "IBAN [IBAN]"
+            store.close()
+    finally:
+        advanced_banking_bot.client = real_client
+    print("✅ PII redaction test passed\n")
+
+
 if __name__ == "__main__":
+    test_streaming_bot()
+    test_context_window()
+    test_session_engine()
+    test_response_cache()
+    test_conversation_journal()
+    test_session_store()
+    test_resilient_client()
+    test_offline_benchmark()
+    test_turn_metrics()
+    test_lazy_startup()
+    test_batch_answer()
+    test_intent_router()
+    test_model_tiering()
+    test_knowledge_index()
+    test_chat_api()
+    test_payload_compaction()
+    test_analytics()
+    test_prefetch()
+    test_request_coalescing()
+    test_fair_scheduler()
+    test_session_snapshot()
+    test_financial_tools()
+    test_pii_redaction()
     test_banking_bot()
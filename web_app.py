@@ -5,13 +5,21 @@ Run with: streamlit run web_app.py
 """
 
 import streamlit as st
-from mistralai import Mistral
 from datetime import datetime
 import os
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
+import uuid
+from bot_core import (
+    BANKING_SYSTEM_PROMPT, TRUNCATED_MARKER, MissingAPIKeyError, ModelPolicy, ModelTier,
+    client_stats, complete_chat, default_policy, get_api_key, ground_messages, stream_chat
+)
+from context_window import ContextWindow
+from intent_router import IntentRouter
+from pii_redaction import PIIRedactor
+from prefetch import Prefetcher
+from response_cache import ResponseCache, is_context_free
+from scheduler import BUSY_ANSWER, FairScheduler, Overloaded
+from session_store import create_session_store
+from metrics import TurnMetrics, TurnTimer, format_seconds, start_metrics_server
 
 # Page configuration
 st.set_page_config(
@@ -62,11 +70,12 @@ THEMES = {
     },
 }
 
-# Get current theme
-theme = THEMES[st.session_state.theme]
 
-# Custom CSS based on selected theme
-st.markdown(f"""
+@st.cache_data
+def get_theme_css(theme_name):
+    """Build the custom CSS for a theme once; reruns reuse the cached string"""
+    theme = THEMES[theme_name]
+    return f"""
     <style>
     .main {{
         background-color: {theme['bg_main']};
@@ -133,42 +142,117 @@ st.markdown(f"""
         outline: none !important;
     }}
     </style>
-""", unsafe_allow_html=True)
+"""
+
 
-# Initialize Mistral client
-API_KEY = os.getenv("MISTRAL_API_KEY")
-if not API_KEY:
-    st.error("❌ Error: MISTRAL_API_KEY not found. Please set it in your .env file.")
+# Custom CSS based on selected theme
+st.markdown(get_theme_css(st.session_state.theme), unsafe_allow_html=True)
+
+# Check the API key (loading .env); the Mistral client itself is shared by all
+# sessions and only built when the first request reaches the model
+try:
+    get_api_key()
+except MissingAPIKeyError as e:
+    st.error(f"❌ Error: {str(e)}")
     st.stop()
-client = Mistral(api_key=API_KEY)
-
-# Banking bot system prompt
-BANKING_SYSTEM_PROMPT = """You are a professional banking assistant AI bot. You help customers with:
-- Account information and balance inquiries
-- Transaction history and statements
-- Banking products (savings accounts, checking accounts, loans, mortgages)
-- Investment advice and portfolio management
-- Credit card information and rewards
-- Money transfer and payment assistance
-- Fraud protection and security advice
-- Budgeting and financial planning
-- Loan applications and mortgage guidance
-- Interest rates and APY information
-
-You are knowledgeable, professional, and helpful. You always:
-- Provide accurate financial information
-- Encourage responsible banking practices
-- Suggest consulting with financial advisors for complex decisions
-- Prioritize customer data security
-- Are empathetic to customer concerns
-- Provide clear explanations of banking concepts
-
-DISCLAIMER: This is an educational AI assistant. For actual banking transactions, 
-please contact your bank directly or use official banking channels."""
-
-# Initialize session state for conversation history
+
+# Mistral client override (tests, benchmarks); the shared lazy client is used when None
+client = None
+
+# Messages loaded per history page, and the most kept in memory per session
+HISTORY_PAGE_SIZE = 20
+MAX_MESSAGES_IN_MEMORY = 200
+
+# Newest messages rendered on every rerun; earlier ones are paged in a fragment
+RECENT_MESSAGES_RENDERED = 10
+
+
+@st.cache_resource
+def get_response_cache():
+    """Cache of answers to context-free first questions, shared by all sessions"""
+    return ResponseCache()
+
+
+@st.cache_resource
+def get_model_policy():
+    """Model tiering for the web app, whose large tier allows longer answers"""
+    return ModelPolicy(
+        small=default_policy.small,
+        large=ModelTier("large", default_policy.large.model, 1500)
+    )
+
+
+@st.cache_resource
+def get_intent_router():
+    """Templated answers to small talk, shared by all sessions"""
+    return IntentRouter()
+
+
+@st.cache_resource
+def get_prefetcher():
+    """Background answers to likely follow-ups, within PREFETCH_SHARE of the API quota
+    and behind every foreground call in the scheduler"""
+    return Prefetcher(share=float(os.getenv("PREFETCH_SHARE", "0.2")), scheduler=get_scheduler())
+
+
+@st.cache_resource
+def get_scheduler():
+    """Fair queueing of model calls across all sessions, with a queue-time SLO"""
+    return FairScheduler(
+        max_concurrency=int(os.getenv("SCHEDULER_CONCURRENCY", "8")),
+        max_queue_seconds=float(os.getenv("QUEUE_SLO_SECONDS", "5"))
+    )
+
+
+@st.cache_resource
+def get_session_store():
+    """Persistent chat history store, shared by all sessions"""
+    return create_session_store()
+
+
+@st.cache_resource
+def get_redactor():
+    """PII redactor applied to messages before they are stored"""
+    return PIIRedactor()
+
+
+@st.cache_resource
+def get_metrics():
+    """Process-wide per-turn metrics, served at /metrics when METRICS_PORT is set"""
+    metrics = TurnMetrics()
+    metrics_port = os.getenv("METRICS_PORT")
+    if metrics_port:
+        start_metrics_server(metrics, int(metrics_port))
+    return metrics
+
+
+# Sessions are keyed by an id kept in the URL so they survive reloads and restarts
+if "session_id" not in st.session_state:
+    st.session_state.session_id = st.query_params.get("session") or uuid.uuid4().hex
+    st.query_params["session"] = st.session_state.session_id
+
+# Initialize session state for conversation history, loading only the recent page
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    st.session_state.messages = get_session_store().load_page(
+        st.session_state.session_id, limit=HISTORY_PAGE_SIZE
+    )
+    st.session_state.has_older = len(st.session_state.messages) == HISTORY_PAGE_SIZE
+
+# API view of the history (without ids or timestamps), kept between reruns
+if "api_history" not in st.session_state:
+    st.session_state.api_history = [
+        {"role": msg["role"], "content": msg["content"]}
+        for msg in st.session_state.messages
+        if not msg["content"].endswith(TRUNCATED_MARKER)
+    ]
+
+# Running per-role message counts for the sidebar, counted in the store only once
+if "role_counts" not in st.session_state:
+    st.session_state.role_counts = get_session_store().count_by_role(st.session_state.session_id)
+
+# Page of earlier messages shown (0 = the page just before the newest messages)
+if "history_page" not in st.session_state:
+    st.session_state.history_page = 0
 
 if "message_count" not in st.session_state:
     st.session_state.message_count = 0
@@ -176,33 +260,222 @@ if "message_count" not in st.session_state:
 if "start_time" not in st.session_state:
     st.session_state.start_time = datetime.now()
 
+if "context_window" not in st.session_state:
+    st.session_state.context_window = ContextWindow()
+
+if "turn_metrics" not in st.session_state:
+    st.session_state.turn_metrics = TurnMetrics()
+
+# Answers prefetched for this session's likely next question (used when prefetch is on)
+if "prefetched" not in st.session_state:
+    st.session_state.prefetched = get_prefetcher().session()
+
+
+def record_message(role, content, timestamp=None, api=True, store=True):
+    """Persist a message with PII redacted (unless store is False) and add it to the
+    in-memory page and, unless api is False, to the API history sent to the model"""
+    if store:
+        message = get_session_store().append(
+            st.session_state.session_id, role, get_redactor().redact_text(content), timestamp
+        )
+        # The page keeps the original text for display; reloads show the stored, redacted one
+        message["content"] = content
+    else:
+        message = {"id": None, "role": role, "content": content,
+                   "timestamp": timestamp or datetime.now().isoformat()}
+    st.session_state.messages.append(message)
+    st.session_state.role_counts[role] = st.session_state.role_counts.get(role, 0) + 1
+    if api:
+        st.session_state.api_history.append({"role": role, "content": content})
+    
+    # Keep memory flat for long sessions; older messages stay in the store
+    if len(st.session_state.messages) > MAX_MESSAGES_IN_MEMORY:
+        del st.session_state.messages[:HISTORY_PAGE_SIZE]
+        st.session_state.has_older = True
+    if len(st.session_state.api_history) > MAX_MESSAGES_IN_MEMORY:
+        del st.session_state.api_history[:HISTORY_PAGE_SIZE]
+        st.session_state.context_window.reset()
+
+
+def load_older_messages():
+    """Prepend the previous page of history from the store"""
+    messages = st.session_state.messages
+    older = get_session_store().load_page(
+        st.session_state.session_id,
+        limit=HISTORY_PAGE_SIZE,
+        # Messages shown but never stored (busy notices) have no id
+        before_id=next((m["id"] for m in messages if m["id"] is not None), None)
+    )
+    st.session_state.messages = older + messages
+    st.session_state.has_older = len(older) == HISTORY_PAGE_SIZE
+
+
+def show_older_page():
+    """Page the earlier-messages view back, loading from the store when needed"""
+    earlier = len(st.session_state.messages) - RECENT_MESSAGES_RENDERED
+    if (st.session_state.history_page + 2) * HISTORY_PAGE_SIZE > earlier and st.session_state.has_older:
+        load_older_messages()
+    st.session_state.history_page += 1
+
+
+def show_newer_page():
+    """Page the earlier-messages view forward"""
+    st.session_state.history_page = max(0, st.session_state.history_page - 1)
+
+
+def render_message(message):
+    """Render one chat message"""
+    with st.chat_message(message["role"], avatar="👤" if message["role"] == "user" else "🤖"):
+        st.markdown(message["content"])
+
+
+@st.fragment
+def render_earlier_messages():
+    """Earlier messages, one page at a time; paging reruns only this fragment"""
+    earlier = max(0, len(st.session_state.messages) - RECENT_MESSAGES_RENDERED)
+    if not earlier and not st.session_state.has_older:
+        return
+    
+    with st.expander("🕘 Earlier messages"):
+        pages = max(1, -(-earlier // HISTORY_PAGE_SIZE))
+        page = min(st.session_state.history_page, pages - 1)
+        end = earlier - page * HISTORY_PAGE_SIZE
+        start = max(0, end - HISTORY_PAGE_SIZE)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.button("⬆️ Older", on_click=show_older_page, use_container_width=True,
+                      disabled=start == 0 and not st.session_state.has_older)
+        with col2:
+            st.button("⬇️ Newer", on_click=show_newer_page, use_container_width=True,
+                      disabled=page == 0)
+        
+        for message in st.session_state.messages[start:end]:
+            render_message(message)
+
+
+def route_message(user_message):
+    """Answer small talk from a template, or return None if the model is needed"""
+    routed = get_intent_router().route(user_message)
+    if routed is None:
+        return None
+    TurnTimer(st.session_state.turn_metrics, get_metrics()).routed()
+    return routed[1]
+
+
+def take_prefetched(user_message, timer):
+    """Answer a predicted follow-up from this session's prefetched answers"""
+    if not st.session_state.get("prefetch"):
+        return None
+    answer = st.session_state.prefetched.take(user_message)
+    if answer is not None:
+        timer.prefetch_hit()
+    return answer
+
+
+def prefetch_follow_ups(messages, answer):
+    """Start prefetching answers to the likely next questions, if prefetch is on"""
+    if st.session_state.get("prefetch"):
+        get_prefetcher().schedule(st.session_state.prefetched, messages, answer, client, get_model_policy())
+
+
+def shed_answer(user_message, timer):
+    """Degraded answer for a turn the scheduler shed: the cached answer to a context-free
+    first question, else a short notice (which is not recorded, see main)"""
+    timer.shed()
+    if is_context_free(st.session_state.api_history):
+        cached = get_response_cache().get(user_message)
+        if cached is not None:
+            return cached
+    return BUSY_ANSWER
+
 
 def get_bot_response(user_message):
-    """Get response from Mistral AI"""
+    """Get response from Mistral AI (the user message must already be recorded)"""
+    timer = TurnTimer(st.session_state.turn_metrics, get_metrics())
+    
+    prefetched = take_prefetched(user_message, timer)
+    if prefetched is not None:
+        return prefetched
+    
+    # Serve context-free first questions from the shared response cache
+    cacheable = is_context_free(st.session_state.api_history)
+    if cacheable:
+        cached = get_response_cache().get(user_message)
+        if cached is not None:
+            timer.cache_hit()
+            return cached
+    
     try:
-        # Build messages for API (without timestamps)
-        api_messages = [
-            {"role": msg["role"], "content": msg["content"]}
-            for msg in st.session_state.messages
-        ]
+        # Bounded messages for API, updated in place from the cached API history
+        messages = ground_messages(st.session_state.context_window.request_messages(
+            BANKING_SYSTEM_PROMPT, st.session_state.api_history
+        ))
+        timer.request_built()
         
-        # Add current user message
-        api_messages.append({"role": "user", "content": user_message})
+        # Call Mistral API once the scheduler gives this session a slot
+        with get_scheduler().slot(st.session_state.session_id) as waited:
+            timer.queued(waited)
+            bot_message = complete_chat(messages, timer, client, get_model_policy())
+        if cacheable:
+            get_response_cache().put(user_message, bot_message)
+        prefetch_follow_ups(messages, bot_message)
+        return bot_message
+    
+    except Overloaded:
+        return shed_answer(user_message, timer)
+    except Exception as e:
+        timer.error()
+        return f"❌ Error communicating with Mistral AI: {str(e)}"
+
+
+def stream_bot_response(user_message):
+    """Stream response from Mistral AI, yielding text as it arrives
+    (the user message must already be recorded)"""
+    timer = TurnTimer(st.session_state.turn_metrics, get_metrics())
+    st.session_state.stream_failed = False
+    
+    prefetched = take_prefetched(user_message, timer)
+    if prefetched is not None:
+        yield prefetched
+        return
+    
+    # Serve context-free first questions from the shared response cache
+    cacheable = is_context_free(st.session_state.api_history)
+    if cacheable:
+        cached = get_response_cache().get(user_message)
+        if cached is not None:
+            timer.cache_hit()
+            yield cached
+            return
+    
+    chunks = []
+    try:
+        # Bounded messages for API, updated in place from the cached API history
+        messages = ground_messages(st.session_state.context_window.request_messages(
+            BANKING_SYSTEM_PROMPT, st.session_state.api_history
+        ))
+        timer.request_built()
         
-        # Call Mistral API
-        response = client.chat.complete(
-            model="mistral-large-latest",
-            messages=[
-                {"role": "system", "content": BANKING_SYSTEM_PROMPT}
-            ] + api_messages,
-            temperature=0.7,
-            max_tokens=1500
-        )
+        # Call Mistral streaming API, holding a scheduler slot for the whole stream
+        with get_scheduler().slot(st.session_state.session_id) as waited:
+            timer.queued(waited)
+            for delta in stream_chat(messages, timer, client, get_model_policy()):
+                chunks.append(delta)
+                yield delta
         
-        return response.choices[0].message.content
+        if cacheable and chunks:
+            get_response_cache().put(user_message, "".join(chunks))
+        if chunks:
+            prefetch_follow_ups(messages, "".join(chunks))
     
+    except Overloaded:
+        yield shed_answer(user_message, timer)
     except Exception as e:
-        return f"❌ Error communicating with Mistral AI: {str(e)}"
+        timer.error()
+        st.session_state.stream_failed = True
+        prefix = "\n\n" if chunks else ""
+        yield f"{prefix}❌ Error communicating with Mistral AI: {str(e)}"
 
 
 def main():
@@ -247,12 +520,25 @@ def main():
             st.session_state.theme = new_theme
             st.rerun()
         
+        st.toggle(
+            "⚡ Prefetch likely follow-ups", key="prefetch",
+            help="Answer predicted next questions in the background while you read"
+        )
+        
         st.markdown("---")
         
         if st.button("🔄 Clear Conversation", use_container_width=True):
+            get_session_store().delete_session(st.session_state.session_id)
             st.session_state.messages = []
+            st.session_state.api_history = []
+            st.session_state.has_older = False
+            st.session_state.role_counts = {}
+            st.session_state.history_page = 0
             st.session_state.message_count = 0
             st.session_state.start_time = datetime.now()
+            st.session_state.context_window.reset()
+            st.session_state.prefetched.clear()
+            st.session_state.turn_metrics = TurnMetrics()
             st.success("✅ Conversation cleared!")
             st.rerun()
         
@@ -260,8 +546,8 @@ def main():
         st.markdown("## 📊 Statistics")
         
         if st.session_state.messages:
-            user_msgs = len([m for m in st.session_state.messages if m["role"] == "user"])
-            bot_msgs = len([m for m in st.session_state.messages if m["role"] == "assistant"])
+            user_msgs = st.session_state.role_counts.get("user", 0)
+            bot_msgs = st.session_state.role_counts.get("assistant", 0)
             duration = (datetime.now() - st.session_state.start_time).total_seconds()
             
             col1, col2 = st.columns(2)
@@ -271,25 +557,81 @@ def main():
                 st.metric("Bot Responses", bot_msgs)
             
             st.metric("Duration", f"{int(duration)}s")
+            
+            cache_stats = get_response_cache().get_stats()
+            st.caption(
+                f"⚡ Cached answers: {cache_stats['hits']} hits / "
+                f"{cache_stats['misses']} misses ({cache_stats['hit_rate']:.0%})"
+            )
+            router_stats = get_intent_router().get_stats()
+            st.caption(
+                f"🧭 Answered locally: {router_stats['routed']} / "
+                f"{router_stats['routed'] + router_stats['to_model']} messages "
+                f"({router_stats['routed_rate']:.0%})"
+            )
+            queue = get_scheduler().get_stats()
+            st.caption(
+                f"🚦 Queue: {queue['queue_depth']} waiting, {queue['active']}/"
+                f"{get_scheduler().max_concurrency} in flight, wait p95 "
+                f"{format_seconds(queue['wait_seconds']['p95'])}, "
+                f"{queue['rejected_early'] + queue['timed_out'] + queue['user_limited']} shed (all users)"
+            )
+            shared_calls = client_stats(client).get("coalesced")
+            if shared_calls is not None:
+                st.caption(
+                    f"🔗 Shared model calls: {shared_calls} identical requests "
+                    f"answered by one already in flight (all users)"
+                )
+            
+            turns = st.session_state.turn_metrics.summary()
+            col1, col2 = st.columns(2)
+            with col1:
+                st.metric("First Token (p50)", format_seconds(turns["time_to_first_token_seconds"]["p50"]))
+            with col2:
+                st.metric("Model Latency (p95)", format_seconds(turns["model_latency_seconds"]["p95"]))
+            
+            with st.expander("⏱️ Turn metrics"):
+                st.text(
+                    f"Request build p50: {format_seconds(turns['request_build_seconds']['p50'])}\n"
+                    f"Model latency p50: {format_seconds(turns['model_latency_seconds']['p50'])}\n"
+                    f"Prompt tokens avg: {turns['prompt_tokens']['mean'] or 0:.0f}\n"
+                    f"Completion tokens avg: {turns['completion_tokens']['mean'] or 0:.0f}\n"
+                    f"Cache hits: {turns['cache_hits_total']}  Answered locally: {turns['routed_total']}  "
+                    f"Prefetched: {turns['prefetch_hits_total']}  Shed: {turns['shed_total']}  "
+                    f"Errors: {turns['errors_total']}\n"
+                    f"Queue wait p95: {format_seconds(turns['queue_wait_seconds']['p95'])}\n"
+                    + "".join(
+                        f"{tier.title()} model: {latency['count']} calls, "
+                        f"p50 {format_seconds(latency['p50'])}\n"
+                        for tier, latency in turns["tiers"].items()
+                    )
+                    + f"Fallbacks to larger model: {turns['tier_fallbacks_total']}"
+                )
+                st.download_button(
+                    "📥 Prometheus metrics",
+                    data=get_metrics().to_prometheus(),
+                    file_name="banking_bot_metrics.txt",
+                    mime="text/plain"
+                )
         else:
             st.text("No messages yet")
     
     # Main chat area
     st.markdown("## 💬 Chat")
     
-    # Display chat messages
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"], avatar="👤" if message["role"] == "user" else "🤖"):
-            st.markdown(message["content"])
+    # Earlier messages are paged in a fragment (loading older ones from the store on
+    # demand), so a rerun only renders the newest messages
+    render_earlier_messages()
+    for message in st.session_state.messages[-RECENT_MESSAGES_RENDERED:]:
+        render_message(message)
     
     # Chat input
     if prompt := st.chat_input("Ask me anything about banking..."):
+        # Small talk is answered locally and kept out of the model's context
+        routed = route_message(prompt)
+        
         # Add user message to history
-        st.session_state.messages.append({
-            "role": "user",
-            "content": prompt,
-            "timestamp": datetime.now().isoformat()
-        })
+        record_message("user", prompt, api=routed is None)
         
         # Display user message
         with st.chat_message("user", avatar="👤"):
@@ -297,16 +639,24 @@ def main():
         
         # Get and display bot response
         with st.chat_message("assistant", avatar="🤖"):
-            with st.spinner("🤔 Thinking..."):
-                response = get_bot_response(prompt)
-            st.markdown(response)
+            if routed is not None:
+                response = routed
+                st.markdown(response)
+            else:
+                response = st.write_stream(stream_bot_response(prompt))
         
-        # Add bot response to history
-        st.session_state.messages.append({
-            "role": "assistant",
-            "content": response,
-            "timestamp": datetime.now().isoformat()
-        })
+        # Add bot response to history; a busy notice is only shown, and the shed
+        # question leaves the model's context so asking again does not repeat it
+        if response == BUSY_ANSWER:
+            # The window already counted the shed question; rebuild it from the history
+            st.session_state.api_history.pop()
+            st.session_state.context_window.reset()
+            record_message("assistant", response, api=False, store=False)
+        elif routed is None and st.session_state.stream_failed:
+            # A partial answer and the error are kept for the record, not for the model
+            record_message("assistant", response + TRUNCATED_MARKER, api=False)
+        else:
+            record_message("assistant", response, api=routed is None)
         
         st.session_state.message_count += 1
     